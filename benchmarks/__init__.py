@@ -0,0 +1,2 @@
+# benchmarks - Headless performance checks for the webcam trainer.
+# Run from the repository root, e.g. `python -m benchmarks.angle_kernel`.
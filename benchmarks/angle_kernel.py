@@ -0,0 +1,60 @@
+# benchmarks/angle_kernel.py - Per-joint angle helpers vs. the batched JointAngleKernel
+import argparse
+import timeit
+from types import SimpleNamespace
+
+import numpy as np
+
+from fitjourney import webcam_stream as ws
+from fitjourney import body_weight_squats, body_weight_squat_ohp, alternate_lunges_rotation, jumping_jack
+from fitjourney.routes_webcam import AUTO_CLASSIFY_JOINTS
+
+MODULES = {
+    'body_weight_squats': body_weight_squats,
+    'body_weight_squat_ohp': body_weight_squat_ohp,
+    'alternate_lunges_rotation': alternate_lunges_rotation,
+    'jumping_jack': jumping_jack,
+}
+
+PER_JOINT_FUNCS = {
+    '2d': lambda lms, idx: ws.calculate_angle(*([lms[i].x, lms[i].y] for i in idx)),
+    '3d': lambda lms, idx: ws.calculate_angle_3d(*([lms[i].x, lms[i].y, lms[i].z] for i in idx)),
+    'lean': lambda lms, idx: ws.calculate_torso_lean_angle(*([lms[i].x, lms[i].y] for i in idx)),
+    'tilt': lambda lms, idx: ws.calculate_shoulder_tilt_angle(*([lms[i].x, lms[i].y] for i in idx)),
+    'twist': lambda lms, idx: ws.calculate_torso_misalignment_angle(*([lms[i].x, lms[i].y, lms[i].z] for i in idx)),
+}
+
+def fake_landmarks(seed=0):
+    rng = np.random.default_rng(seed)
+    return [SimpleNamespace(x=p[0], y=p[1], z=p[2], visibility=p[3]) for p in rng.random((ws.LANDMARK_COUNT, 4))]
+
+def per_joint(landmarks, measure_joints, angle_kinds):
+    return {
+        name: PER_JOINT_FUNCS[angle_kinds.get(name, ws.DEFAULT_KIND_BY_ARITY[len(idx)])](landmarks, idx)
+        for name, idx in measure_joints.items()
+    }
+
+def best_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def run(number):
+    landmarks = fake_landmarks()
+    points = ws.landmarks_to_array(landmarks)
+    cases = {key: (mod.TARGET_DATA['measure_joints'], mod.TARGET_DATA.get('angle_kinds', {})) for key, mod in MODULES.items()}
+    cases['auto_classify'] = (AUTO_CLASSIFY_JOINTS, {})
+
+    # The (33, 4) pack happens once per frame and is shared by every later stage,
+    # so it is reported separately from the kernel itself.
+    pack = best_us(lambda: ws.landmarks_to_array(landmarks), number)
+    print(f"landmarks_to_array: {pack:.1f} us/frame\n")
+    print(f"{'exercise':<28}{'joints':>7}{'per-joint us':>15}{'kernel us':>12}{'pack+kernel us':>17}{'speedup':>10}")
+    for key, (joints, kinds) in cases.items():
+        kernel = ws.JointAngleKernel(joints, kinds)
+        old = best_us(lambda: per_joint(landmarks, joints, kinds), number)
+        new = best_us(lambda: kernel.measure(points), number)
+        print(f"{key:<28}{len(joints):>7}{old:>15.1f}{new:>12.1f}{pack + new:>17.1f}{old / (pack + new):>9.1f}x")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-joint angle helpers vs. JointAngleKernel.')
+    parser.add_argument('--number', type=int, default=2000, help='Frames per timing run.')
+    run(parser.parse_args().number)
@@ -0,0 +1,60 @@
+# benchmarks/app_startup.py - create_app time and memory with the vision stack loaded lazily vs preloaded
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in a fresh interpreter per measurement, so nothing is cached between modes.
+_CHILD = r'''
+import json, resource, sys, time
+started = time.perf_counter()
+from fitjourney import create_app
+create_app()
+startup = time.perf_counter() - started
+loaded = {name: name in sys.modules for name in ('cv2', 'mediapipe')}
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+from fitjourney.vision import preload
+started = time.perf_counter()
+preload()
+first_use = time.perf_counter() - started
+print(json.dumps({'startup_s': startup, 'rss_mb': rss_mb, 'loaded': loaded, 'first_use_s': first_use,
+                  'rss_after_use_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+MODES = {'lazy': '0', 'preload': '1'}
+
+def measure(preload):
+    # Pool warming is off in both modes: it runs in a background thread and would only add noise.
+    env = dict(os.environ, VISION_PRELOAD=preload, POSE_POOL_WARM='0')
+    output = subprocess.run([sys.executable, '-c', _CHILD], env=env, check=True, capture_output=True,
+                            text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def run(args):
+    results = {}
+    for mode, preload in MODES.items():
+        runs = [measure(preload) for _ in range(args.repeat)]
+        results[mode] = {
+            'startup_ms': round(statistics.median(r['startup_s'] for r in runs) * 1000, 1),
+            'rss_mb': round(statistics.median(r['rss_mb'] for r in runs), 1),
+            'first_use_ms': round(statistics.median(r['first_use_s'] for r in runs) * 1000, 1),
+            'rss_after_use_mb': round(statistics.median(r['rss_after_use_mb'] for r in runs), 1),
+            'loaded': runs[-1]['loaded'],
+        }
+    print(f"median of {args.repeat} runs")
+    print(f"  {'mode':<10}{'create_app ms':>15}{'peak RSS MB':>13}{'first use ms':>14}{'RSS after MB':>14}  loaded at startup")
+    for mode, r in results.items():
+        loaded = ', '.join(name for name, present in r['loaded'].items() if present) or '-'
+        print(f"  {mode:<10}{r['startup_ms']:>15.1f}{r['rss_mb']:>13.1f}{r['first_use_ms']:>14.1f}"
+              f"{r['rss_after_use_mb']:>14.1f}  {loaded}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'repeat': args.repeat, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Startup time and memory of create_app with VISION_PRELOAD off and on.')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per mode; the median is reported.')
+    parser.add_argument('--json', help='Also write the results to this file, for comparing runs.')
+    run(parser.parse_args())
@@ -0,0 +1,117 @@
+# benchmarks/exercise_classifier.py - Lock-on time, false switches and per-frame cost of the auto-classifier
+import argparse
+import collections
+import time
+
+import numpy as np
+
+from fitjourney.exercise_classifier import ANGLE_NAMES, AUTO_CLASSIFY_EXERCISES, EXERCISE_PROTOTYPES
+from fitjourney.routes_webcam import classify_and_count, lock_threshold, switch_cooldown
+from fitjourney.session_state import AutoClassifyState
+
+# Angles of joints an exercise leaves alone, roughly a person standing with arms down
+NEUTRAL = {'left_knee': 172, 'right_knee': 172, 'left_elbow': 165, 'right_elbow': 165, 'left_hip': 172, 'left_shoulder': 20}
+REP_SECONDS = 2.0
+
+def rule_classification(angles):
+    """The per-frame threshold rules the windowed classifier replaced."""
+    left_knee, right_knee, left_elbow, right_elbow, left_hip, left_shoulder = angles; avg_knee_angle = (left_knee + right_knee)/2; avg_elbow_angle = (left_elbow + right_elbow)/2
+    detected = "Unknown"; arms_wide = left_shoulder > 90 and left_elbow > 150 and right_elbow > 150; legs_wide = avg_knee_angle > 160
+    if avg_knee_angle < 100 and 70 < left_hip < 140: detected = "Squat"
+    elif avg_elbow_angle < 100 and avg_knee_angle > 150: detected = "Push-up"
+    elif left_hip < 100 and avg_knee_angle < 140: detected = "Lunge"
+    elif arms_wide and legs_wide: detected = "Jumping Jack"
+    elif left_hip < 90 and avg_knee_angle < 90: detected = "Sit-up"
+    return detected
+
+class RuleLock:
+    """The previous lock logic: per-frame rules, a 15-deep deque and max(set, key=count)."""
+    def __init__(self):
+        self.buffer = collections.deque(maxlen=15); self.active = None; self.last_switch = 0
+
+    def update(self, angles, now):
+        self.buffer.append(rule_classification(angles))
+        common = max(set(self.buffer), key=self.buffer.count)
+        if common != "Unknown" and common != self.active:
+            if now - self.last_switch > switch_cooldown and self.buffer.count(common) >= 10:
+                self.active = common; self.last_switch = now
+        return self.active
+
+class WindowedLock:
+    """
+    classify_and_count as the streams run it: angle window, periodic decisions, histogram
+    lock buffer, plus the rep counting and no-motion unlock the rules above leave out.
+    """
+    def __init__(self):
+        self.st = AutoClassifyState()
+
+    def update(self, angles, now):
+        classify_and_count(angles, self.st, now)
+        return self.st.active_exercise
+
+def trace(exercise, seconds, fps, rng, noise):
+    """Synthetic angle rows: the exercise's joints sweep their prototype range once per rep."""
+    t = np.arange(int(seconds * fps)) / fps
+    phase = (1 - np.cos(2 * np.pi * t / REP_SECONDS)) / 2
+    rows = np.empty((len(t), len(ANGLE_NAMES)))
+    for col, name in enumerate(ANGLE_NAMES):
+        low, high = EXERCISE_PROTOTYPES.get(exercise, {}).get(name, (NEUTRAL[name], NEUTRAL[name]))
+        rows[:, col] = high - (high - low) * phase
+    return np.clip(rows + rng.normal(0, noise, rows.shape), 0, 180)
+
+def run_sequence(lock, segments, fps):
+    """Feeds segments [(label, rows)]; returns per-segment lock-on seconds and the number of wrong locks."""
+    locked_after = []; wrong = 0; t0 = 1000.0; frame = 0; previous = None
+    for label, rows in segments:
+        start = frame; seconds = None
+        for angles in rows:
+            active = lock.update(tuple(angles), t0 + frame / fps)
+            if active != previous and active is not None and active != label:
+                wrong += 1
+            previous = active
+            if seconds is None and active == label:
+                seconds = (frame - start) / fps
+            frame += 1
+        locked_after.append(seconds)
+    return locked_after, wrong
+
+def run(trials, fps, noise, seconds):
+    rng = np.random.default_rng(0)
+    print(f"{trials} trials per exercise, {fps} fps, noise {noise} deg, {seconds}s per exercise after 3s standing\n")
+    print(f"{'exercise':<14}{'rules lock s':>13}{'window lock s':>14}{'rules wrong':>12}{'window wrong':>13}"
+          f"{'window switch s':>16}")
+    per_frame = {'rules': [], 'window': []}
+    for index, exercise in enumerate(AUTO_CLASSIFY_EXERCISES):
+        following = AUTO_CLASSIFY_EXERCISES[(index + 1) % len(AUTO_CLASSIFY_EXERCISES)]
+        results = {'rules': ([], 0), 'window': ([], 0)}; switched = []
+        for _ in range(trials):
+            segments = [(None, trace(None, 3, fps, rng, noise)), (exercise, trace(exercise, seconds, fps, rng, noise)),
+                        (following, trace(following, seconds, fps, rng, noise))]
+            frames = sum(len(rows) for _, rows in segments)
+            for name, lock in (('rules', RuleLock()), ('window', WindowedLock())):
+                started = time.perf_counter()
+                locked_after, wrong = run_sequence(lock, segments, fps)
+                per_frame[name].append((time.perf_counter() - started) / frames)
+                times, total_wrong = results[name]
+                times.append(locked_after[1]); results[name] = (times, total_wrong + wrong)
+                if name == 'window':
+                    switched.append(locked_after[2])
+        def mean_lock(times):
+            found = [t for t in times if t is not None]
+            return f"{np.mean(found):.2f} ({len(found)}/{len(times)})" if found else "never"
+        print(f"{exercise:<14}{mean_lock(results['rules'][0]):>13}{mean_lock(results['window'][0]):>14}"
+              f"{results['rules'][1]:>12}{results['window'][1]:>13}{mean_lock(switched):>16}")
+    rules_us, window_us = (np.median(per_frame[name]) * 1e6 for name in ('rules', 'window'))
+    # Rules run on every frame; the window is scored every DECISION_INTERVAL whatever the
+    # rate, and every LOCKED_DECISION_INTERVAL once an exercise is locked.
+    print(f"\nper frame: rules {rules_us:.1f} us, window {window_us:.1f} us; "
+          f"per stream-second: rules {rules_us * fps:.0f} us, window {window_us * fps:.0f} us (lock threshold {lock_threshold})")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Auto-classify lock-on speed, false switches and cost on synthetic reps.')
+    parser.add_argument('--trials', type=int, default=10)
+    parser.add_argument('--fps', type=float, default=15.0, help='Inference rate of the simulated stream.')
+    parser.add_argument('--noise', type=float, default=6.0, help='Gaussian angle noise in degrees.')
+    parser.add_argument('--seconds', type=float, default=12.0, help='Duration of each exercise segment.')
+    args = parser.parse_args()
+    run(args.trials, args.fps, args.noise, args.seconds)
@@ -0,0 +1,67 @@
+# benchmarks/feedback_store.py - Read/write cost of the cross-worker feedback store and how soon another process sees a write
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from fitjourney.feedback_store import FeedbackStore
+
+# A published ExerciseState, about the size the squat pages poll
+SAMPLE = {'feedback': ['Go lower', 'Keep chest up'], 'reps': 12, 'state': 'down', 'knee_L': 87.5, 'knee_R': 88.1,
+          'hip_R': 71.3, 'ankle_R': 80.2, 'torso_lean': 12.4, 'shoulder_align': 3.1}
+BODY = json.dumps(SAMPLE).encode()
+
+def _watch(path, writes, ready, lags):
+    """Other-process reader: spins on the record and reports how long each version took to appear."""
+    store = FeedbackStore(path)
+    store.read('session-0', 'squats')
+    ready.set()
+    version = 0
+    while version < writes:
+        record = store.read('session-0', 'squats')
+        if record is not None and record[1] > version:
+            version = record[1]
+            lags.put(time.time() - json.loads(record[0])['written_at'])
+
+def per_call_us(function, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        function(i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+def run(args):
+    path = os.path.join(tempfile.mkdtemp(), 'feedback')
+    store = FeedbackStore(path, slots=args.slots)
+    for i in range(args.sessions):
+        store.write(f'session-{i}', 'squats', BODY, 1)
+    print(f"{args.sessions} sessions in {args.slots} slots")
+    print(f"  write          {per_call_us(lambda i: store.write('session-1', 'squats', BODY, i), args.calls):8.2f} us")
+    print(f"  read (hit)     {per_call_us(lambda i: store.read(f'session-{i % args.sessions}', 'squats'), args.calls):8.2f} us")
+    print(f"  read (miss)    {per_call_us(lambda i: store.read(f'absent-{i}', 'squats'), args.calls):8.2f} us")
+
+    # Spawned like the pose processes; a gunicorn worker maps the file the same way.
+    context = multiprocessing.get_context('spawn')
+    ready, lags = context.Event(), context.Queue()
+    watcher = context.Process(target=_watch, args=(path, args.writes, ready, lags))
+    watcher.start()
+    ready.wait()
+    for version in range(1, args.writes + 1):
+        store.write('session-0', 'squats', json.dumps(dict(SAMPLE, written_at=time.time())).encode(), version)
+        time.sleep(args.write_interval)
+    watcher.join()
+    seen = sorted(lags.get() * 1000 for _ in range(lags.qsize()))
+    if seen:
+        print(f"  cross-process  {len(seen)}/{args.writes} versions seen, lag p50 {seen[len(seen) // 2]:.3f} ms, "
+              f"max {seen[-1]:.3f} ms")
+    os.remove(path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cost of the shared feedback store and its cross-process visibility.')
+    parser.add_argument('--sessions', type=int, default=1024, help='Records written before measuring.')
+    parser.add_argument('--slots', type=int, default=4096)
+    parser.add_argument('--calls', type=int, default=20000, help='Calls per measured operation.')
+    parser.add_argument('--writes', type=int, default=200, help='Versions written while another process watches.')
+    parser.add_argument('--write-interval', type=float, default=0.005, help='Seconds between those writes.')
+    run(parser.parse_args())
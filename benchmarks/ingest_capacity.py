@@ -0,0 +1,72 @@
+# benchmarks/ingest_capacity.py - How many concurrent browser streams one box sustains through the InferencePool
+import argparse
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from fitjourney.inference_pool import InferencePool, FrameDropped, PoolSaturated, INFERENCE_WORKERS, TARGET_STREAM_FPS
+
+def load_frame(path, width):
+    """JPEG bytes of the given image (or a noise frame) downscaled like the browser client does."""
+    image = cv2.imread(path) if path else None
+    if image is None:
+        image = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    height = int(image.shape[0] * width / image.shape[1])
+    ok, buffer = cv2.imencode('.jpg', cv2.resize(image, (width, height)), [cv2.IMWRITE_JPEG_QUALITY, 70])
+    return buffer.tobytes()
+
+def client(pool, key, frame, fps, deadline, results):
+    """One simulated browser: a single request in flight, paced to fps."""
+    interval = 1.0 / fps
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            pool.submit(key, frame, lambda points: points).result(timeout=5)
+            results['latency'].append(time.monotonic() - started)
+        except FrameDropped:
+            results['dropped'] += 1
+        except PoolSaturated:
+            results['rejected'] += 1
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+def run_level(pool, streams, frame, fps, seconds):
+    results = [{'latency': [], 'dropped': 0, 'rejected': 0} for _ in range(streams)]
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=client, args=(pool, ('bench', i), frame, fps, deadline, results[i]))
+               for i in range(streams)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    latency = np.array([l for r in results for l in r['latency']]) * 1000
+    delivered = len(latency) / seconds / streams
+    p50, p99 = (np.percentile(latency, [50, 99]) if latency.size else (float('nan'),) * 2)
+    return delivered, p50, p99, sum(r['dropped'] for r in results), sum(r['rejected'] for r in results)
+
+def run(workers, max_streams, fps, seconds, image, width):
+    frame = load_frame(image, width)
+    pool = InferencePool(workers=workers)
+    pool.start(wait=True)
+    print(f"{workers} workers, {fps} fps per stream, {seconds}s per level\n")
+    print(f"{'streams':>8}{'fps/stream':>12}{'p50 ms':>10}{'p99 ms':>10}{'dropped':>9}{'rejected':>10}")
+    sustained = 0
+    for streams in range(1, max_streams + 1):
+        delivered, p50, p99, dropped, rejected = run_level(pool, streams, frame, fps, seconds)
+        print(f"{streams:>8}{delivered:>12.1f}{p50:>10.1f}{p99:>10.1f}{dropped:>9}{rejected:>10}")
+        if delivered < fps * 0.9:
+            break
+        sustained = streams
+    pool.close()
+    print(f"\nsustained streams at >= 90% of {fps} fps: {sustained}")
+    print(f"pool estimate: {pool.stats()['sustainable_streams']}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Concurrent ingest streams sustained by the InferencePool.')
+    parser.add_argument('--workers', type=int, default=None, help='Pool size (default: INFERENCE_WORKERS).')
+    parser.add_argument('--max-streams', type=int, default=32)
+    parser.add_argument('--fps', type=float, default=TARGET_STREAM_FPS, help='Frames per second each stream sends.')
+    parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each load level.')
+    parser.add_argument('--image', default=None, help='Frame to send (a photo of a person gives realistic timings).')
+    parser.add_argument('--width', type=int, default=320, help='Downscaled frame width, as sent by the browser.')
+    args = parser.parse_args()
+    run(args.workers or INFERENCE_WORKERS, args.max_streams, args.fps, args.seconds, args.image, args.width)
@@ -0,0 +1,59 @@
+# benchmarks/landmark_filter.py - Jitter removed, lag added and per-frame cost of each landmark filter
+import argparse
+import timeit
+
+import numpy as np
+
+from fitjourney.landmark_filter import FILTERS, new_filter
+from fitjourney.routes_webcam import AUTO_CLASSIFY_KERNEL
+from fitjourney.webcam_stream import LANDMARK_COUNT
+
+def base_pose(seed=0):
+    points = np.random.default_rng(seed).random((LANDMARK_COUNT, 4))
+    points[:, 3] = 1.0
+    return points
+
+def jitter_deg(kind, fps, noise, frames, rng):
+    """Mean per-joint std of the auto-classify angles for a still pose with landmark noise."""
+    pose = base_pose(); landmark_filter = new_filter(kind); angles = []
+    for i in range(frames):
+        noisy = pose + rng.normal(0, noise, pose.shape) * [1, 1, 1, 0]
+        angles.append(AUTO_CLASSIFY_KERNEL.compute(landmark_filter(noisy, i / fps)))
+    return float(np.std(angles[frames // 4:], axis=0).mean())
+
+def step_lag_ms(kind, fps, step):
+    """Time for the filtered output to cover 90% of a sudden landmark move."""
+    pose = base_pose(); landmark_filter = new_filter(kind)
+    for i in range(int(fps)):
+        landmark_filter(pose, i / fps)
+    moved = pose + [step, 0, 0, 0]
+    for i in range(1, 10 * int(fps)):
+        out = landmark_filter(moved, 1 + i / fps)
+        if out[0, 0] - pose[0, 0] >= 0.9 * step:
+            return (i - 1) * 1000 / fps
+    return float('inf')
+
+def cost_us(kind, number):
+    pose = base_pose(); landmark_filter = new_filter(kind); clock = [0.0]
+    def frame():
+        clock[0] += 1 / 30
+        landmark_filter(pose, clock[0])
+    return min(timeit.repeat(frame, number=number, repeat=5)) / number * 1e6
+
+def run(fps, noise, step, frames, number):
+    rng = np.random.default_rng(0)
+    print(f"{fps} fps, landmark noise {noise} (normalized), step {step}\n")
+    print(f"{'filter':<10}{'angle jitter deg':>18}{'90% step lag ms':>17}{'cost us':>9}")
+    for kind in FILTERS:
+        print(f"{kind:<10}{jitter_deg(kind, fps, noise, frames, rng):>18.2f}"
+              f"{step_lag_ms(kind, fps, step):>17.0f}{cost_us(kind, number):>9.1f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the landmark filters on a noisy still pose and a step move.')
+    parser.add_argument('--fps', type=float, default=15.0, help='Inference rate.')
+    parser.add_argument('--noise', type=float, default=0.005, help='Landmark noise std in frame widths.')
+    parser.add_argument('--step', type=float, default=0.2, help='Size of the sudden move in frame widths.')
+    parser.add_argument('--frames', type=int, default=400)
+    parser.add_argument('--number', type=int, default=5000, help='Frames per timing run.')
+    args = parser.parse_args()
+    run(args.fps, args.noise, args.step, args.frames, args.number)
@@ -0,0 +1,45 @@
+# benchmarks/landmark_ingest.py - Server cost per frame of the landmark-only ingest protocol
+import argparse
+import timeit
+
+import numpy as np
+
+from fitjourney import exercise_engine
+from fitjourney import body_weight_squats, body_weight_squat_ohp, alternate_lunges_rotation, jumping_jack
+from fitjourney.landmark_protocol import decode_frames, encode_frame, DTYPE_FLOAT32, DTYPE_INT16
+from fitjourney.routes_webcam import classify_and_count, extract_angles
+from fitjourney.session_state import AutoClassifyState
+from fitjourney.webcam_stream import mirror_points, LANDMARK_COUNT
+
+MODULES = {
+    'body_weight_squats': body_weight_squats,
+    'body_weight_squat_ohp': body_weight_squat_ohp,
+    'alternate_lunges_rotation': alternate_lunges_rotation,
+    'jumping_jack': jumping_jack,
+}
+
+def best_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def run(number):
+    points = np.random.default_rng(0).random((LANDMARK_COUNT, 4), dtype=np.float32)
+    payloads = {'float32': encode_frame(1, points, DTYPE_FLOAT32), 'int16': encode_frame(1, points, DTYPE_INT16)}
+    print(f"{'exercise':<28}{'dtype':>8}{'bytes':>7}{'decode+count us':>17}")
+    for key, mod in MODULES.items():
+        spec = mod.SPEC; st = spec.new_state()
+        for name, payload in payloads.items():
+            def frame():
+                for _, pts in decode_frames(payload):
+                    exercise_engine.count_frame(spec, st, mirror_points(pts))
+            print(f"{key:<28}{name:>8}{len(payload):>7}{best_us(frame, number):>17.1f}")
+    st = AutoClassifyState()
+    for name, payload in payloads.items():
+        def frame():
+            for _, pts in decode_frames(payload):
+                classify_and_count(extract_angles(mirror_points(pts)), st)
+        print(f"{'auto_classify':<28}{name:>8}{len(payload):>7}{best_us(frame, number):>17.1f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-frame server cost of landmark-only ingest.')
+    parser.add_argument('--number', type=int, default=2000, help='Frames per timing run.')
+    run(parser.parse_args().number)
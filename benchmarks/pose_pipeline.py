@@ -0,0 +1,102 @@
+# benchmarks/pose_pipeline.py - Frames/sec, tail latency and per-stage cost of every MJPEG generator
+import argparse
+import json
+import time
+
+import cv2
+
+from fitjourney.capture_service import CaptureService
+from fitjourney.frame_sources import SyntheticSource, source_opener
+from fitjourney.inference_scheduler import InferenceScheduler
+from fitjourney.pose_pool import POSE_POOLS, DEFAULT_MODEL_COMPLEXITY
+from fitjourney.routes_webcam import EXERCISE_DISPATCHER, AUTO_CLASSIFY_KEY, generate_frames as auto_generate_frames
+from fitjourney.session_state import AutoClassifyState
+from fitjourney.stage_timer import StageTimer, STAGES
+
+def camera_opener(args):
+    """Opener for the benchmark's CaptureService: a FRAME_SOURCE-style spec, a looped photo or noise frames."""
+    if args.source:
+        return source_opener(args.source)
+    frames = None
+    if args.image:
+        still = cv2.imread(args.image)
+        if still is None:
+            raise SystemExit(f"Cannot read image: {args.image}")
+        frames = [cv2.resize(still, (args.width, args.height))]
+    return lambda: SyntheticSource(args.width, args.height, args.source_fps, frames)
+
+class EveryFrameScheduler(InferenceScheduler):
+    """Runs inference on every frame, so each stage is measured at full pipeline rate."""
+    def should_infer(self, now):
+        return True
+
+def targets():
+    """(name, generator(state, model_complexity, **options), state factory) for every stream kind."""
+    for key, info in EXERCISE_DISPATCHER.items():
+        yield key, info['generator'], info['spec'].new_state
+    yield AUTO_CLASSIFY_KEY, auto_generate_frames, AutoClassifyState
+
+def run_target(generator, new_state, args, opener):
+    # A fresh service per target, so a video or image source restarts from its first frame.
+    capture = CaptureService(opener=opener, idle_timeout=0.0)
+    timer = StageTimer()
+    scheduler = EveryFrameScheduler() if args.scheduler == 'every' else InferenceScheduler()
+    stream = generator(new_state(), args.model_complexity, capture=capture, scheduler=scheduler, timer=timer,
+                       pipelined=args.pipeline == 'threads')
+    frames = 0; started = None
+    try:
+        for _ in stream:
+            frames += 1
+            if frames == args.warmup:
+                timer.reset(); started = time.perf_counter()
+            if frames >= args.warmup + args.frames:
+                break
+    finally:
+        stream.close()
+    elapsed = time.perf_counter() - started if started else 0.0
+    summary = timer.summary()
+    summary['fps'] = round(summary['frames'] / elapsed, 1) if elapsed else 0.0
+    return summary
+
+def print_report(name, summary):
+    print(f"\n{name}: {summary['fps']} fps, p50 {summary['p50_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms "
+          f"over {summary['frames']} frames")
+    print(f"  {'stage':<16}{'count':>7}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'share':>8}")
+    for stage in STAGES:
+        s = summary['stages'][stage]
+        print(f"  {stage:<16}{s['count']:>7}{s['mean_ms']:>10.3f}{s['p50_ms']:>10.3f}{s['p99_ms']:>10.3f}{s['share']:>8.1%}")
+
+def run(args):
+    opener = camera_opener(args)
+    POSE_POOLS.get(args.model_complexity).warm()
+    source = args.source or args.image or f'synthetic {args.width}x{args.height}'
+    print(f"source: {source}, model_complexity {args.model_complexity}, scheduler {args.scheduler}, "
+          f"pipeline {args.pipeline}")
+    results = {}
+    for name, generator, new_state in targets():
+        if args.only and name not in args.only:
+            continue
+        results[name] = run_target(generator, new_state, args, opener)
+        print_report(name, results[name])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'source': source, 'model_complexity': args.model_complexity,
+                       'scheduler': args.scheduler, 'pipeline': args.pipeline, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Headless throughput and per-stage latency of the pose generators.')
+    parser.add_argument('--frames', type=int, default=300, help='Measured frames per generator.')
+    parser.add_argument('--warmup', type=int, default=10, help='Frames run before measuring starts.')
+    parser.add_argument('--source', help="Frame source spec as in FRAME_SOURCE, e.g. video:workout.mp4 or images:frames/.")
+    parser.add_argument('--image', help='Still photo to loop as the camera (default: synthetic frames).')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--source-fps', type=float, default=0, help='Pace the synthetic source (0 = as fast as consumed).')
+    parser.add_argument('--model-complexity', type=int, default=DEFAULT_MODEL_COMPLEXITY, choices=(0, 1, 2))
+    parser.add_argument('--scheduler', choices=('every', 'adaptive'), default='every',
+                        help="'every' infers on each frame; 'adaptive' uses the production InferenceScheduler.")
+    parser.add_argument('--pipeline', choices=('threads', 'sequential'), default='threads',
+                        help="'threads' runs analyse and encode on their own threads; 'sequential' runs every stage in turn.")
+    parser.add_argument('--only', nargs='+', help='Generators to run (default: all).')
+    parser.add_argument('--json', help='Also write the results to this file, for comparing runs.')
+    run(parser.parse_args())
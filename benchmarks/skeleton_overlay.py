@@ -0,0 +1,89 @@
+# benchmarks/skeleton_overlay.py - Per-frame skeleton overlay cost: mp_drawing.draw_landmarks vs. SkeletonRenderer
+import argparse
+import math
+import timeit
+
+import numpy as np
+
+from fitjourney.exercise_engine import SKELETON, YELLOW, GREEN
+from fitjourney.pose_process import LandmarkList
+from fitjourney.vision import cv2, mp_drawing
+from fitjourney.webcam_stream import LANDMARK_COUNT, POSE_CONNECTIONS
+
+# A person standing with arms out, as (x, y) in the frame: face, arms and hands, then legs and feet.
+STANDING_POSE = [
+    (0.50, 0.16), (0.49, 0.14), (0.48, 0.14), (0.47, 0.14), (0.51, 0.14), (0.52, 0.14), (0.53, 0.14),
+    (0.46, 0.15), (0.54, 0.15), (0.49, 0.18), (0.51, 0.18),
+    (0.43, 0.26), (0.57, 0.26), (0.35, 0.30), (0.65, 0.30), (0.27, 0.33), (0.73, 0.33),
+    (0.25, 0.34), (0.75, 0.34), (0.25, 0.33), (0.75, 0.33), (0.26, 0.32), (0.74, 0.32),
+    (0.45, 0.52), (0.55, 0.52), (0.44, 0.68), (0.56, 0.68), (0.44, 0.84), (0.56, 0.84),
+    (0.43, 0.86), (0.57, 0.86), (0.46, 0.87), (0.54, 0.87),
+]
+
+def fake_points():
+    """STANDING_POSE as pose_points returns it, every landmark visible."""
+    points = np.zeros((LANDMARK_COUNT, 4), dtype=np.float32)
+    points[:, :2] = STANDING_POSE
+    points[:, 3] = 0.95
+    return points
+
+def mediapipe_loop(image, landmark_list, connections, landmark_spec, connection_spec):
+    """
+    mediapipe.solutions.drawing_utils.draw_landmarks as MediaPipe 0.10 ships it (visibility
+    and bounds checks, a cv2.line per connection, two cv2.circle per landmark), for
+    timing where MediaPipe itself is not installed.
+    """
+    rows, cols = image.shape[:2]
+    coordinates = {}
+    for index, landmark in enumerate(landmark_list.landmark):
+        if landmark.HasField('visibility') and landmark.visibility < 0.5:
+            continue
+        if 0 <= landmark.x <= 1 and 0 <= landmark.y <= 1:
+            coordinates[index] = (min(math.floor(landmark.x * cols), cols - 1),
+                                  min(math.floor(landmark.y * rows), rows - 1))
+    for start, end in connections:
+        if start in coordinates and end in coordinates:
+            cv2.line(image, coordinates[start], coordinates[end], connection_spec.color, connection_spec.thickness)
+    for point in coordinates.values():
+        border = max(landmark_spec.circle_radius + 1, int(landmark_spec.circle_radius * 1.2))
+        cv2.circle(image, point, border, (224, 224, 224), landmark_spec.thickness)
+        cv2.circle(image, point, landmark_spec.circle_radius, landmark_spec.color, landmark_spec.thickness)
+
+def best_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+def run(args):
+    frame = np.zeros((args.height, args.width, 3), dtype=np.uint8)
+    points = fake_points()
+    landmark_spec = mp_drawing.DrawingSpec(color=GREEN, thickness=3, circle_radius=6)
+    connection_spec = mp_drawing.DrawingSpec(color=YELLOW, thickness=2, circle_radius=2)
+    flagged = frozenset([24, 26, 28])   # right hip, knee, ankle: a failed knee check
+
+    def mediapipe():
+        # As the engine drew before: the landmark objects are built from the pose result first.
+        mp_drawing.draw_landmarks(frame, LandmarkList(points), POSE_CONNECTIONS, landmark_spec, connection_spec)
+
+    cases = {
+        'MediaPipe loop (transcribed)': lambda: mediapipe_loop(frame, LandmarkList(points), POSE_CONNECTIONS,
+                                                               landmark_spec, connection_spec),
+        'mp_drawing.draw_landmarks': mediapipe,
+        'SkeletonRenderer': lambda: SKELETON.draw(frame, points, GREEN),
+        'SkeletonRenderer (flagged)': lambda: SKELETON.draw(frame, points, GREEN, flagged),
+    }
+    print(f"{args.width}x{args.height}, {len(POSE_CONNECTIONS)} connections, {LANDMARK_COUNT} landmarks")
+    baseline = None
+    for name, func in cases.items():
+        us = best_us(func, args.number)
+        baseline = baseline or us
+        print(f"  {name:<30}{us:9.1f} us  {us / baseline:6.2f}x")
+    if args.image:
+        SKELETON.draw(frame, points, GREEN, flagged)
+        cv2.imwrite(args.image, frame)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cost of drawing one skeleton overlay on an MJPEG frame.')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--number', type=int, default=2000, help='Draws per timing run (best of 5 runs).')
+    parser.add_argument('--image', help='Also write one rendered overlay to this file, to check it by eye.')
+    run(parser.parse_args())
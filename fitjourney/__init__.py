@@ -1,13 +1,15 @@
 # davaladarshini/fitjourney/fitjourney-57ed9ec687a77c30868aa9a2eca533cdab423e3d/fitjourney/__init__.py
 
 import os
-from flask import Flask
-from dotenv import load_dotenv
-from .extensions import init_extensions
-from . import stats_calculator 
 
 
 def create_app():
+    # Imported here, not at the top: spawned worker processes (pose_process,
+    # video_analysis) import this package too, and need neither Flask nor the
+    # MongoDB and Gemini clients.
+    from flask import Flask
+    from dotenv import load_dotenv
+    from .extensions import init_extensions
     load_dotenv()
     app = Flask(__name__)
     app.secret_key = os.getenv('FLASK_SECRET_KEY', os.urandom(24).hex())
@@ -31,5 +33,15 @@ def create_app():
     from .adaptive_plans import adaptive_bp
     app.register_blueprint(adaptive_bp)
 
+    # cv2 and MediaPipe load on the first webcam request unless VISION_PRELOAD asks for them now
+    from .vision import VISION_PRELOAD, preload
+    if VISION_PRELOAD:
+        preload()
+
+    # Load the pose model before the first webcam stream asks for it
+    from .pose_pool import POSE_POOL_WARM, warm_in_background
+    if POSE_POOL_WARM:
+        warm_in_background()
+
 
     return app
\ No newline at end of file
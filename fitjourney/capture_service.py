@@ -0,0 +1,143 @@
+# capture_service.py - One camera capture thread fanned out to every stream that needs frames
+import collections
+import threading
+import time
+from .frame_sources import source_opener
+
+# Configuration
+FRAME_RING_SIZE = 4          # most recent frames kept for late/slow subscribers
+CAMERA_IDLE_TIMEOUT = 30.0   # seconds the camera stays open after the last subscriber leaves
+FRAME_WAIT_TIMEOUT = 5.0     # a subscriber gives up if the camera stalls this long
+
+class CaptureService:
+    """
+    Owns the camera on a background thread and keeps the latest frames in a small
+    ring buffer. Every subscriber receives the same frame array (marked read-only),
+    so fan-out costs no copies; a consumer that draws works on the new array its
+    first transform (flip, color conversion) produces anyway.
+
+    The camera stays open for CAMERA_IDLE_TIMEOUT after the last subscriber leaves,
+    so switching between exercises reuses the running device. `opener` returns a
+    frame source (see frame_sources) or None; the default opens FRAME_SOURCE.
+    """
+    def __init__(self, opener=None, ring_size=FRAME_RING_SIZE, idle_timeout=CAMERA_IDLE_TIMEOUT):
+        self._opener = opener or source_opener()
+        self._ring = collections.deque(maxlen=ring_size)
+        self._idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        self._running = False
+        self._subscribers = 0
+        self._idle_since = None
+        self._seq = 0
+
+    @property
+    def subscriber_count(self):
+        return self._subscribers
+
+    @property
+    def is_running(self):
+        return self._running
+
+    def subscribe(self):
+        """Returns a FrameSubscription, opening the camera if needed, or None if it cannot be opened."""
+        with self._cond:
+            if not self._running:
+                camera = self._opener()
+                if camera is None:
+                    return None
+                self._running = True
+                threading.Thread(target=self._run, args=(camera,), name='capture-service', daemon=True).start()
+            self._subscribers += 1
+            self._idle_since = None
+            return FrameSubscription(self, self._seq)
+
+    def _unsubscribe(self):
+        with self._cond:
+            self._subscribers -= 1
+            if self._subscribers == 0:
+                self._idle_since = time.monotonic()
+
+    def latest(self):
+        """Returns the newest (seq, timestamp, frame) without waiting, or None."""
+        with self._cond:
+            return self._ring[-1] if self._ring else None
+
+    def wait_for_frame(self, after_seq, timeout=FRAME_WAIT_TIMEOUT):
+        """Blocks until a frame newer than after_seq exists; None if the camera stopped or stalled."""
+        def has_new_frame():
+            return bool(self._ring) and self._ring[-1][0] > after_seq
+        with self._cond:
+            self._cond.wait_for(lambda: has_new_frame() or not self._running, timeout)
+            return self._ring[-1] if has_new_frame() else None
+
+    def _run(self, camera):
+        stopped = False
+        try:
+            while not stopped:
+                success, frame = camera.read()
+                if not success:
+                    break
+                frame.flags.writeable = False
+                with self._cond:
+                    self._seq += 1
+                    self._ring.append((self._seq, time.monotonic(), frame))
+                    self._cond.notify_all()
+                    if self._idle_since is not None and time.monotonic() - self._idle_since > self._idle_timeout:
+                        # Stopped under the lock that saw the camera idle: a subscribe()
+                        # from here on opens a fresh camera instead of joining this one.
+                        self._stop(camera); stopped = True
+        finally:
+            if not stopped:
+                with self._cond:
+                    self._stop(camera)
+
+    def _stop(self, camera):
+        # Released under the lock so a concurrent subscribe() cannot reopen the
+        # device before this thread has let go of it.
+        camera.release()
+        self._running = False
+        self._ring.clear()
+        self._cond.notify_all()
+
+class FrameSubscription:
+    """Iterates the newest frames of a CaptureService, skipping any it was too slow to see."""
+    def __init__(self, service, start_seq):
+        self._service = service
+        self.last_seq = start_seq
+        self.last_timestamp = None   # capture time (monotonic) of the frame last yielded
+        self.dropped = 0
+        self._closed = False
+
+    def __iter__(self):
+        while not self._closed:
+            item = self._service.wait_for_frame(self.last_seq)
+            if item is None:
+                return
+            seq, timestamp, frame = item
+            if self.last_seq:
+                self.dropped += seq - self.last_seq - 1
+            self.last_seq = seq
+            self.last_timestamp = timestamp
+            yield frame
+
+    def tap(self):
+        """
+        Iterates the newest (timestamp, frame) pairs independently of this subscription,
+        for a second stage of the same stream. It keeps no camera open of its own and
+        ends when the subscription is closed.
+        """
+        last_seq = self.last_seq
+        while not self._closed:
+            item = self._service.wait_for_frame(last_seq)
+            if item is None:
+                return
+            last_seq, timestamp, frame = item
+            yield timestamp, frame
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._service._unsubscribe()
+
+# Process-wide service for the configured FRAME_SOURCE
+CAPTURE_SERVICE = CaptureService()
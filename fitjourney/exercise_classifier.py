@@ -0,0 +1,168 @@
+# exercise_classifier.py - Windowed nearest-centroid exercise classifier for auto-classify mode
+import numpy as np
+
+# Configuration
+AUTO_CLASSIFY_EXERCISES = ("Squat", "Push-up", "Lunge", "Jumping Jack", "Sit-up")
+UNKNOWN = "Unknown"
+ANGLE_NAMES = ('left_knee', 'right_knee', 'left_elbow', 'right_elbow', 'left_hip', 'left_shoulder')   # order of AUTO_CLASSIFY_JOINTS
+WINDOW_SECONDS = 2.0      # angle history a decision looks at: about one slow rep
+WINDOW_CAPACITY = 64      # samples kept per stream (2 s at the scheduler's 30 fps maximum)
+MIN_WINDOW_SAMPLES = 4    # fewer samples than this in the window -> Unknown
+DECISION_INTERVAL = 0.2   # seconds between classifications of a stream, whatever its frame rate
+LOCKED_DECISION_INTERVAL = 0.6   # ...while an exercise is locked, when they only watch for a switch
+PROTOTYPE_TOLERANCE = 25.0   # degrees a prototype's low/high may be off by and still count as close
+REJECT_SCORE = 1.5        # mean squared normalized distance above which a window is Unknown
+MAX_FEATURE_DISTANCE = 2.0   # ...or if any single feature is this many tolerances off
+LOCK_BUFFER_SIZE = 15     # decisions, i.e. the last 3 s
+
+# A rep moves some joints through a range and holds others; an exercise is described
+# by the (lowest, highest) angle each joint that matters reaches within the window.
+# Joints not listed may do anything. These are starting points derived from the old
+# per-frame thresholds; NearestCentroidClassifier.fit refits them from labelled
+# windows (e.g. landmark recordings). The arms tell a squat (down or held forward)
+# from a sit-up (hands behind the head): a window that spans standing up and lying
+# down has a squat's knee and hip range.
+EXERCISE_PROTOTYPES = {
+    "Squat": {'left_knee': (80, 170), 'right_knee': (80, 170), 'left_hip': (85, 170), 'left_shoulder': (15, 95)},
+    "Push-up": {'left_elbow': (85, 165), 'right_elbow': (85, 165), 'left_knee': (165, 178), 'right_knee': (165, 178),
+                'left_hip': (160, 178)},
+    "Lunge": {'left_knee': (105, 170), 'right_knee': (105, 170), 'left_hip': (110, 175)},
+    "Jumping Jack": {'left_shoulder': (20, 160), 'left_elbow': (150, 178), 'right_elbow': (150, 178),
+                     'left_knee': (160, 178), 'right_knee': (160, 178)},
+    "Sit-up": {'left_hip': (45, 135), 'left_knee': (60, 95), 'right_knee': (60, 95), 'left_shoulder': (120, 160)},
+}
+
+class AngleWindow:
+    """Ring buffer of one stream's recent (timestamp, angle vector) samples."""
+    __slots__ = ('times', 'angles', '_next', 'decided_at')
+
+    def __init__(self, capacity=WINDOW_CAPACITY, width=len(ANGLE_NAMES)):
+        self.times = np.full(capacity, -np.inf)
+        self.angles = np.zeros((capacity, width))
+        self._next = 0
+        self.decided_at = -np.inf
+
+    def push(self, now, angles):
+        self.times[self._next] = now
+        self.angles[self._next] = angles
+        self._next = (self._next + 1) % len(self.times)
+
+    def recent(self, now, seconds=WINDOW_SECONDS):
+        """Angle rows sampled within `seconds` before now."""
+        return self.angles[self.times >= now - seconds]
+
+    def clear(self):
+        self.times.fill(-np.inf)
+        self._next = 0
+        self.decided_at = -np.inf
+
+def window_features(angles):
+    """Feature vector of a window of angle rows: per-joint minimum, then per-joint maximum."""
+    return np.concatenate((angles.min(axis=0), angles.max(axis=0)))
+
+class NearestCentroidClassifier:
+    """
+    Scores a window's features against every exercise in one array expression: the
+    weighted squared distance to each centroid, averaged over the features that
+    matter for that exercise. The closest centroid wins unless it is further than
+    REJECT_SCORE on average or MAX_FEATURE_DISTANCE on any one feature, in which
+    case the window is Unknown (standing, resting, walking into frame). The
+    per-feature limit keeps many well-matched held joints from outvoting one joint
+    that plainly does not move like the exercise.
+    """
+    def __init__(self, labels, centroids, weights, reject_score=REJECT_SCORE, max_feature_distance=MAX_FEATURE_DISTANCE):
+        self.labels = tuple(labels)
+        self.centroids = np.asarray(centroids, dtype=np.float64)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self._norm = 1.0 / np.maximum(self.weights.astype(bool).sum(axis=1), 1)
+        self.reject_score = reject_score
+        self.max_feature_score = max_feature_distance ** 2
+
+    @classmethod
+    def from_prototypes(cls, prototypes=EXERCISE_PROTOTYPES, tolerance=PROTOTYPE_TOLERANCE):
+        width = len(ANGLE_NAMES)
+        centroids = np.zeros((len(prototypes), 2 * width))
+        weights = np.zeros_like(centroids)
+        for row, ranges in enumerate(prototypes.values()):
+            for name, (low, high) in ranges.items():
+                col = ANGLE_NAMES.index(name)
+                centroids[row, col], centroids[row, width + col] = low, high
+                weights[row, col] = weights[row, width + col] = 1.0 / tolerance ** 2
+        return cls(prototypes, centroids, weights)
+
+    @classmethod
+    def fit(cls, features, labels, min_std=5.0):
+        """Centroids and per-feature weights (1 / variance) from labelled (n, 12) window features."""
+        features = np.asarray(features, dtype=np.float64); labels = np.asarray(labels)
+        names = [name for name in AUTO_CLASSIFY_EXERCISES if (labels == name).any()]
+        centroids = np.array([features[labels == name].mean(axis=0) for name in names])
+        stds = np.array([np.maximum(features[labels == name].std(axis=0), min_std) for name in names])
+        return cls(names, centroids, 1.0 / stds ** 2)
+
+    def scores(self, features):
+        """(mean, worst) squared normalized distance of features to each centroid."""
+        diff = features - self.centroids
+        weighted = diff * diff * self.weights
+        return weighted.sum(axis=1) * self._norm, weighted.max(axis=1)
+
+    def observe(self, window, now, angles, interval=DECISION_INTERVAL):
+        """Adds a sample to the window; True when a new decision is due, `interval` seconds after the last."""
+        window.push(now, angles)
+        if now - window.decided_at < interval:
+            return False
+        window.decided_at = now
+        return True
+
+    def classify(self, window, now):
+        """Exercise label for the stream's window at time now, or UNKNOWN."""
+        angles = window.recent(now)
+        if len(angles) < MIN_WINDOW_SAMPLES:
+            return UNKNOWN
+        scores, worst = self.scores(window_features(angles))
+        best = int(scores.argmin())
+        if scores[best] > self.reject_score or worst[best] > self.max_feature_score:
+            return UNKNOWN
+        return self.labels[best]
+
+class LockBuffer:
+    """
+    The last `size` window decisions with a running count per label, so the most
+    common label is found in O(labels) instead of rescanning the buffer every frame.
+    """
+    __slots__ = ('labels', 'counts', '_ring', '_next', '_len')
+
+    def __init__(self, labels=AUTO_CLASSIFY_EXERCISES + (UNKNOWN,), size=LOCK_BUFFER_SIZE):
+        self.labels = labels
+        self.counts = [0] * len(labels)
+        self._ring = [None] * size
+        self._next = 0
+        self._len = 0
+
+    def append(self, label):
+        index = self.labels.index(label)
+        evicted = self._ring[self._next]
+        if evicted is not None:
+            self.counts[evicted] -= 1
+        self._ring[self._next] = index
+        self.counts[index] += 1
+        self._next = (self._next + 1) % len(self._ring)
+        self._len = min(self._len + 1, len(self._ring))
+
+    def most_common(self):
+        """(label, count) of the most frequent decision, or (None, 0) when empty."""
+        if not self._len:
+            return None, 0
+        count = max(self.counts)
+        return self.labels[self.counts.index(count)], count
+
+    def clear(self):
+        self.counts = [0] * len(self.labels)
+        self._ring = [None] * len(self._ring)
+        self._next = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+# Shared by every auto-classify stream; per-stream state is the AngleWindow and LockBuffer.
+CLASSIFIER = NearestCentroidClassifier.from_prototypes()
@@ -0,0 +1,255 @@
+# exercise_engine.py - Declarative rep-counting engine shared by every exercise module
+import time
+from .capture_service import CAPTURE_SERVICE
+from .inference_scheduler import InferenceScheduler
+from .landmark_recording import record
+from .pose_pool import POSE_POOLS, PoolExhausted, DEFAULT_MODEL_COMPLEXITY, rgb_input
+from .pose_process import FrameTooLarge, PoseProcessError
+from .session_state import ExerciseState
+from .stage_timer import NULL_TIMER
+from .stream_pipeline import run_stream
+from .stream_metrics import METRICS
+from .skeleton_renderer import SkeletonRenderer
+from .vision import cv2
+from .workout_history import finish_session
+from .webcam_stream import JointAngleKernel, pose_points
+
+# Skeleton colors (BGR)
+YELLOW = (0, 255, 255)
+GREEN = (0, 255, 0)
+RED = (0, 0, 255)
+
+# Yellow connections, landmark dots in the rep's score color; connections between
+# the joints a failed feedback rule measured turn red.
+SKELETON = SkeletonRenderer(connection_color=YELLOW, connection_thickness=2, circle_radius=6, flag_color=RED)
+
+# Shown when the stream's pose graph stops working mid-stream
+POSE_FAILED_MESSAGE = "Pose estimation stopped, please restart the exercise."
+
+class ExerciseSpec:
+    """
+    Everything the engine needs to count one exercise. The data comes straight from
+    the module's TARGET_DATA; the behaviour is a handful of small predicates:
+
+      derive(values)              - optional, adds derived values (averages, front leg...)
+      enter(values, thresholds)   - True when the user reaches the active position
+      exit(values, thresholds)    - True when the user returns to rest (counts a rep)
+      feedback_rules              - [(predicate(values, thresholds, state), message, joints)]
+
+    Messages are format strings over the current values plus `reps`. A rule's optional
+    `joints` names the measure_joints values it checks; the skeleton shows those
+    landmarks' connections in red while the rule fails.
+    """
+    def __init__(self, key, target_data, initial_feedback, enter, exit, feedback_rules=(), derive=None,
+                 rest_state='up', active_state='down', enter_color=YELLOW,
+                 rep_message=None, status_messages=None, idle_messages=None, display_threshold=None):
+        self.key = key
+        self.target_data = target_data
+        self.initial_feedback = initial_feedback
+        self.thresholds = target_data['angle_thresholds']
+        self.kernel = JointAngleKernel(target_data['measure_joints'], target_data.get('angle_kinds'))
+        self.enter = enter
+        self.exit = exit
+        self.feedback_rules = tuple((rule[0], rule[1]) for rule in feedback_rules)
+        measured = target_data['measure_joints']
+        self.rule_landmarks = tuple(
+            frozenset(index for name in (rule[2] if len(rule) > 2 else ()) for index in measured[name])
+            for rule in feedback_rules)
+        self.derive = derive
+        self.rest_state = rest_state
+        self.active_state = active_state
+        self.enter_color = enter_color
+        self.rep_message = rep_message
+        self.status_messages = status_messages or {}
+        self.idle_messages = idle_messages or {}
+        self.display_threshold = display_threshold
+
+    def new_state(self):
+        """Fresh per-session state for this exercise."""
+        return ExerciseState(self.initial_feedback)
+
+class RepCounter:
+    """
+    Runs an ExerciseSpec's state machine over successive (33, 4) landmark arrays,
+    resuming from and publishing to one session's ExerciseState.
+    """
+    def __init__(self, spec, session_state):
+        self.spec = spec
+        self.session_state = session_state
+        self.reps = session_state.reps
+        self.state = session_state.state or spec.rest_state
+        self.feedback = []
+        self.score_color = YELLOW
+        self.flagged = frozenset()   # landmarks of the failing feedback rules' joints
+        self.published_keys = tuple(session_state.values)
+        self.values = dict(session_state.values)
+
+    def update(self, points):
+        """Advances the state machine by one frame and returns the skeleton color."""
+        spec = self.spec; t = spec.thresholds
+        values = dict(self.values)
+        values.update(spec.kernel.measure(points))
+        if spec.derive: spec.derive(values)
+
+        feedback = []; rep_counted = False; color = YELLOW
+        log = self.session_state.history; log.seen()
+        if spec.enter(values, t):
+            self.state = spec.active_state
+            color = spec.enter_color
+        if self.state == spec.active_state and spec.exit(values, t):
+            self.reps += 1
+            self.state = spec.rest_state
+            rep_counted = True
+            color = GREEN
+            log.rep()
+            if spec.rep_message: feedback.append(spec.rep_message.format(reps=self.reps, **values))
+
+        if not feedback and self.state in spec.status_messages:
+            feedback.append(spec.status_messages[self.state])
+
+        warnings = []; flagged = frozenset()
+        for (predicate, message), landmarks in zip(spec.feedback_rules, spec.rule_landmarks):
+            if predicate(values, t, self.state):
+                feedback.append(message.format(reps=self.reps, **values))
+                warnings.append(message)
+                flagged |= landmarks
+                color = RED
+        log.form_warnings(warnings)
+
+        if not feedback:
+            idle = spec.idle_messages
+            if rep_counted: message = idle.get('rep', '')
+            elif self.state == spec.active_state: message = idle.get('active', '')
+            else: message = idle.get('ready', '')
+            feedback.append(message.format(reps=self.reps, **values))
+
+        self.values = values
+        self.feedback = feedback
+        self.score_color = color
+        self.flagged = flagged
+        return color
+
+    def count(self, points):
+        """Counts one frame (None when no pose was found) without publishing it; returns the skeleton color."""
+        if points is None:
+            self.no_pose(); return YELLOW
+        try:
+            return self.update(points)
+        except Exception as e:
+            self.tracking_error(e); return YELLOW
+
+    def no_pose(self):
+        self.feedback = ["No Pose Detected."]; self.state = 'WAIT'
+
+    def tracking_error(self, error):
+        print(f"Tracking error: {error}")
+        METRICS.tracking_error(self.spec.key)
+        self.feedback = ["Tracking Error."]; self.state = 'ERROR'
+
+    def publish(self):
+        target = self.session_state
+        target.feedback = self.feedback
+        target.reps = self.reps
+        target.state = self.state
+        target.values = {key: self.values[key] for key in self.published_keys}
+        target.touch()
+        target.notify_if_changed()
+
+    def fail(self, message):
+        """Shows why the stream could not run or stopped (no camera, no free or no working pose graph)."""
+        self.session_state.feedback = [message]; self.session_state.notify_if_changed()
+
+    def finish(self):
+        finish_session(self.session_state, self.spec.key)
+
+def count_frame(spec, session_state, points):
+    """
+    Counts one frame of landmarks (None when no pose was found) into a session's state;
+    returns (skeleton color, flagged landmarks) for the browser overlay.
+    """
+    counter = RepCounter(spec, session_state)
+    color = counter.count(points)
+    counter.publish()
+    return color, counter.flagged
+
+def generate_frames(spec, session_state, model_complexity=None, **options):
+    """
+    MJPEG generator for one exercise: capture, infer, count, draw, encode, pipelined
+    across threads by stream_pipeline. The options (capture, scheduler, timer,
+    pipelined) default to the shared camera, a fresh InferenceScheduler, no timing
+    and PIPELINE_STREAMS; benchmarks pass their own.
+    """
+    return stream_counter(RepCounter(spec, session_state), model_complexity, **options)
+
+def stream_counter(counter, model_complexity=None, capture=None, scheduler=None, timer=NULL_TIMER, pipelined=None):
+    """
+    The generator behind generate_frames, over anything shaped like a RepCounter: its
+    spec and session_state are read on every inference, so a counter that moves on to
+    another exercise (guided_workout) keeps this stream's camera and pose graph.
+    """
+    frames = (capture or CAPTURE_SERVICE).subscribe()
+    if frames is None:
+        counter.fail("FATAL ERROR: Camera could not be opened."); return
+    if model_complexity is None:
+        model_complexity = DEFAULT_MODEL_COMPLEXITY
+
+    # The scheduler picks which frames get inference; the others reuse the last
+    # skeleton so the overlay does not flicker.
+    scheduler = scheduler or InferenceScheduler()
+    frame_rgb = None; color = YELLOW
+
+    def prepare(frame):
+        # Shared capture frames are read-only; the flip gives this stream its own copy.
+        return cv2.flip(frame, 1)
+
+    def analyse(frame, started, timer):
+        nonlocal frame_rgb, color
+        # Inference gets an RGB copy in a reused buffer (a pose process's shared
+        # memory); drawing happens on the BGR frame directly, so there is no
+        # RGB->BGR round trip.
+        frame_rgb = rgb_input(pose, frame, frame_rgb)
+        timer.lap('cvtColor')
+        frame_rgb.flags.writeable = False
+        results = pose.process(frame_rgb)
+        frame_rgb.flags.writeable = True
+        timer.lap('pose.process')
+
+        points = smoothed = overlay = None
+        if results.pose_landmarks:
+            try:
+                points = pose_points(results.pose_landmarks)
+                # Counting sees smoothed landmarks; the skeleton is drawn from the raw ones.
+                smoothed = counter.session_state.landmark_filter(points, started)
+                color = counter.update(smoothed)
+                overlay = (points, color, counter.flagged)
+            except Exception as e:
+                counter.tracking_error(e)
+        else:
+            counter.session_state.landmark_filter.reset()
+            counter.no_pose()
+        record(counter.session_state, counter.spec.key, points, 'server')
+        counter.publish()
+        scheduler.record_inference(started, smoothed, time.monotonic() - started)
+        timer.lap('angle_math')
+        return overlay
+
+    def draw(frame, overlay):
+        if overlay is None:
+            return False
+        SKELETON.draw(frame, *overlay)
+        return True
+
+    try:
+        # A pre-warmed graph from the pool: no model load before the first frame.
+        with POSE_POOLS.checkout(model_complexity) as pose:
+            yield from run_stream(frames, scheduler, prepare, analyse, draw, timer, pipelined)
+    except PoolExhausted:
+        counter.fail("Server is busy, please try again shortly.")
+    except (PoseProcessError, FrameTooLarge) as e:
+        # The graph's process died or hung (the pool drops it), or the camera's frames
+        # do not fit its ring: end the stream with a message instead of a broken response.
+        print(f"Pose estimation stopped mid-stream: {e}")
+        counter.fail(POSE_FAILED_MESSAGE)
+    finally:
+        frames.close()
+        counter.finish()
@@ -0,0 +1,358 @@
+# feedback_store.py - Session feedback in a memory-mapped table every gunicorn worker on the host can read
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:   # Windows: single-process servers only, the thread lock is enough
+    fcntl = None
+
+# Configuration
+FEEDBACK_STORE_PATH = os.getenv('FEEDBACK_STORE_PATH', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'fitjourney-feedback'))
+FEEDBACK_STORE_SLOTS = int(os.getenv('FEEDBACK_STORE_SLOTS', 4096))   # records for all workers' sessions, with room to keep probes short
+RECORD_SIZE = 1024             # bytes per record, header included
+MAX_PROBES = 16                # slots tried after a key's home slot before the table counts as full
+RECORD_TTL = 15 * 60           # seconds after its last write a record is treated as gone (SESSION_TTL)
+PUBLISH_INTERVAL = 0.25        # seconds between writes of a session whose reps, state and feedback did not change
+VIEW_POLL_INTERVAL = 0.1       # seconds between checks of a record watched from another worker
+READ_RETRIES = 16              # reads overlapping a write are retried this often before giving up
+
+# File header: magic, layout version, slot count, record size.
+_FILE_HEADER = struct.Struct('<4sIII')
+_MAGIC, _LAYOUT = b'FJFB', 2
+# Record header: seqlock counter (odd while a write is in progress), key digest,
+# write time (wall clock), state version, payload length, pid of the owning worker.
+# The JSON payload follows.
+_RECORD_HEADER = struct.Struct('<I16sdIII')
+_SEQ = struct.Struct('<I')
+_EMPTY_DIGEST = bytes(16)
+
+class FeedbackSnapshot:
+    """
+    One published state, never changed after it is built: the data, its JSON body and
+    an ETag of the body. A state swaps in a new snapshot as one reference assignment,
+    so a reader that takes state.snapshot once sees one consistent state and serves
+    the body as is. The ETag depends only on the body, so every worker tags the same
+    content alike.
+    """
+    __slots__ = ('version', 'data', 'body', 'etag')
+
+    def __init__(self, version, data, body=None):
+        self.version = version
+        self.data = data
+        self.body = body if body is not None else json.dumps(data, separators=(',', ':')).encode()
+        self.etag = hashlib.blake2b(self.body, digest_size=8).hexdigest()
+
+    @classmethod
+    def from_body(cls, body, version):
+        return cls(version, json.loads(body), body)
+
+def _digest(session_id, key):
+    return hashlib.blake2b(f'{session_id}\0{key}'.encode(), digest_size=16).digest()
+
+def _live(pid):
+    """pid if that process is running (this one always is), else None."""
+    if not pid or pid == os.getpid() or fcntl is None:   # Windows: one process, and os.kill(pid, 0) is a Ctrl+C
+        return pid or None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass   # running as another user
+    return pid
+
+class FeedbackStore:
+    """
+    Fixed-size records of each active session's published snapshot (JSON body plus
+    version) in a file mapped by every worker process, so /get_feedback, /exercise_info
+    and the SSE stream answer from any worker, not only from the one running the
+    session's stream. A record lives at the hash of (session id, exercise) with linear
+    probing over at most MAX_PROBES slots, so a read is a few header compares and one
+    1 KB copy, with no lock and no system call.
+
+    A record also names the worker that owns the session: the one whose SESSIONS holds
+    the counting state. Ownership is claimed when a worker creates that state and lasts
+    while the worker lives; other workers relay ingest to the owner (ingest_relay) and
+    serve its record, and their writes to the record are refused.
+
+    Writers serialize on a thread lock plus an fcntl lock on the file. Readers use the
+    record's seqlock counter: a read that overlaps a write sees the counter odd or
+    changed and tries again. If the file cannot be opened, the store stays disabled
+    and every call is a cheap no-op.
+    """
+    def __init__(self, path=FEEDBACK_STORE_PATH, slots=FEEDBACK_STORE_SLOTS, record_size=RECORD_SIZE):
+        self.path = path
+        self.slots = slots
+        self.record_size = record_size
+        self._lock = threading.Lock()
+        self._map = None
+        self._fd = None
+        self._opened = False
+        self.oversized = 0   # snapshots not written because their body did not fit
+
+    @property
+    def enabled(self):
+        return self._open() is not None
+
+    def _open(self):
+        if self._opened:
+            return self._map
+        with self._lock:
+            if not self._opened:
+                try:
+                    self._map = self._map_file()
+                except OSError as e:
+                    print(f"Shared feedback store unavailable ({self.path}): {e}; feedback is per worker.")
+                self._opened = True
+        return self._map
+
+    def _map_file(self):
+        size = _FILE_HEADER.size + self.slots * self.record_size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with _FileLock(fd):
+                header = os.pread(fd, _FILE_HEADER.size, 0)
+                if header != _FILE_HEADER.pack(_MAGIC, _LAYOUT, self.slots, self.record_size):
+                    # New file, or one laid out by a different version or configuration: start empty.
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, _FILE_HEADER.pack(_MAGIC, _LAYOUT, self.slots, self.record_size), 0)
+            mapped = mmap.mmap(fd, size)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return mapped
+
+    def _offset(self, slot):
+        return _FILE_HEADER.size + slot * self.record_size
+
+    def _probe(self, digest):
+        home = int.from_bytes(digest[:8], 'little') % self.slots
+        return [(home + i) % self.slots for i in range(MAX_PROBES + 1)]
+
+    def write(self, session_id, key, payload, version=0):
+        """
+        Publishes one session's JSON body; False if the store is disabled, full or the body
+        too large, or if another live worker owns the session (a stale copy here must not
+        overwrite what the session's owner publishes).
+        """
+        mapped = self._open()
+        if mapped is None:
+            return False
+        if len(payload) > self.record_size - _RECORD_HEADER.size:
+            self.oversized += 1
+            return False
+        digest = _digest(session_id, key)
+        pid = os.getpid()
+        now = time.time()
+        with self._lock, _FileLock(self._fd):
+            slot = self._find_slot(mapped, digest, now)
+            if slot is None or self._owner_at(mapped, slot, digest, now) not in (None, pid):
+                return False
+            self._put(mapped, slot, digest, now, version, payload, pid)
+        return True
+
+    def claim(self, session_id, key, take_over=False):
+        """
+        Makes this process the owner of a session nobody live owns (or, with take_over, of
+        any session) and returns the owner's pid: os.getpid() if this process owns it now,
+        another worker's pid if that worker keeps it, None if the store is disabled or full.
+        A claimed record has no body until the new owner publishes.
+        """
+        mapped = self._open()
+        if mapped is None:
+            return None
+        pid = os.getpid()
+        owner = self.owner(session_id, key)
+        if owner == pid or (owner is not None and not take_over):
+            return owner
+        digest = _digest(session_id, key)
+        now = time.time()
+        with self._lock, _FileLock(self._fd):
+            slot = self._find_slot(mapped, digest, now)
+            if slot is None:
+                return None
+            owner = self._owner_at(mapped, slot, digest, now)
+            if owner is not None and owner != pid and not take_over:
+                return owner
+            if owner != pid:
+                self._put(mapped, slot, digest, now, 0, b'', pid)
+        return pid
+
+    def _put(self, mapped, slot, digest, now, version, payload, pid):
+        """Writes one record under its seqlock (writer lock held)."""
+        offset = self._offset(slot)
+        seq = _SEQ.unpack_from(mapped, offset)[0]
+        _SEQ.pack_into(mapped, offset, (seq + 1) & 0xFFFFFFFF)
+        _RECORD_HEADER.pack_into(mapped, offset, (seq + 1) & 0xFFFFFFFF, digest, now, version, len(payload), pid)
+        end = offset + _RECORD_HEADER.size
+        mapped[end:end + len(payload)] = payload
+        _SEQ.pack_into(mapped, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def _find_slot(self, mapped, digest, now):
+        """The key's slot, else the first empty or expired one on its probe path (writer lock held)."""
+        free = None
+        for slot in self._probe(digest):
+            _, stored, updated, _, _, _ = _RECORD_HEADER.unpack_from(mapped, self._offset(slot))
+            if stored == digest:
+                return slot
+            if free is None and (stored == _EMPTY_DIGEST or now - updated > RECORD_TTL):
+                free = slot
+        return free
+
+    def _owner_at(self, mapped, slot, digest, now):
+        """Live owner pid of the key's record in `slot`, or None (writer lock held)."""
+        _, stored, updated, _, _, owner = _RECORD_HEADER.unpack_from(mapped, self._offset(slot))
+        if stored != digest or now - updated > RECORD_TTL:
+            return None
+        return _live(owner)
+
+    def _lookup(self, session_id, key):
+        """A consistent copy of the key's unexpired record, or None."""
+        mapped = self._open()
+        if mapped is None:
+            return None
+        digest = _digest(session_id, key)
+        for slot in self._probe(digest):
+            offset = self._offset(slot)
+            for _ in range(READ_RETRIES):
+                seq = _SEQ.unpack_from(mapped, offset)[0]
+                if seq & 1:
+                    continue
+                record = mapped[offset:offset + self.record_size]
+                if _SEQ.unpack_from(mapped, offset)[0] == seq:
+                    break
+            else:
+                return None   # written to continuously; callers fall back to their default
+            stored, updated = _RECORD_HEADER.unpack_from(record)[1:3]
+            if stored == digest:
+                return record if time.time() - updated <= RECORD_TTL else None
+            if stored == _EMPTY_DIGEST:
+                return None
+        return None
+
+    def read(self, session_id, key):
+        """(JSON body, version) of a session's newest published snapshot, or None."""
+        record = self._lookup(session_id, key)
+        if record is None:
+            return None
+        version, length = _RECORD_HEADER.unpack_from(record)[3:5]
+        if not length:
+            return None   # claimed, nothing published yet
+        return record[_RECORD_HEADER.size:_RECORD_HEADER.size + length], version
+
+    def owner(self, session_id, key):
+        """Pid of the live process that owns a session, or None if nobody does (or the store is disabled)."""
+        record = self._lookup(session_id, key)
+        return None if record is None else _live(_RECORD_HEADER.unpack_from(record)[5])
+
+    def remove(self, session_id, key):
+        """Expires a session's record, unless another live worker owns it: a stale copy evicted here must not end it."""
+        mapped = self._open()
+        if mapped is None:
+            return
+        digest = _digest(session_id, key)
+        with self._lock, _FileLock(self._fd):
+            for slot in self._probe(digest):
+                offset = self._offset(slot)
+                if _RECORD_HEADER.unpack_from(mapped, offset)[1] == digest:
+                    if self._owner_at(mapped, slot, digest, time.time()) not in (None, os.getpid()):
+                        return
+                    # Expired rather than emptied, so later records on the same probe path stay reachable.
+                    self._put(mapped, slot, digest, 0.0, 0, b'', 0)
+                    return
+
+    def handle(self, session_id, key):
+        """Publisher bound to one session, attached to its state by the SessionStore."""
+        return FeedbackPublisher(self, session_id, key)
+
+    def view(self, session_id, key, default):
+        """Read-only stand-in for a session state that lives in another worker (see feedback_events)."""
+        return SharedFeedbackView(self, session_id, key, default)
+
+class _FileLock:
+    """Exclusive fcntl lock on the whole store file; the thread lock already covers this process."""
+    __slots__ = ('_fd',)
+
+    def __init__(self, fd):
+        self._fd = fd
+
+    def __enter__(self):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+class FeedbackPublisher:
+    """
+    Writes one session's state to the store when its version moves, and otherwise at
+    most every PUBLISH_INTERVAL, so the angles other workers serve stay fresh without
+    a store write per frame.
+    """
+    __slots__ = ('_store', '_session_id', '_key', '_version', '_written_at')
+
+    def __init__(self, store, session_id, key):
+        self._store = store
+        self._session_id = session_id
+        self._key = key
+        self._version = None
+        self._written_at = 0.0
+
+    def publish(self, snapshot):
+        now = time.monotonic()
+        if snapshot.version == self._version and now - self._written_at < PUBLISH_INTERVAL:
+            return
+        self._version = snapshot.version
+        self._written_at = now
+        self._store.write(self._session_id, self._key, snapshot.body, snapshot.version)
+
+    def remove(self):
+        self._store.remove(self._session_id, self._key)
+
+class SharedFeedbackView:
+    """
+    The snapshot/wait_for_change/touch side of a session state, answered from the
+    store: what feedback_events needs to stream a session another worker runs.
+    Changes are picked up by polling the record every VIEW_POLL_INTERVAL.
+    """
+    def __init__(self, store, session_id, key, default):
+        self._store = store
+        self._session_id = session_id
+        self._key = key
+        self.snapshot = FeedbackSnapshot(0, default)
+        self._refresh()
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    def _refresh(self):
+        record = self._store.read(self._session_id, self._key)
+        if record is not None and (record[1] != self.version or record[0] != self.snapshot.body):
+            self.snapshot = FeedbackSnapshot.from_body(*record)
+
+    def wait_for_change(self, version, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            self._refresh()
+            remaining = deadline - time.monotonic()
+            if self.version != version or remaining <= 0:
+                return self.version
+            time.sleep(min(VIEW_POLL_INTERVAL, remaining))
+
+    def touch(self):
+        pass   # the owning worker keeps its state alive; a watcher cannot
+
+# Process-wide store; every worker maps the same file
+FEEDBACK_STORE = FeedbackStore()
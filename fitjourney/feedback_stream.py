@@ -0,0 +1,44 @@
+# feedback_stream.py - Server-Sent Events channel pushing session feedback deltas to the browser
+import json
+import time
+
+SSE_MIMETYPE = 'text/event-stream'
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+# Configuration
+COALESCE_WINDOW = 1 / 30     # changes landing within one frame of each other go out as one event
+KEEPALIVE_INTERVAL = 15.0    # idle seconds before a comment line keeps proxies from closing the stream
+RETRY_MS = 2000              # reconnect delay the browser's EventSource should use
+
+_MISSING = object()
+
+def sse_event(data, event_id=None):
+    """Encodes one SSE message carrying JSON data."""
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}data: {json.dumps(data, separators=(",", ":"))}\n\n'.encode()
+
+def feedback_events(state):
+    """
+    Generator of SSE messages for one session state (ExerciseState, AutoClassifyState
+    or a SharedFeedbackView). The first message is the full state; after that only the
+    keys whose values changed are sent, and only when the state's version moves (reps,
+    stage or feedback changed).
+    """
+    yield f'retry: {RETRY_MS}\n\n'.encode()
+    sent = {}
+    version = None
+    while True:
+        if version is not None:
+            current = state.wait_for_change(version, KEEPALIVE_INTERVAL)
+            if current == version:
+                # Keeps the session from expiring while its page is open.
+                state.touch()
+                yield b': keepalive\n\n'
+                continue
+            time.sleep(COALESCE_WINDOW)
+        snapshot = state.snapshot
+        version = snapshot.version
+        delta = {key: value for key, value in snapshot.data.items() if sent.get(key, _MISSING) != value}
+        sent = snapshot.data
+        if delta:
+            yield sse_event(delta, version)
@@ -0,0 +1,153 @@
+# frame_sources.py - Where the capture service gets its frames: camera, video file, image directory or synthetic
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+from .vision import cv2
+from .webcam_stream import CAMERA_WIDTH, CAMERA_HEIGHT, CAMERA_FPS
+
+# Configuration
+# FRAME_SOURCE picks the source as kind[:argument]:
+#   camera[:index]         - a live camera (default: device 0)
+#   video:<path>           - a video file, looped, played at its own frame rate
+#   images:<directory>     - the directory's images in name order, looped, at SOURCE_FPS
+#   synthetic[:WxH]        - generated frames at SOURCE_FPS, no hardware needed
+FRAME_SOURCE = os.getenv('FRAME_SOURCE', 'camera')
+SOURCE_FPS = float(os.getenv('SOURCE_FPS', 30))
+CAMERA_FOURCC = os.getenv('CAMERA_FOURCC', 'MJPG')   # compressed capture lets USB cameras reach 640x480 at full rate
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+SYNTHETIC_FRAMES = 30     # distinct frames cycled by the synthetic source
+
+# Every source has the cv2.VideoCapture surface the capture thread uses:
+# read() -> (ok, frame) and release().
+
+class _Pacer:
+    """Sleeps so successive read() calls are at most `fps` per second; fps 0 means unpaced."""
+    def __init__(self, fps):
+        self.interval = 1.0 / fps if fps else 0.0
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        # A slow consumer does not earn a burst of catch-up frames afterwards.
+        self._next = max(self._next + self.interval, time.monotonic())
+
+def open_camera(index=0, width=CAMERA_WIDTH, height=CAMERA_HEIGHT, fps=CAMERA_FPS, fourcc=CAMERA_FOURCC):
+    """
+    Opens a live camera and negotiates fourcc, resolution and rate. DirectShow is only
+    tried on Windows; elsewhere OpenCV picks the backend (V4L2 on Linux). Returns None
+    when no camera can be opened.
+    """
+    camera = cv2.VideoCapture(index, cv2.CAP_DSHOW) if sys.platform == 'win32' else None
+    if camera is None or not camera.isOpened():
+        camera = cv2.VideoCapture(index)
+    if not camera.isOpened():
+        return None
+    # The fourcc must be set before the resolution for most drivers to honour both.
+    if fourcc:
+        camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    camera.set(cv2.CAP_PROP_FRAME_WIDTH, width); camera.set(cv2.CAP_PROP_FRAME_HEIGHT, height); camera.set(cv2.CAP_PROP_FPS, fps)
+    return camera
+
+class VideoFileSource:
+    """A video file played at its own frame rate (or `fps`), rewinding at the end when loop is set."""
+    def __init__(self, path, loop=True, fps=None):
+        self._capture = cv2.VideoCapture(path)
+        if not self._capture.isOpened():
+            raise ValueError(f"Cannot open video: {path}")
+        self._loop = loop
+        self._pacer = _Pacer(fps if fps is not None else (self._capture.get(cv2.CAP_PROP_FPS) or SOURCE_FPS))
+
+    def read(self):
+        self._pacer.wait()
+        ok, frame = self._capture.read()
+        if not ok and self._loop:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._capture.read()
+        return ok, frame
+
+    def release(self):
+        self._capture.release()
+
+class ImageDirectorySource:
+    """The images of a directory in name order at `fps`, looping when loop is set."""
+    def __init__(self, directory, fps=SOURCE_FPS, loop=True):
+        self._paths = sorted(p for p in glob.glob(os.path.join(directory, '*')) if p.lower().endswith(IMAGE_EXTENSIONS))
+        if not self._paths:
+            raise ValueError(f"No images in {directory}")
+        self._loop = loop
+        self._index = 0
+        self._pacer = _Pacer(fps)
+
+    def read(self):
+        if self._index >= len(self._paths):
+            if not self._loop:
+                return False, None
+            self._index = 0
+        self._pacer.wait()
+        frame = cv2.imread(self._paths[self._index])
+        self._index += 1
+        return frame is not None, frame
+
+    def release(self):
+        pass
+
+class SyntheticSource:
+    """
+    Generated frames at `fps`: a gradient sweeping across seeded noise, so consecutive
+    frames differ like camera frames do (JPEG encoding cost stays realistic). Given
+    `frames`, cycles those instead, e.g. a still photo for realistic pose timings.
+    """
+    def __init__(self, width=CAMERA_WIDTH, height=CAMERA_HEIGHT, fps=SOURCE_FPS, frames=None):
+        if frames is None:
+            rng = np.random.default_rng(0)
+            noise = rng.integers(0, 64, (height, width, 3), dtype=np.uint8)
+            ramp = np.linspace(0, 191, width, dtype=np.float32)
+            frames = []
+            for i in range(SYNTHETIC_FRAMES):
+                shifted = np.roll(ramp, i * width // SYNTHETIC_FRAMES).astype(np.uint8)
+                frames.append(noise + shifted[None, :, None])
+        self._frames = frames
+        self._index = 0
+        self._pacer = _Pacer(fps)
+
+    def read(self):
+        self._pacer.wait()
+        frame = self._frames[self._index % len(self._frames)]
+        self._index += 1
+        # The capture service marks frames read-only, so each read hands out its own array.
+        return True, frame.copy()
+
+    def release(self):
+        pass
+
+def open_source(spec=None):
+    """Opens the source described by spec (default FRAME_SOURCE); None if it cannot be opened."""
+    kind, _, argument = (spec or FRAME_SOURCE).partition(':')
+    try:
+        if kind == 'camera':
+            return open_camera(int(argument) if argument else 0)
+        if kind == 'video':
+            return VideoFileSource(argument)
+        if kind == 'images':
+            return ImageDirectorySource(argument)
+        if kind == 'synthetic':
+            if argument:
+                width, height = (int(v) for v in argument.lower().split('x'))
+                return SyntheticSource(width, height)
+            return SyntheticSource()
+    except ValueError as e:
+        print(f"Frame source {spec or FRAME_SOURCE!r} unavailable: {e}")
+        return None
+    raise ValueError(f"Unknown frame source kind: {kind!r}")
+
+def source_opener(spec=None):
+    """A zero-argument opener for CaptureService."""
+    return lambda: open_source(spec)
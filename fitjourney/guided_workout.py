@@ -0,0 +1,140 @@
+# guided_workout.py - Saved custom workouts run exercise after exercise through one webcam stream
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+
+from . import exercise_engine
+from .exercise_engine import RepCounter, GREEN, YELLOW
+from .session_state import GuidedWorkoutState
+from .workout_history import finish_session
+
+GUIDED_WORKOUT_KEY = 'guided_workout'
+
+# Workout builder exercises (routes_ai_workouts.STATIC_EXERCISE_LIBRARY) the webcam
+# trainer can count, by EXERCISE_DISPATCHER key; dispatcher keys are accepted as they are.
+WORKOUT_EXERCISES = {
+    'Bodyweight Squats': 'body_weight_squats',
+    'Jumping Jacks': 'jumping_jack',
+}
+DEFAULT_SETS = 1
+DEFAULT_REPS = 10
+
+# What the feedback routes answer for a session that has no guided workout running
+GUIDED_NOT_STARTED = {'feedback': ['No guided workout started.'], 'reps': 0, 'state': 'WAIT'}
+
+def load_workout(workout_id, owner):
+    """The owner's saved custom workout, or None if the id is malformed or not theirs."""
+    from . import extensions
+    try:
+        query = {'_id': ObjectId(workout_id), 'user_email': owner}
+    except (InvalidId, TypeError):
+        return None
+    return extensions.custom_workouts_collection.find_one(query)
+
+def _count(value, default):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+def plan_sets(entries, dispatcher):
+    """
+    Expands a saved workout's exercises into the (key, spec, reps, set number, set
+    count) list GuidedWorkoutState runs. Returns (sets, skipped): exercises the
+    trainer cannot count (timed ones, or no ExerciseSpec) are skipped by name.
+    """
+    sets, skipped = [], []
+    for entry in entries or ():
+        if not isinstance(entry, dict):
+            continue
+        name = entry.get('name', '')
+        key = WORKOUT_EXERCISES.get(name, name)
+        if entry.get('type') == 'duration' or key not in dispatcher:
+            skipped.append(name); continue
+        count = _count(entry.get('sets'), DEFAULT_SETS)
+        reps = _count(entry.get('reps'), DEFAULT_REPS)
+        spec = dispatcher[key]['spec']
+        sets.extend((key, spec, reps, number, count) for number in range(1, count + 1))
+    return sets, skipped
+
+def new_workout_state(document, dispatcher):
+    """(GuidedWorkoutState for a saved workout document or None if nothing in it can be counted, skipped names)."""
+    sets, skipped = plan_sets(document.get('workout_session'), dispatcher)
+    if not sets:
+        return None, skipped
+    created_on = document.get('created_on')
+    title = f"Custom workout of {created_on:%d %b %Y}" if created_on else "Custom workout"
+    return GuidedWorkoutState(str(document['_id']), title, sets), skipped
+
+class GuidedCounter:
+    """
+    A RepCounter for exercise_engine.stream_counter that follows a GuidedWorkoutState:
+    it counts into the current set, and when publish() finds the target reached the
+    state moves on and the next frame is counted with the next set's spec. Only the
+    counter changes; the stream's camera subscription and pose graph stay as they are.
+    """
+    def __init__(self, workout):
+        self.workout = workout
+        self._counter = None
+
+    @property
+    def counter(self):
+        # Rebuilt whenever the state has moved on, whether this stream or an ingest request moved it.
+        if self._counter is None or self._counter.session_state is not self.workout.current:
+            self._counter = RepCounter(self.workout.spec, self.workout.current)
+        return self._counter
+
+    @property
+    def spec(self):
+        return self.counter.spec
+
+    @property
+    def session_state(self):
+        return self.counter.session_state
+
+    @property
+    def flagged(self):
+        return self.counter.flagged
+
+    def update(self, points):
+        if self.workout.finished:
+            return GREEN
+        return self.counter.update(points)
+
+    def no_pose(self):
+        if not self.workout.finished:
+            self.counter.no_pose()
+
+    def tracking_error(self, error):
+        self.counter.tracking_error(error)
+
+    def publish(self):
+        if not self.workout.finished:
+            self.counter.publish()
+            self.workout.advance_if_done()
+        self.workout.touch(); self.workout.notify_if_changed()
+
+    def fail(self, message):
+        self.counter.fail(message); self.workout.notify_if_changed()
+
+    def finish(self):
+        finish_session(self.workout, GUIDED_WORKOUT_KEY)
+
+def generate_guided_frames(workout, model_complexity=None, **options):
+    """MJPEG generator that runs a whole guided workout on one capture subscription and pose graph."""
+    return exercise_engine.stream_counter(GuidedCounter(workout), model_complexity, **options)
+
+def count_guided_frame(workout, points):
+    """Ingest counterpart of the stream: counts one frame into the current set; (smoothed points, color, flagged)."""
+    counter = GuidedCounter(workout)
+    smoothed = workout.landmark_filter(points)
+    color = YELLOW
+    if smoothed is None:
+        counter.no_pose()
+    else:
+        try:
+            color = counter.update(smoothed)
+        except Exception as e:
+            counter.tracking_error(e)
+    counter.publish()
+    return smoothed, color, counter.flagged
@@ -0,0 +1,261 @@
+# inference_pool.py - Bounded pool of pre-warmed MediaPipe Pose workers for frames posted by browsers
+import collections
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from .pose_pool import create_pose, rgb_input, DEFAULT_MODEL_COMPLEXITY
+from .stage_timer import NULL_TIMER
+from .vision import cv2
+from .webcam_stream import pose_points
+
+# Configuration
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', min(4, os.cpu_count() or 1)))
+MAX_PENDING_STREAMS = INFERENCE_WORKERS * 4   # streams allowed to wait for a worker before new frames are refused
+MAX_FRAME_AGE = 0.5          # seconds a frame may wait for a worker before it is dropped as stale
+TARGET_STREAM_FPS = 15       # per-stream inference rate used for the capacity estimate
+ACTIVE_STREAM_WINDOW = 5.0   # a stream counts as active this long after its last frame
+STATS_EMA_ALPHA = 0.1
+POSE_RETRY_DELAY = 1.0       # seconds before a worker retries a Pose graph that failed to start; doubles per failure
+POSE_RETRY_MAX_DELAY = 30.0
+
+class FrameDropped(Exception):
+    """The frame was superseded by a newer one from the same stream, or went stale waiting for a worker."""
+
+class PoolSaturated(Exception):
+    """Too many streams are already waiting for a worker; the client should back off."""
+
+class PoolUnavailable(Exception):
+    """No worker could start a Pose graph; frames cannot be processed until one does."""
+
+class InferencePool:
+    """
+    Worker threads that each own one pre-warmed Pose graph from create_pose: by default
+    a pose process fed through shared memory, so inference runs on its own core and the
+    threads here only decode frames and run handlers.
+
+    Back-pressure is per stream: each stream key has one latest-wins slot, so a frame
+    arriving while an older one is still queued replaces it and the older request fails
+    with FrameDropped. Frames that waited longer than MAX_FRAME_AGE are dropped as well,
+    and once MAX_PENDING_STREAMS streams are queued new ones get PoolSaturated. Queue
+    time therefore never grows with load; clients simply see fewer, fresh results.
+
+    A worker whose Pose graph fails to start logs it and retries with backoff. While
+    every worker is failing, queued frames fail and submit raises PoolUnavailable.
+
+    A stream is handled by at most one worker at a time, so its handler (rep counting)
+    never races itself. Workers run in static-image mode: one Pose serves many users, and
+    tracking state carried from one user's frame into another's would be wrong.
+    """
+    def __init__(self, workers=INFERENCE_WORKERS, max_pending=MAX_PENDING_STREAMS, max_age=MAX_FRAME_AGE,
+                 model_complexity=DEFAULT_MODEL_COMPLEXITY):
+        self._workers = workers
+        self._model_complexity = model_complexity
+        self._max_pending = max_pending
+        self._max_age = max_age
+        self._cond = threading.Condition()
+        self._slots = {}                       # stream key -> newest queued job
+        self._ready = collections.deque()      # stream keys with a queued job and no worker on them
+        self._busy = set()                     # stream keys a worker is processing right now
+        self._last_frame = {}                  # stream key -> monotonic time of its last submit
+        self._last_prune = time.monotonic()
+        self._threads = []
+        self._warm = threading.Semaphore(0)
+        self._closed = False
+        self._failing = 0                      # workers whose last Pose graph failed to start
+        self._processed = 0
+        self._superseded = 0
+        self._stale = 0
+        self._rejected = 0
+        self._infer_ms = None
+        self._wait_ms = None
+
+    def start(self, wait=False):
+        """Starts the workers (idempotent). With wait=True, blocks until every Pose is warmed up."""
+        with self._cond:
+            if not self._threads:
+                self._threads = [
+                    threading.Thread(target=self._run, name=f'inference-{i}', daemon=True)
+                    for i in range(self._workers)
+                ]
+                for thread in self._threads:
+                    thread.start()
+                started = True
+            else:
+                started = False
+        if wait and started:
+            for _ in range(self._workers):
+                self._warm.acquire()
+
+    def submit(self, key, jpeg_bytes, handler, timer=NULL_TIMER):
+        """
+        Queues one encoded frame for stream `key`. The returned Future resolves to
+        handler(points), where points is a (33, 4) landmark array or None when no pose
+        was found; it fails with FrameDropped if a newer frame replaced this one.
+        Raises PoolSaturated when the pool cannot take another stream, PoolUnavailable
+        when no worker has a Pose graph. The worker laps decode, cvtColor, pose.process
+        and angle_math (the handler) on a lane of `timer`.
+        """
+        self.start()
+        future = Future()
+        now = time.monotonic()
+        with self._cond:
+            if self._failing == self._workers:
+                raise PoolUnavailable()
+            previous = self._slots.get(key)
+            if previous is None and len(self._slots) >= self._max_pending:
+                self._rejected += 1
+                raise PoolSaturated()
+            self._slots[key] = (now, jpeg_bytes, handler, future, timer)
+            self._last_frame[key] = now
+            if now - self._last_prune > ACTIVE_STREAM_WINDOW:
+                self._prune_streams(now)
+            if previous is not None:
+                self._superseded += 1
+            elif key not in self._busy:
+                self._ready.append(key)
+                self._cond.notify()
+        if previous is not None:
+            previous[3].set_exception(FrameDropped())
+        return future
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _prune_streams(self, now):
+        """Forgets streams without a frame for ACTIVE_STREAM_WINDOW (lock held), so _last_frame only holds active ones."""
+        self._last_prune = now
+        for key in [k for k, t in self._last_frame.items() if now - t > ACTIVE_STREAM_WINDOW]:
+            del self._last_frame[key]
+
+    def stats(self):
+        """Throughput, drop counters and an estimate of the concurrent streams this box sustains."""
+        now = time.monotonic()
+        with self._cond:
+            self._prune_streams(now)
+            infer_ms = self._infer_ms
+            capacity_fps = self._workers * 1000.0 / infer_ms if infer_ms else None
+            return {
+                'workers': self._workers,
+                'failing_workers': self._failing,
+                'model_complexity': self._model_complexity,
+                'active_streams': len(self._last_frame),
+                'queued_streams': len(self._slots),
+                'processed': self._processed,
+                'dropped_superseded': self._superseded,
+                'dropped_stale': self._stale,
+                'rejected': self._rejected,
+                'avg_inference_ms': round(infer_ms, 2) if infer_ms else None,
+                'avg_queue_wait_ms': round(self._wait_ms, 2) if self._wait_ms else None,
+                'capacity_fps': round(capacity_fps, 1) if capacity_fps else None,
+                'sustainable_streams': int(capacity_fps // TARGET_STREAM_FPS) if capacity_fps else None,
+                'target_stream_fps': TARGET_STREAM_FPS,
+            }
+
+    # --- Worker side ---
+
+    def _run(self):
+        warmed = False; failed = False; delay = POSE_RETRY_DELAY
+        while not self._closed:
+            try:
+                # create_pose runs a dummy frame, so the model is loaded before real traffic.
+                with create_pose(self._model_complexity, static_image_mode=True) as pose:
+                    if failed:
+                        self._recovered(); failed = False; delay = POSE_RETRY_DELAY
+                    if not warmed:
+                        self._warm.release(); warmed = True
+                    self._serve(pose)
+            except Exception as e:
+                print(f"Inference worker could not run a Pose graph, retrying in {delay:.1f}s: {e}")
+                if not warmed:
+                    self._warm.release(); warmed = True   # start(wait=True) must not wait for it forever
+                if not failed:
+                    self._failed(); failed = True
+                time.sleep(delay)
+                delay = min(delay * 2, POSE_RETRY_MAX_DELAY)
+
+    def _failed(self):
+        with self._cond:
+            self._failing += 1
+            if self._failing < self._workers:
+                return
+            # Nobody is left to process the queued frames: fail them now rather than at their timeout.
+            jobs = list(self._slots.values())
+            self._slots.clear(); self._ready.clear()
+        for job in jobs:
+            job[3].set_exception(PoolUnavailable())
+
+    def _recovered(self):
+        with self._cond:
+            self._failing -= 1
+
+    def _serve(self, pose):
+        """Processes jobs until the pool closes or the graph's process dies (then _run builds a new one)."""
+        while getattr(pose, 'alive', True):
+            with self._cond:
+                self._cond.wait_for(lambda: self._ready or self._closed)
+                if self._closed:
+                    return
+                key = self._ready.popleft()
+                job = self._slots.pop(key)
+                self._busy.add(key)
+            try:
+                self._process(pose, job)
+            finally:
+                with self._cond:
+                    self._busy.discard(key)
+                    if key in self._slots:
+                        self._ready.append(key)
+                        self._cond.notify()
+
+    def _process(self, pose, job):
+        queued_at, jpeg_bytes, handler, future, timer = job
+        started = time.monotonic()
+        if started - queued_at > self._max_age:
+            with self._cond:
+                self._stale += 1
+            future.set_exception(FrameDropped())
+            return
+        lane = timer.lane()
+        lane.start()
+        try:
+            points = self._infer(pose, jpeg_bytes, lane)
+            finished = time.monotonic()
+            result = handler(points)
+            lane.lap('angle_math')
+            timer.record_frame(time.monotonic() - started)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        with self._cond:
+            self._processed += 1
+            self._infer_ms = _ema(self._infer_ms, (finished - started) * 1000.0)
+            self._wait_ms = _ema(self._wait_ms, (started - queued_at) * 1000.0)
+        future.set_result(result)
+
+    @staticmethod
+    def _infer(pose, jpeg_bytes, lane=NULL_TIMER):
+        frame = cv2.imdecode(np.frombuffer(jpeg_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Frame is not a decodable image.")
+        lane.lap('decode')
+        # Mirrored like the server camera path, so left/right joints mean the same thing.
+        frame_rgb = rgb_input(pose, cv2.flip(frame, 1))
+        frame_rgb.flags.writeable = False
+        lane.lap('cvtColor')
+        results = pose.process(frame_rgb)
+        lane.lap('pose.process')
+        if not results.pose_landmarks:
+            return None
+        return pose_points(results.pose_landmarks)
+
+def _ema(current, sample):
+    return sample if current is None else current + STATS_EMA_ALPHA * (sample - current)
+
+# Process-wide pool for the ingest routes; workers start on the first frame.
+INGEST_POOL = InferencePool()
@@ -0,0 +1,100 @@
+# inference_scheduler.py - Per-stream choice of how often to run pose inference
+import numpy as np
+
+# Configuration
+TARGET_LATENCY = 0.120    # seconds from capture to the frame leaving the generator
+IDLE_FPS = 4.0            # inference rate while the user is still (or out of view)
+BASE_FPS = 12.0           # rate at the first sign of movement
+MAX_FPS = 30.0            # rate for fast movements such as jumping jacks
+IDLE_MOTION = 0.05        # landmark speed (frame widths per second) below which the user is idle
+FAST_MOTION = 1.0         # landmark speed at which MAX_FPS is reached
+MOTION_EMA_ALPHA = 0.3
+LATENCY_EMA_ALPHA = 0.2
+RATE_DECREASE = 0.8       # multiplicative back-off of the rate cap when latency is over target
+DECREASE_INTERVAL = 0.25  # seconds between back-offs, so one slow spell is not punished per frame
+RATE_INCREASE = 2.0       # fps per second the cap recovers while latency is under target
+MIN_VISIBILITY = 0.5      # landmarks below this visibility are ignored for motion
+
+class InferenceScheduler:
+    """
+    Decides per frame whether a stream runs pose inference. Two signals combine:
+
+      motion   - mean speed of the visible landmarks between inferences picks the rate
+                 the movement needs: IDLE_FPS when still, ramping from BASE_FPS to
+                 MAX_FPS as the movement gets faster.
+      latency  - measured capture-to-output latency drives an AIMD cap: the cap backs
+                 off multiplicatively while latency is over TARGET_LATENCY and creeps
+                 back up while it is under, so a loaded box sheds inference work before
+                 its streams fall behind the camera.
+    """
+    def __init__(self, target_latency=TARGET_LATENCY, idle_fps=IDLE_FPS, max_fps=MAX_FPS):
+        self.target_latency = target_latency
+        self.idle_fps = idle_fps
+        self.max_fps = max_fps
+        self.rate_cap = max_fps
+        self.motion = 0.0
+        self.latency = None
+        self.inference_time = None
+        self._last_infer_at = None
+        self._last_points = None
+        self._last_latency_at = None
+        self._last_decrease = None
+
+    @property
+    def target_fps(self):
+        """Inference rate for the current motion, limited by the latency cap."""
+        if self.motion <= IDLE_MOTION:
+            wanted = self.idle_fps
+        else:
+            ramp = min(1.0, (self.motion - IDLE_MOTION) / (FAST_MOTION - IDLE_MOTION))
+            wanted = BASE_FPS + ramp * (self.max_fps - BASE_FPS)
+        return max(self.idle_fps, min(wanted, self.rate_cap))
+
+    @property
+    def idle(self):
+        return self.motion <= IDLE_MOTION
+
+    def mark_idle(self):
+        """External idle signal (e.g. the auto-classifier's no-motion unlock): drop to IDLE_FPS now."""
+        self.motion = 0.0
+
+    def should_infer(self, now):
+        return self._last_infer_at is None or now - self._last_infer_at >= 1.0 / self.target_fps
+
+    def record_inference(self, now, points, duration):
+        """Feeds back one inference: when it started, its (33, 4) landmarks (or None) and how long it took."""
+        self.inference_time = _ema(self.inference_time, duration, LATENCY_EMA_ALPHA)
+        speed = 0.0
+        if points is not None and self._last_points is not None:
+            dt = now - self._last_infer_at
+            visible = (points[:, 3] > MIN_VISIBILITY) & (self._last_points[:, 3] > MIN_VISIBILITY)
+            if dt > 0 and visible.any():
+                moved = points[visible, :2] - self._last_points[visible, :2]
+                speed = float(np.sqrt((moved * moved).sum(axis=1)).mean()) / dt
+        self.motion += MOTION_EMA_ALPHA * (speed - self.motion)
+        self._last_points = points
+        self._last_infer_at = now
+
+    def record_latency(self, now, seconds):
+        """Feeds back the capture-to-output latency of one frame emitted at `now`."""
+        self.latency = _ema(self.latency, seconds, LATENCY_EMA_ALPHA)
+        elapsed = now - self._last_latency_at if self._last_latency_at is not None else 0.0
+        self._last_latency_at = now
+        if self.latency > self.target_latency:
+            if self._last_decrease is None or now - self._last_decrease >= DECREASE_INTERVAL:
+                self.rate_cap = max(self.idle_fps, self.rate_cap * RATE_DECREASE)
+                self._last_decrease = now
+        else:
+            self.rate_cap = min(self.max_fps, self.rate_cap + RATE_INCREASE * elapsed)
+
+    def stats(self):
+        return {
+            'target_fps': round(self.target_fps, 1),
+            'rate_cap': round(self.rate_cap, 1),
+            'motion': round(self.motion, 3),
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'inference_ms': round(self.inference_time * 1000, 1) if self.inference_time is not None else None,
+        }
+
+def _ema(current, sample, alpha):
+    return sample if current is None else current + alpha * (sample - current)
@@ -0,0 +1,139 @@
+# ingest_relay.py - Ingest requests handed over a Unix socket to the gunicorn worker that owns their session
+import atexit
+import json
+import os
+import threading
+from multiprocessing.connection import Client, Listener
+
+from .feedback_store import FEEDBACK_STORE_PATH
+
+# Configuration
+RELAY_REPLY_TIMEOUT = 5.0   # seconds the owning worker may take to answer one relayed request
+RELAY_IDLE_CONNECTIONS = 4  # open connections kept per owning worker for the next requests
+
+class RelayError(RuntimeError):
+    """The owning worker could not be reached or did not answer."""
+
+def relay_address(pid):
+    """Socket path of one worker's relay, next to the feedback store every worker maps."""
+    return f'{FEEDBACK_STORE_PATH}-relay-{pid}'
+
+class IngestRelay:
+    """
+    A session's counting state lives in the SESSIONS of the worker that owns it (see
+    FeedbackStore.claim), so an ingest request that lands on another worker is passed
+    to that one instead of being counted into a second copy. Every worker that owns
+    sessions listens on relay_address(its pid); a request goes over as one message (a
+    JSON header line, then the raw body) and the owner's handler answers with the
+    JSON of its (payload, status, headers). Only bytes cross, never pickles.
+
+    Connections are reused, a few per owner, so a relayed request costs one round
+    trip on a local socket.
+    """
+    def __init__(self, address=relay_address):
+        self._address = address
+        self._lock = threading.Lock()
+        self._listener = None
+        self._pid = None
+        self._idle = {}   # owner pid -> [Connection]
+
+    def listen(self, handler):
+        """Starts answering relayed requests with handler(header, body) -> (payload, status, headers); idempotent."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()   # once per process: a forked worker listens on its own address
+            address = self._address(self._pid)
+            try:
+                os.unlink(address)   # left by an earlier process with the same pid
+            except FileNotFoundError:
+                pass
+            try:
+                self._listener = Listener(address, 'AF_UNIX')
+                os.chmod(address, 0o600)
+            except OSError as e:
+                print(f"Ingest relay unavailable ({address}): {e}; other workers cannot reach this one's sessions.")
+                return
+            threading.Thread(target=self._accept, args=(self._listener, handler),
+                             name='ingest-relay', daemon=True).start()
+
+    def _accept(self, listener, handler):
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return   # closed at exit
+            threading.Thread(target=self._serve, args=(conn, handler), name='ingest-relay-conn', daemon=True).start()
+
+    def _serve(self, conn, handler):
+        try:
+            while True:
+                message = conn.recv_bytes()
+                header, _, body = message.partition(b'\n')
+                try:
+                    reply = handler(json.loads(header), body)
+                except Exception as e:
+                    print(f"Relayed ingest failed: {e!r}")
+                    reply = ({'status': 'error', 'error': 'Internal error.'}, 500, {})
+                conn.send_bytes(json.dumps(reply, separators=(',', ':')).encode())
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def forward(self, pid, header, body):
+        """Runs a request on worker `pid`; returns its (payload, status, headers) or raises RelayError."""
+        try:
+            conn = self._checkout(pid)
+        except OSError as e:
+            raise RelayError(f"Worker {pid} does not answer relayed ingest: {e}") from e
+        try:
+            conn.send_bytes(json.dumps(header, separators=(',', ':')).encode() + b'\n' + body)
+            if not conn.poll(RELAY_REPLY_TIMEOUT):
+                raise RelayError(f"Worker {pid} did not answer within {RELAY_REPLY_TIMEOUT}s")
+            reply = conn.recv_bytes()
+        except (EOFError, OSError) as e:
+            self._drop(pid, conn)
+            raise RelayError(f"Worker {pid} closed the relay: {e!r}") from e
+        except RelayError:
+            self._drop(pid, conn)
+            raise
+        self._checkin(pid, conn)
+        return tuple(json.loads(reply))
+
+    def _checkout(self, pid):
+        with self._lock:
+            idle = self._idle.get(pid)
+            if idle:
+                return idle.pop()
+        return Client(self._address(pid), 'AF_UNIX')
+
+    def _checkin(self, pid, conn):
+        with self._lock:
+            idle = self._idle.setdefault(pid, [])
+            if len(idle) < RELAY_IDLE_CONNECTIONS:
+                idle.append(conn); return
+        conn.close()
+
+    def _drop(self, pid, conn):
+        # The owner may have exited: its other idle connections are as dead as this one.
+        with self._lock:
+            idle = self._idle.pop(pid, [])
+        for stale in idle + [conn]:
+            stale.close()
+
+    def close(self):
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.close()   # also removes the socket file
+            self._listener = None
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+            self._idle = {}
+
+# Process-wide relay used by the webcam ingest routes
+INGEST_RELAY = IngestRelay()
+atexit.register(INGEST_RELAY.close)
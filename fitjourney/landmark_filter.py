@@ -0,0 +1,109 @@
+# landmark_filter.py - Temporal smoothing of (33, 4) landmark arrays between pose inference and angle math
+import math
+import os
+import time
+
+import numpy as np
+
+# Configuration
+LANDMARK_FILTER = os.getenv('LANDMARK_FILTER', 'one_euro')   # 'one_euro', 'ema' or 'none'
+ONE_EURO_MIN_CUTOFF = 1.5    # Hz; cutoff while a landmark is still: lower means steadier but laggier
+ONE_EURO_BETA = 5.0          # cutoff gained per unit of speed (frame widths/s), so fast movement is not delayed
+ONE_EURO_D_CUTOFF = 1.0      # Hz; smoothing of the speed estimate itself
+EMA_TIME_CONSTANT = 0.08     # seconds; the EMA's memory, independent of the inference rate
+RESET_GAP = 0.5              # seconds without landmarks after which the filter starts over
+MIN_DT = 1.0 / 60            # floor for the time step (frames batched into one request share a timestamp)
+
+def _alpha(dt, cutoff):
+    r = 2 * math.pi * cutoff * dt
+    return r / (r + 1)
+
+class _TimedFilter:
+    """Shared bookkeeping: time steps, resets after gaps and on missing poses."""
+    def __init__(self):
+        self._x = None
+        self._t = None
+
+    def __call__(self, points, t=None):
+        """Filtered copy of a (33, 4) array; None passes through and resets the filter."""
+        if points is None:
+            self.reset()
+            return None
+        if t is None:
+            t = time.monotonic()
+        if self._x is None or t - self._t > RESET_GAP:
+            self._start(points)
+            self._t = t
+            return self._x
+        dt = max(t - self._t, MIN_DT)
+        self._t = self._t + dt
+        self._x = self._step(points, dt)
+        return self._x
+
+    def reset(self):
+        self._x = None
+        self._t = None
+
+    def _start(self, points):
+        self._x = np.array(points, dtype=np.float64)
+
+class OneEuroFilter(_TimedFilter):
+    """
+    One-Euro filter over every coordinate at once (Casiez et al.): an EMA whose cutoff
+    rises with the estimated speed, so jitter at rest is removed while a fast squat or
+    jumping jack is followed with little lag.
+    """
+    def __init__(self, min_cutoff=ONE_EURO_MIN_CUTOFF, beta=ONE_EURO_BETA, d_cutoff=ONE_EURO_D_CUTOFF):
+        super().__init__()
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self._dx = None
+
+    def _start(self, points):
+        super()._start(points)
+        self._dx = np.zeros_like(self._x)
+
+    def _step(self, points, dt):
+        self._dx += _alpha(dt, self.d_cutoff) * ((points - self._x) / dt - self._dx)
+        cutoff = self.min_cutoff + self.beta * np.abs(self._dx)
+        r = (2 * math.pi * dt) * cutoff
+        return self._x + r / (r + 1) * (points - self._x)
+
+class EmaFilter(_TimedFilter):
+    """Exponential moving average with a fixed time constant (alpha follows the frame interval)."""
+    def __init__(self, time_constant=EMA_TIME_CONSTANT):
+        super().__init__()
+        self.time_constant = time_constant
+
+    def _step(self, points, dt):
+        return self._x + (1 - math.exp(-dt / self.time_constant)) * (points - self._x)
+
+class NoFilter:
+    """Passes landmarks through unchanged."""
+    def __call__(self, points, t=None):
+        return points
+
+    def reset(self):
+        pass
+
+FILTERS = {'one_euro': OneEuroFilter, 'ema': EmaFilter, 'none': NoFilter}
+
+def new_filter(kind=None):
+    """A fresh per-stream filter of the configured kind."""
+    kind = kind or LANDMARK_FILTER
+    if kind not in FILTERS:
+        raise ValueError(f"LANDMARK_FILTER must be one of {sorted(FILTERS)}")
+    return FILTERS[kind]()
+
+def smooth_series(landmarks, timestamps, kind=None):
+    """Filters a (frames, 33, 4) series (NaN rows = no pose), as the live stream would have."""
+    landmark_filter = new_filter(kind)
+    out = np.array(landmarks, dtype=np.float32)
+    detected = ~np.isnan(out[:, 0, 0])
+    for index, t in enumerate(np.asarray(timestamps, dtype=np.float64).tolist()):
+        if detected[index]:
+            out[index] = landmark_filter(out[index], t)
+        else:
+            landmark_filter.reset()
+    return out
@@ -0,0 +1,80 @@
+# landmark_protocol.py - Compact binary landmark frames sent by clients that run pose estimation themselves
+import struct
+
+import numpy as np
+
+from .webcam_stream import LANDMARK_COUNT
+
+# Wire format (little endian). A request body is one or more frames back to back:
+#   header  <BBBxI : version, dtype code, flags, padding, sequence number (uint32)
+#   body    33 x (x, y, z, visibility) as float32, or as int16 scaled by INT16_SCALE;
+#           absent when FLAG_NO_POSE is set.
+# Landmarks are as detected on the unmirrored camera image; the server mirrors them
+# to match the webcam stream's selfie view.
+HEADER = struct.Struct('<BBBxI')
+PROTOCOL_VERSION = 1
+DTYPE_FLOAT32 = 1
+DTYPE_INT16 = 2
+FLAG_NO_POSE = 0x01
+INT16_SCALE = 8192.0      # int16 covers [-4, 4) at ~1e-4 resolution, ample for normalized coordinates
+MAX_FRAMES_PER_REQUEST = 16
+SEQ_REORDER_WINDOW = 256  # a frame at most this far behind the newest is late; further back means a restart
+
+_DTYPES = {DTYPE_FLOAT32: np.dtype('<f4'), DTYPE_INT16: np.dtype('<i2')}
+_VALUES_PER_FRAME = LANDMARK_COUNT * 4
+
+class ProtocolError(ValueError):
+    """The payload is not a valid sequence of landmark frames."""
+
+def decode_frames(payload):
+    """Returns [(seq, points)] for every frame in payload; points is a (33, 4) float32 array or None."""
+    frames = []
+    offset = 0
+    view = memoryview(payload)
+    while offset < len(view):
+        if len(frames) == MAX_FRAMES_PER_REQUEST:
+            raise ProtocolError(f"More than {MAX_FRAMES_PER_REQUEST} frames in one request.")
+        if len(view) - offset < HEADER.size:
+            raise ProtocolError("Truncated frame header.")
+        version, dtype_code, flags, seq = HEADER.unpack_from(view, offset)
+        offset += HEADER.size
+        if version != PROTOCOL_VERSION:
+            raise ProtocolError(f"Unsupported protocol version {version}.")
+        if flags & FLAG_NO_POSE:
+            frames.append((seq, None))
+            continue
+        dtype = _DTYPES.get(dtype_code)
+        if dtype is None:
+            raise ProtocolError(f"Unknown dtype code {dtype_code}.")
+        size = _VALUES_PER_FRAME * dtype.itemsize
+        if len(view) - offset < size:
+            raise ProtocolError("Truncated landmark body.")
+        values = np.frombuffer(view, dtype=dtype, count=_VALUES_PER_FRAME, offset=offset)
+        offset += size
+        points = values.astype(np.float32)
+        if dtype_code == DTYPE_INT16:
+            points *= 1.0 / INT16_SCALE
+        if not np.isfinite(points).all():
+            raise ProtocolError("Non-finite landmark value.")
+        frames.append((seq, points.reshape(LANDMARK_COUNT, 4)))
+    return frames
+
+def encode_frame(seq, points, dtype_code=DTYPE_FLOAT32):
+    """Packs one frame (points=None for 'no pose'); the Python counterpart of the browser client."""
+    if points is None:
+        return HEADER.pack(PROTOCOL_VERSION, dtype_code, FLAG_NO_POSE, seq)
+    values = np.asarray(points, dtype=np.float32).reshape(-1)
+    if dtype_code == DTYPE_INT16:
+        values = np.clip(np.rint(values * INT16_SCALE), -32768, 32767)
+    return HEADER.pack(PROTOCOL_VERSION, dtype_code, 0, seq) + values.astype(_DTYPES[dtype_code]).tobytes()
+
+def is_newer(seq, last_seq):
+    """True if frame seq should be applied after last_seq (uint32 wrap-around safe)."""
+    if last_seq is None:
+        return True
+    ahead = (seq - last_seq) % 2**32
+    if 0 < ahead < 2**31:
+        return True
+    # Duplicates and frames that arrived out of order are skipped; a sequence far
+    # behind the newest means the client reloaded and started a new counter.
+    return ahead != 0 and 2**32 - ahead > SEQ_REORDER_WINDOW
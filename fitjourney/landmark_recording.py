@@ -0,0 +1,249 @@
+# landmark_recording.py - Memory-mappable recordings of landmark streams, replayed through the rep counters
+import argparse
+import datetime
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from .webcam_stream import LANDMARK_COUNT
+
+# File layout (little endian):
+#   magic     b'FJLMREC1'
+#   length    uint32, size of the JSON metadata that follows
+#   metadata  JSON (dtype, exercise, started_at, ...) padded with spaces to RECORD_ALIGN
+#   records   back to back: t float64 (seconds since started_at), then 33 x (x, y, z,
+#             visibility) as float16 or float32; a frame without a pose is all NaN
+# Records start at a fixed offset and have a fixed size, so a recording is read with a
+# single np.memmap and a crash mid-write only loses the partial last record.
+MAGIC = b'FJLMREC1'
+PREFIX = struct.Struct('<8sI')
+RECORD_ALIGN = 64
+FORMAT_VERSION = 1
+DTYPES = ('float16', 'float32')
+DEFAULT_DTYPE = 'float16'     # ~1e-3 resolution on normalized coordinates, well below a degree of joint angle
+RECORDING_EXTENSION = '.fjlm'
+RECORD_DIR = os.getenv('LANDMARK_RECORD_DIR')   # when set, every live session is recorded here
+
+def record_dtype(dtype):
+    """Structured numpy dtype of one record."""
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {DTYPES}")
+    return np.dtype([('t', '<f8'), ('landmarks', np.dtype(dtype).newbyteorder('<'), (LANDMARK_COUNT, 4))])
+
+def _header(metadata):
+    body = json.dumps(metadata).encode()
+    size = PREFIX.size + len(body)
+    padding = -size % RECORD_ALIGN
+    return PREFIX.pack(MAGIC, len(body) + padding) + body + b' ' * padding
+
+class LandmarkRecorder:
+    """
+    Appends one landmark stream to a recording file. Points are stored raw, as the pose
+    model returned them (already mirrored into the selfie view) and before the live
+    counter's landmark_filter smoothed them; replay_auto_classify and count_landmarks
+    apply the same filter (smooth_series) to the recording's timestamps, so a replay
+    counts what the live stream counted. One writer per recorder; close() may come from
+    another thread when the session ends, and frames written after it are ignored.
+    """
+    def __init__(self, path, dtype=DEFAULT_DTYPE, **metadata):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._record = record_dtype(dtype)
+        self._no_pose = np.full((LANDMARK_COUNT, 4), np.nan, dtype=self._record['landmarks'].base).tobytes()
+        self._started = time.monotonic()
+        self.frames = 0
+        metadata.update(version=FORMAT_VERSION, dtype=dtype, landmark_count=LANDMARK_COUNT,
+                        started_at=time.time())
+        self.metadata = metadata
+        self._lock = threading.Lock()
+        self._file = open(path, 'wb')
+        self._file.write(_header(metadata))
+
+    def write(self, points, t=None):
+        """Appends one frame; points is a (33, 4) array or None when no pose was found. t defaults to now."""
+        if t is None:
+            t = time.monotonic() - self._started
+        landmarks = self._no_pose if points is None else np.asarray(points, dtype=self._record['landmarks'].base).tobytes()
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(struct.pack('<d', t) + landmarks)
+            self.frames += 1
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Recording:
+    """A recording opened read-only as a memmap; `timestamps` and `landmarks` are views into it."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            prefix = f.read(PREFIX.size)
+            if len(prefix) < PREFIX.size:
+                raise ValueError(f"Not a landmark recording: {path}")
+            magic, length = PREFIX.unpack(prefix)
+            if magic != MAGIC:
+                raise ValueError(f"Not a landmark recording: {path}")
+            self.metadata = json.loads(f.read(length))
+        offset = PREFIX.size + length
+        dtype = record_dtype(self.metadata['dtype'])
+        count = (os.path.getsize(path) - offset) // dtype.itemsize
+        if count > 0:
+            self.records = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+        else:
+            self.records = np.empty(0, dtype=dtype)
+
+    @property
+    def timestamps(self):
+        return self.records['t']
+
+    @property
+    def landmarks(self):
+        return self.records['landmarks']
+
+    @property
+    def exercise(self):
+        return self.metadata.get('exercise')
+
+    def __len__(self):
+        return len(self.records)
+
+def save_recording(path, landmarks, timestamps, dtype=DEFAULT_DTYPE, **metadata):
+    """Writes a whole (frames, 33, 4) series at once, e.g. landmarks extracted from a video."""
+    with LandmarkRecorder(path, dtype, **metadata) as recorder:
+        records = np.empty(len(landmarks), dtype=recorder._record)
+        records['t'] = timestamps
+        records['landmarks'] = landmarks
+        recorder._file.write(records.tobytes())
+        recorder.frames = len(records)
+    return path
+
+# --- Live session recording ---
+
+def new_recording_path(key, directory=None):
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    return os.path.join(directory or RECORD_DIR, f"{key}-{stamp}-{uuid.uuid4().hex[:8]}{RECORDING_EXTENSION}")
+
+def record(state, key, points, source=None):
+    """
+    Appends a counted frame to the session's recording, starting the recording on the
+    state's first frame. A no-op unless LANDMARK_RECORD_DIR is set.
+    """
+    if not RECORD_DIR:
+        return
+    recorder = state.recorder
+    if recorder is None:
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        recorder = state.recorder = LandmarkRecorder(new_recording_path(key), exercise=key, source=source)
+    recorder.write(points)
+
+def stop_recording(state):
+    """Closes the session's recording, if any; a later frame of the same state starts a new file."""
+    recorder, state.recorder = state.recorder, None
+    if recorder is not None:
+        recorder.close()
+
+# --- Replay ---
+
+def replay_exercise(spec, recording):
+    """Runs an exercise's state machine over a recording; same result shape as video_analysis.count_landmarks."""
+    from .video_analysis import count_landmarks
+    landmarks = np.asarray(recording.landmarks, dtype=np.float32)
+    timestamps = np.asarray(recording.timestamps)
+    duration = float(timestamps[-1] - timestamps[0]) if len(timestamps) > 1 else 0.0
+    fps = (len(timestamps) - 1) / duration if duration > 0 else 0.0
+    return count_landmarks(spec, landmarks, fps, timestamps)
+
+def replay_auto_classify(recording):
+    """Runs the auto-classifier over a recording, on the recording's clock so switch cooldowns hold."""
+    from .landmark_filter import smooth_series
+    from .routes_webcam import classify_and_count, AUTO_CLASSIFY_KERNEL
+    from .session_state import AutoClassifyState
+    st = AutoClassifyState()
+    landmarks = smooth_series(recording.landmarks, recording.timestamps)
+    detected = ~np.isnan(landmarks[:, 0, 0])
+    angles = np.full((len(landmarks), len(AUTO_CLASSIFY_KERNEL.names)), np.nan)
+    if detected.any():
+        angles[detected] = AUTO_CLASSIFY_KERNEL.compute_batch(landmarks[detected])
+    started_at = recording.metadata.get('started_at', 0.0)
+    for t, frame_angles, has_pose in zip(recording.timestamps.tolist(), angles.tolist(), detected.tolist()):
+        if has_pose:
+            classify_and_count(tuple(frame_angles), st, now=started_at + t)
+    result = st.to_dict()
+    result.update(frames=len(landmarks), frames_with_pose=int(detected.sum()))
+    return result
+
+def replay(recording, exercise=None):
+    """Replays a recording through the counter it was recorded with (or `exercise`)."""
+    from .routes_webcam import EXERCISE_DISPATCHER, AUTO_CLASSIFY_KEY
+    exercise = exercise or recording.exercise
+    if exercise == AUTO_CLASSIFY_KEY:
+        return replay_auto_classify(recording)
+    if exercise not in EXERCISE_DISPATCHER:
+        raise ValueError(f"Unknown exercise: {exercise}")
+    return replay_exercise(EXERCISE_DISPATCHER[exercise]['spec'], recording)
+
+def total_reps(result):
+    return sum(result['rep_counts'].values()) if 'rep_counts' in result else result['reps']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record and replay landmark streams.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    replay_parser = commands.add_parser('replay', help='Count reps in recordings; checks expected_reps when recorded.')
+    replay_parser.add_argument('recordings', nargs='+')
+    replay_parser.add_argument('--exercise', help='Counter to use instead of the recorded one.')
+    replay_parser.add_argument('--json', action='store_true', help='Print full results as JSON lines.')
+    video_parser = commands.add_parser('from-video', help='Extract a recording from a workout video.')
+    video_parser.add_argument('exercise')
+    video_parser.add_argument('video')
+    video_parser.add_argument('out')
+    video_parser.add_argument('--expected-reps', type=int, help='Stored for regression replays.')
+    video_parser.add_argument('--dtype', default=DEFAULT_DTYPE, choices=DTYPES)
+    args = parser.parse_args(argv)
+
+    if args.command == 'from-video':
+        from .video_analysis import extract_landmarks
+        landmarks, fps = extract_landmarks(args.video)
+        save_recording(args.out, landmarks, np.arange(len(landmarks)) / fps, args.dtype,
+                       exercise=args.exercise, source=os.path.basename(args.video), expected_reps=args.expected_reps)
+        print(f"{args.out}: {len(landmarks)} frames")
+        return 0
+
+    failures = 0
+    for path in args.recordings:
+        recording = Recording(path)
+        started = time.perf_counter()
+        result = replay(recording, args.exercise)
+        elapsed = time.perf_counter() - started
+        expected = recording.metadata.get('expected_reps')
+        reps = total_reps(result)
+        failures += expected is not None and reps != expected
+        if args.json:
+            print(json.dumps({'path': path, 'expected_reps': expected, **result}))
+            continue
+        length = float(recording.timestamps[-1]) if len(recording) else 0.0
+        speedup = length / elapsed if elapsed > 0 else float('inf')
+        verdict = '' if expected is None else ('  ok' if reps == expected else f'  FAIL (expected {expected})')
+        print(f"{path}: {reps} reps, {len(recording)} frames in {elapsed * 1000:.1f} ms ({speedup:.0f}x real time){verdict}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+# pose_pool.py - Pre-warmed MediaPipe Pose graphs that streams check out and return
+import contextlib
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+
+from .vision import cv2, mp_pose, preload, VISION_PRELOAD
+from .webcam_stream import MIN_DETECTION_CONFIDENCE, MIN_TRACKING_CONFIDENCE
+
+# Configuration
+MODEL_COMPLEXITIES = (0, 1, 2)
+DEFAULT_MODEL_COMPLEXITY = int(os.getenv('POSE_MODEL_COMPLEXITY', 1))
+POSE_POOL_SIZE = int(os.getenv('POSE_POOL_SIZE', 2))          # graphs warmed per pool at startup
+POSE_POOL_MAX = int(os.getenv('POSE_POOL_MAX', 8))            # graphs a pool may grow to under load
+POSE_POOL_WARM = os.getenv('POSE_POOL_WARM', '1' if VISION_PRELOAD else '0') == '1'   # warm the default pool when the app starts
+POSE_BACKEND = os.getenv('POSE_BACKEND', 'process')           # 'process': graphs in worker processes; 'thread': in this one
+CHECKOUT_TIMEOUT = 10.0       # seconds a stream waits for a graph once the pool is at POSE_POOL_MAX
+WARMUP_FRAME_SHAPE = (256, 256, 3)
+
+class PoolExhausted(RuntimeError):
+    """No Pose graph became free within the checkout timeout."""
+
+def _in_worker_process():
+    # Pose processes and video-analysis workers are spawned multiprocessing children;
+    # they run their graph in-process and never start pose processes of their own. The
+    # name is set before a spawned child imports the parent's main module, which may
+    # build the app (run.py does) and so reach the pools.
+    return multiprocessing.current_process().name != 'MainProcess'
+
+def create_pose(model_complexity=DEFAULT_MODEL_COMPLEXITY, static_image_mode=False, isolated=None):
+    """
+    Builds one Pose graph and runs a dummy frame through it, so the model is loaded before
+    real traffic. With POSE_BACKEND='process' (isolated=None) the graph lives in its own
+    worker process (pose_process.PoseProcess); both kinds answer process(frame_rgb).
+    """
+    if isolated is None:
+        isolated = POSE_BACKEND == 'process' and not _in_worker_process()
+    if isolated:
+        from .pose_process import PoseProcess
+        return PoseProcess(model_complexity, static_image_mode)
+    pose = mp_pose.Pose(static_image_mode=static_image_mode, model_complexity=model_complexity,
+                        min_detection_confidence=MIN_DETECTION_CONFIDENCE,
+                        min_tracking_confidence=MIN_TRACKING_CONFIDENCE)
+    pose.process(np.zeros(WARMUP_FRAME_SHAPE, dtype=np.uint8))
+    return pose
+
+class PosePool:
+    """
+    Idle Pose graphs of one (model_complexity, static_image_mode) kind. A checkout takes
+    an idle graph, builds a new one while the pool is below max_size, or waits for a
+    return. Graphs are never closed on return, so only the first streams after startup
+    (or after growth) pay the model load.
+    """
+    def __init__(self, model_complexity, static_image_mode=False, size=POSE_POOL_SIZE, max_size=POSE_POOL_MAX):
+        if model_complexity not in MODEL_COMPLEXITIES:
+            raise ValueError(f"model_complexity must be one of {MODEL_COMPLEXITIES}")
+        self.model_complexity = model_complexity
+        self.static_image_mode = static_image_mode
+        self.size = size
+        self.max_size = max(size, max_size)
+        self._idle = []
+        self._total = 0
+        self._cond = threading.Condition()
+        self._checkouts = 0
+        self._cold_starts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def warm(self):
+        """Builds graphs until `size` exist."""
+        while True:
+            with self._cond:
+                if self._total >= self.size:
+                    return
+                self._total += 1
+            pose = self._create()
+            self.checkin(pose)
+
+    def _create(self):
+        try:
+            return create_pose(self.model_complexity, self.static_image_mode)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+    def acquire(self, timeout=CHECKOUT_TIMEOUT):
+        started = time.monotonic()
+        with self._cond:
+            self._checkouts += 1
+            if not self._idle and self._total < self.max_size:
+                self._total += 1
+                build = True
+            else:
+                build = False
+                if not self._idle:
+                    self._waits += 1
+                    if not self._cond.wait_for(lambda: self._idle, timeout):
+                        raise PoolExhausted(f"No Pose graph (model_complexity={self.model_complexity}) free after {timeout}s")
+                pose = self._idle.pop()
+                self._record_wait(time.monotonic() - started)
+        if build:
+            pose = self._create()
+            with self._cond:
+                self._cold_starts += 1
+                self._record_wait(time.monotonic() - started)
+        return pose
+
+    def checkin(self, pose):
+        with self._cond:
+            if getattr(pose, 'alive', True):
+                self._idle.append(pose)
+            else:
+                # A pose process that died or hung is dropped; the next checkout builds a new one.
+                self._total -= 1
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def checkout(self, timeout=CHECKOUT_TIMEOUT):
+        """with pool.checkout() as pose: ... - the graph goes back to the pool afterwards."""
+        pose = self.acquire(timeout)
+        try:
+            yield pose
+        finally:
+            self.checkin(pose)
+
+    def _record_wait(self, seconds):
+        self._wait_total += seconds
+        self._wait_max = max(self._wait_max, seconds)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'model_complexity': self.model_complexity,
+                'static_image_mode': self.static_image_mode,
+                'backend': 'thread' if _in_worker_process() else POSE_BACKEND,
+                'size': self._total,
+                'idle': len(self._idle),
+                'in_use': self._total - len(self._idle),
+                'max_size': self.max_size,
+                'checkouts': self._checkouts,
+                'cold_starts': self._cold_starts,
+                'waits': self._waits,
+                'avg_checkout_wait_ms': round(self._wait_total / self._checkouts * 1000, 2) if self._checkouts else 0.0,
+                'max_checkout_wait_ms': round(self._wait_max * 1000, 2),
+            }
+
+class PosePools:
+    """One PosePool per (model_complexity, static_image_mode), created on first use."""
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_complexity=DEFAULT_MODEL_COMPLEXITY, static_image_mode=False):
+        key = (model_complexity, static_image_mode)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = PosePool(model_complexity, static_image_mode)
+            return pool
+
+    def checkout(self, model_complexity=DEFAULT_MODEL_COMPLEXITY, static_image_mode=False, timeout=CHECKOUT_TIMEOUT):
+        return self.get(model_complexity, static_image_mode).checkout(timeout)
+
+    def stats(self):
+        with self._lock:
+            pools = list(self._pools.values())
+        return [pool.stats() for pool in pools]
+
+def parse_model_complexity(value, default=DEFAULT_MODEL_COMPLEXITY):
+    """Request-argument helper: an int in MODEL_COMPLEXITIES, else the default."""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return value if value in MODEL_COMPLEXITIES else default
+
+def rgb_input(pose, frame, out=None):
+    """
+    frame as RGB for pose.process, reusing `out` when given. For a PoseProcess the
+    conversion writes straight into its shared-memory ring, so the frame is never copied
+    on its way to the worker process.
+    """
+    frame_buffer = getattr(pose, 'frame_buffer', None)
+    if frame_buffer is not None:
+        out = frame_buffer(frame.shape)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=out)
+
+def _warm(model_complexity):
+    preload()
+    POSE_POOLS.get(model_complexity).warm()
+
+def warm_in_background(model_complexity=DEFAULT_MODEL_COMPLEXITY):
+    """
+    Imports the vision stack and warms a streaming pool off the request path: at startup
+    with POSE_POOL_WARM, otherwise when the first webcam page is served. Only the first
+    call per model complexity starts a thread.
+    """
+    if _in_worker_process():
+        # A spawned worker imports the app's main module (and so runs create_app) as well.
+        return None
+    with _WARMED_LOCK:
+        if model_complexity in _WARMED:
+            return None
+        _WARMED.add(model_complexity)
+    thread = threading.Thread(target=_warm, args=(model_complexity,), name='pose-pool-warmup', daemon=True)
+    thread.start()
+    return thread
+
+# Process-wide pools used by every stream
+POSE_POOLS = PosePools()
+_WARMED = set()   # model complexities warm_in_background has started
+_WARMED_LOCK = threading.Lock()
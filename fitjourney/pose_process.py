@@ -0,0 +1,226 @@
+# pose_process.py - MediaPipe Pose graphs in worker processes, fed through shared-memory frame rings
+import atexit
+import multiprocessing
+import os
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .webcam_stream import landmarks_to_array, LANDMARK_COUNT
+
+# Configuration
+MAX_FRAME_SHAPE = tuple(int(v) for v in os.getenv('POSE_PROCESS_MAX_FRAME', '1080x1920').split('x')) + (3,)
+FRAME_RING_SLOTS = 2            # frames a process's ring holds (one being inferred, one being written)
+PROCESS_START_TIMEOUT = 120.0   # seconds a new process may take to import MediaPipe and load the model
+PROCESS_REPLY_TIMEOUT = 10.0    # seconds one frame may take before the process is considered hung
+
+# Reply status bytes; landmarks follow 'L' as (33, 4) float32, an error message follows 'E'.
+_LANDMARKS, _NO_POSE, _ERROR = b'L', b'N', b'E'
+
+class PoseProcessError(RuntimeError):
+    """The worker process failed, hung or exited; the PoseProcess cannot be used any more."""
+
+class FrameTooLarge(ValueError):
+    """A frame bigger than the ring's slots (POSE_PROCESS_MAX_FRAME); the process itself is fine."""
+
+class FrameRing:
+    """`slots` frame-sized slots in one SharedMemory block; slot views are plain numpy arrays."""
+    def __init__(self, shm, slots, slot_bytes):
+        self.shm = shm
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+
+    @classmethod
+    def create(cls, slots=FRAME_RING_SLOTS, max_frame_shape=MAX_FRAME_SHAPE):
+        slot_bytes = int(np.prod(max_frame_shape))
+        return cls(shared_memory.SharedMemory(create=True, size=slots * slot_bytes), slots, slot_bytes)
+
+    @classmethod
+    def attach(cls, name, slots, slot_bytes):
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)   # Python 3.13+: the creator unlinks it
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, slots, slot_bytes)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def view(self, slot, shape):
+        if int(np.prod(shape)) > self.slot_bytes:
+            raise FrameTooLarge(f"Frame {shape} is larger than the ring's slots ({self.slot_bytes} bytes)")
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def close(self, unlink=False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+class _Landmark:
+    """One landmark as mp_drawing.draw_landmarks reads it."""
+    __slots__ = ('x', 'y', 'z', 'visibility')
+
+    def __init__(self, x, y, z, visibility):
+        self.x, self.y, self.z, self.visibility = x, y, z, visibility
+
+    def HasField(self, name):
+        return name == 'visibility'
+
+class LandmarkList:
+    """pose_landmarks of a remote result: the (33, 4) array, with MediaPipe-style objects built only if asked for."""
+    __slots__ = ('points', '_landmark')
+
+    def __init__(self, points):
+        self.points = points
+        self._landmark = None
+
+    @property
+    def landmark(self):
+        if self._landmark is None:
+            self._landmark = [_Landmark(*row) for row in self.points.tolist()]
+        return self._landmark
+
+class PoseResult:
+    __slots__ = ('pose_landmarks',)
+
+    def __init__(self, points):
+        self.pose_landmarks = LandmarkList(points) if points is not None else None
+
+def _serve(conn, ring_name, slots, slot_bytes, model_complexity, static_image_mode):
+    """Worker process: runs frames from the ring through one Pose graph and sends back landmarks only."""
+    from .pose_pool import create_pose
+    ring = FrameRing.attach(ring_name, slots, slot_bytes)
+    try:
+        pose = create_pose(model_complexity, static_image_mode, isolated=False)
+    except Exception as e:
+        conn.send(('error', repr(e)))
+        ring.close()
+        return
+    conn.send(('ready', os.getpid()))
+    try:
+        while True:
+            request = conn.recv()
+            if request is None:
+                break
+            slot, shape = request
+            try:
+                frame = ring.view(slot, shape)
+                frame.flags.writeable = False
+                results = pose.process(frame)
+                if results.pose_landmarks:
+                    conn.send_bytes(_LANDMARKS + landmarks_to_array(results.pose_landmarks.landmark).tobytes())
+                else:
+                    conn.send_bytes(_NO_POSE)
+            except Exception as e:
+                conn.send_bytes(_ERROR + repr(e).encode())
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        pose.close()
+        ring.close()
+
+class PoseProcess:
+    """
+    A Pose graph running in its own process, with the same process(frame_rgb) call as
+    mp_pose.Pose. The frame goes through a shared-memory ring and only the landmarks
+    come back over a pipe, so inference uses another core and never holds this
+    process's GIL. A caller that converts straight into frame_buffer(shape) (see
+    pose_pool.rgb_input) skips the one copy into the ring as well.
+
+    One caller at a time, like a Pose graph: the pools hand each one to a single stream
+    or worker thread.
+    """
+    def __init__(self, model_complexity, static_image_mode=False, max_frame_shape=MAX_FRAME_SHAPE,
+                 slots=FRAME_RING_SLOTS):
+        # Spawned, not forked: MediaPipe and the web server's threads do not survive fork.
+        context = multiprocessing.get_context('spawn')
+        self.model_complexity = model_complexity
+        self.alive = False
+        self._ring = FrameRing.create(slots, max_frame_shape)
+        self._slot = 0
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_serve, args=(child_conn, self._ring.name, slots, self._ring.slot_bytes, model_complexity,
+                                 static_image_mode),
+            name=f'pose-process-{model_complexity}', daemon=True)
+        try:
+            self._process.start()
+            child_conn.close()
+            if not self._conn.poll(PROCESS_START_TIMEOUT):
+                raise PoseProcessError(f"Pose process did not start within {PROCESS_START_TIMEOUT}s")
+            status, detail = self._conn.recv()
+            if status != 'ready':
+                raise PoseProcessError(f"Pose process failed to load the model: {detail}")
+        except BaseException:
+            self._shutdown()
+            raise
+        self.alive = True
+        self.pid = detail
+        _RUNNING.add(self)
+
+    def frame_buffer(self, shape):
+        """Writable array in shared memory that the next process() call reads without copying."""
+        return self._ring.view(self._slot, shape)
+
+    def process(self, frame_rgb):
+        if not self.alive:
+            raise PoseProcessError("Pose process is not running")
+        slot = self._slot
+        view = self._ring.view(slot, frame_rgb.shape)
+        if view.ctypes.data != frame_rgb.ctypes.data:
+            np.copyto(view, frame_rgb)
+        try:
+            self._conn.send((slot, frame_rgb.shape))
+            if not self._conn.poll(PROCESS_REPLY_TIMEOUT):
+                raise PoseProcessError(f"Pose process did not answer within {PROCESS_REPLY_TIMEOUT}s")
+            reply = self._conn.recv_bytes()
+        except (EOFError, OSError) as e:
+            self._shutdown()
+            raise PoseProcessError(f"Pose process exited: {e!r}") from e
+        except PoseProcessError:
+            self._shutdown()
+            raise
+        self._slot = (slot + 1) % self._ring.slots
+        status = reply[:1]
+        if status == _LANDMARKS:
+            return PoseResult(np.frombuffer(reply, dtype=np.float32, count=LANDMARK_COUNT * 4, offset=1)
+                              .reshape(LANDMARK_COUNT, 4))
+        if status == _NO_POSE:
+            return PoseResult(None)
+        raise RuntimeError(reply[1:].decode(errors='replace'))
+
+    def close(self):
+        if self.alive:
+            try:
+                self._conn.send(None)
+            except OSError:
+                pass
+        self._shutdown()
+
+    def _shutdown(self):
+        self.alive = False
+        if self._process.is_alive():
+            self._process.join(1.0)
+            if self._process.is_alive():
+                self._process.kill()
+                self._process.join()
+        self._conn.close()
+        if self._ring is not None:
+            self._ring.close(unlink=True)
+            self._ring = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Stopped at exit so their shared-memory rings are unlinked rather than reported as leaked.
+_RUNNING = weakref.WeakSet()
+
+@atexit.register
+def _close_all():
+    for pose in list(_RUNNING):
+        pose.close()
@@ -1,121 +1,125 @@
-import cv2
-import mediapipe as mp
-import numpy as np
-import collections
-from time import time
-from flask import Blueprint, render_template, redirect, url_for, session, flash, jsonify, Response
+import os
+import tempfile
+import uuid
+from time import time, monotonic, perf_counter
+from concurrent.futures import TimeoutError as FutureTimeout
+from flask import (Blueprint, render_template, redirect, url_for, session, flash, jsonify, request, Response,
+                   has_request_context)
+from werkzeug.exceptions import RequestEntityTooLarge
 
 # --- Import modular exercise logic ---
 from . import body_weight_squat_ohp
 from . import alternate_lunges_rotation
 from . import body_weight_squats
 from . import jumping_jack
+from . import exercise_engine
+from .exercise_engine import POSE_FAILED_MESSAGE
+from .capture_service import CAPTURE_SERVICE
+from .exercise_classifier import CLASSIFIER, DECISION_INTERVAL, LOCKED_DECISION_INTERVAL, UNKNOWN
+from .feedback_store import FEEDBACK_STORE, FeedbackSnapshot
+from .feedback_stream import feedback_events, SSE_MIMETYPE, SSE_HEADERS
+from .guided_workout import (GUIDED_WORKOUT_KEY, GUIDED_NOT_STARTED, count_guided_frame, generate_guided_frames, load_workout,
+                             new_workout_state)
+from .inference_scheduler import InferenceScheduler
+from .inference_pool import INGEST_POOL, FrameDropped, PoolSaturated, PoolUnavailable
+from .ingest_relay import INGEST_RELAY, RelayError
+from .pose_pool import (POSE_POOLS, PoolExhausted, DEFAULT_MODEL_COMPLEXITY, parse_model_complexity, rgb_input,
+                        warm_in_background)
+from .pose_process import FrameTooLarge, PoseProcessError
+from .landmark_protocol import decode_frames, is_newer, ProtocolError
+from .landmark_recording import record
+from .session_state import SESSIONS, AutoClassifyState
+from .skeleton_renderer import SkeletonRenderer
+from .stage_timer import NULL_TIMER
+from .stream_metrics import METRICS, PROMETHEUS_CONTENT_TYPE
+from .stream_pipeline import run_stream
+from .video_analysis import ANALYSIS_JOBS
+from .vision import cv2
+from .workout_history import HISTORY, finish_session
+from .webcam_stream import (JointAngleKernel, PoseLandmark, pose_points, mirror_points, MJPEG_MIMETYPE,
+                            POSE_CONNECTION_PAIRS)
 
 webcam_bp = Blueprint('webcam', __name__)
 
 # --- Central Dispatcher Setup ---
+# Every exercise is an ExerciseSpec run by exercise_engine; the per-module
+# generator is a thin wrapper binding the spec to a session's ExerciseState.
 EXERCISE_DISPATCHER = {
     'body_weight_squat_ohp': {
+        'spec': body_weight_squat_ohp.SPEC,
         'generator': body_weight_squat_ohp.generate_frames_squat_ohp,
-        'feedback_state': body_weight_squat_ohp.LATEST_FEEDBACK,
         'target_data': body_weight_squat_ohp.TARGET_DATA
     },
     'alternate_lunges_rotation': {
+        'spec': alternate_lunges_rotation.SPEC,
         'generator': alternate_lunges_rotation.generate_frames_lunge_rotation,
-        'feedback_state': alternate_lunges_rotation.LATEST_FEEDBACK,
         'target_data': alternate_lunges_rotation.TARGET_DATA
     },
     'body_weight_squats': {
+        'spec': body_weight_squats.SPEC,
         'generator': body_weight_squats.generate_frames_squats, 
-        'feedback_state': body_weight_squats.LATEST_FEEDBACK_SQUATS,
         'target_data': body_weight_squats.TARGET_DATA
     },
     'jumping_jack': {
+        'spec': jumping_jack.SPEC,
         'generator': jumping_jack.generate_frames_jumping_jack,
-        'feedback_state': jumping_jack.LATEST_FEEDBACK_JUMPING_JACK,
         'target_data': jumping_jack.TARGET_DATA
     }
 } 
 
 ALL_EXERCISES = {}
 for key, data in EXERCISE_DISPATCHER.items():
-    target_data = data['target_data']
-    angle = 0.0
-    thresholds = target_data.get('angle_thresholds', {})
-    if key in ['body_weight_squat_ohp', 'body_weight_squats']:
-        angle = thresholds.get('knee_down', 0)
-    elif key == 'alternate_lunges_rotation':
-        angle = thresholds.get('front_knee_down', 0)
-    elif key == 'jumping_jack':
-        angle = thresholds.get('arm_open', 0)
-    feedback_text = target_data.get('feedback', "Multi-criteria analysis.")
+    spec = data['spec']
+    angle = spec.thresholds.get(spec.display_threshold, 0) if spec.display_threshold else 0.0
+    feedback_text = spec.target_data.get('feedback', "Multi-criteria analysis.")
     ALL_EXERCISES[key] = {'target_angle': angle, 'feedback': feedback_text}
 
-# --- Auto-Classifier Globals ---
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-mp_drawing = mp.solutions.drawing_utils
+# --- Auto-Classifier Setup ---
+# NOTE: the camera is owned by capture_service.CAPTURE_SERVICE and shared by
+# every stream, so no generator opens its own VideoCapture. All mutable
+# classifier state lives in a per-session AutoClassifyState.
 
-# NOTE: 'cap' is REMOVED from global scope to prevent locking the camera
-# when other exercises try to use it.
+AUTO_CLASSIFY_KEY = 'auto_classify'
+lock_threshold = 4       # agreeing window decisions before a lock (tests/test_auto_classify_lock.py)
+switch_cooldown = 2
+NO_MOTION_SECONDS = 5.0   # a lock without a rep for this long is released
 
-exercise_data = {
-    "Squat": {"rep_count": 0, "stage": None},
-    "Push-up": {"rep_count": 0, "stage": None},
-    "Lunge": {"rep_count": 0, "stage": None},
-    "Jumping Jack": {"rep_count": 0, "stage": None},
-    "Sit-up": {"rep_count": 0, "stage": None},
+AUTO_CLASSIFY_JOINTS = {
+    'left_knee': (PoseLandmark.LEFT_HIP.value, PoseLandmark.LEFT_KNEE.value, PoseLandmark.LEFT_ANKLE.value),
+    'right_knee': (PoseLandmark.RIGHT_HIP.value, PoseLandmark.RIGHT_KNEE.value, PoseLandmark.RIGHT_ANKLE.value),
+    'left_elbow': (PoseLandmark.LEFT_SHOULDER.value, PoseLandmark.LEFT_ELBOW.value, PoseLandmark.LEFT_WRIST.value),
+    'right_elbow': (PoseLandmark.RIGHT_SHOULDER.value, PoseLandmark.RIGHT_ELBOW.value, PoseLandmark.RIGHT_WRIST.value),
+    'left_hip': (PoseLandmark.LEFT_SHOULDER.value, PoseLandmark.LEFT_HIP.value, PoseLandmark.LEFT_KNEE.value),
+    'left_shoulder': (PoseLandmark.LEFT_ELBOW.value, PoseLandmark.LEFT_SHOULDER.value, PoseLandmark.LEFT_HIP.value),
 }
-exercise_lock_buffer = collections.deque(maxlen=15)
-lock_threshold = 10
-active_exercise = None
-last_switch_time = 0
-switch_cooldown = 2
-no_motion_counter = 0
-NO_MOTION_LIMIT = 25
-current_exercise = "Unknown"
-feedback_text = ""
-
-def calculate_angle(a, b, c):
-    a = np.array(a); b = np.array(b); c = np.array(c)
-    radians = np.arctan2(c[1]-b[1], c[0]-b[0]) - np.arctan2(a[1]-b[1], a[0]-b[0])
-    angle = np.abs(radians*180.0/np.pi)
-    if angle > 180.0: angle = 360 - angle
-    return angle
-
-def extract_angles(landmarks):
-    left_knee = calculate_angle([landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].x, landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].y], [landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].x, landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].y], [landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].x, landmarks[mp_pose.PoseLandmark.LEFT_ANKLE.value].y])
-    right_knee = calculate_angle([landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value].x, landmarks[mp_pose.PoseLandmark.RIGHT_HIP.value].y], [landmarks[mp_pose.PoseLandmark.RIGHT_KNEE.value].x, landmarks[mp_pose.PoseLandmark.RIGHT_KNEE.value].y], [landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE.value].x, landmarks[mp_pose.PoseLandmark.RIGHT_ANKLE.value].y])
-    left_elbow = calculate_angle([landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].x, landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].y], [landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].x, landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].y], [landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].x, landmarks[mp_pose.PoseLandmark.LEFT_WRIST.value].y])
-    right_elbow = calculate_angle([landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].x, landmarks[mp_pose.PoseLandmark.RIGHT_SHOULDER.value].y], [landmarks[mp_pose.PoseLandmark.RIGHT_ELBOW.value].x, landmarks[mp_pose.PoseLandmark.RIGHT_ELBOW.value].y], [landmarks[mp_pose.PoseLandmark.RIGHT_WRIST.value].x, landmarks[mp_pose.PoseLandmark.RIGHT_WRIST.value].y])
-    left_hip = calculate_angle([landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].x, landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].y], [landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].x, landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].y], [landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].x, landmarks[mp_pose.PoseLandmark.LEFT_KNEE.value].y])
-    left_shoulder = calculate_angle([landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].x, landmarks[mp_pose.PoseLandmark.LEFT_ELBOW.value].y], [landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].x, landmarks[mp_pose.PoseLandmark.LEFT_SHOULDER.value].y], [landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].x, landmarks[mp_pose.PoseLandmark.LEFT_HIP.value].y])
-    return left_knee, right_knee, left_elbow, right_elbow, left_hip, left_shoulder
-
-def robust_classification(angles):
-    left_knee, right_knee, left_elbow, right_elbow, left_hip, left_shoulder = angles; avg_knee_angle = (left_knee + right_knee)/2; avg_elbow_angle = (left_elbow + right_elbow)/2
-    detected = "Unknown"; arms_wide = left_shoulder > 90 and left_elbow > 150 and right_elbow > 150; legs_wide = avg_knee_angle > 160
-    if avg_knee_angle < 100 and 70 < left_hip < 140: detected = "Squat"
-    elif avg_elbow_angle < 100 and avg_knee_angle > 150: detected = "Push-up"
-    elif left_hip < 100 and avg_knee_angle < 140: detected = "Lunge"
-    elif arms_wide and legs_wide: detected = "Jumping Jack"
-    elif left_hip < 90 and avg_knee_angle < 90: detected = "Sit-up"
-    return detected
-
-def update_active_exercise():
-    global active_exercise, last_switch_time; now = time()
-    if len(exercise_lock_buffer) == 0: return
-    common_exercise = max(set(exercise_lock_buffer), key=exercise_lock_buffer.count)
-    if common_exercise == "Unknown": return
-    if common_exercise != active_exercise:
-        if (now - last_switch_time) > switch_cooldown and exercise_lock_buffer.count(common_exercise) >= lock_threshold:
-            active_exercise = common_exercise; last_switch_time = now
-
-def classify_and_count(angles):
-    global current_exercise, feedback_text, active_exercise, no_motion_counter
-    detected = robust_classification(angles); exercise_lock_buffer.append(detected); update_active_exercise()
-    if active_exercise is None: current_exercise = "Detecting..."; feedback_text = "Start exercising to lock."; return
-    current_exercise = active_exercise; data = exercise_data.get(active_exercise); rep_this_frame = False
+AUTO_CLASSIFY_KERNEL = JointAngleKernel(AUTO_CLASSIFY_JOINTS)
+AUTO_CLASSIFY_SKELETON = SkeletonRenderer()   # white connections, red landmarks
+AUTO_CLASSIFY_LANDMARK_COLOR = (0, 0, 255)
+
+def extract_angles(points):
+    return tuple(AUTO_CLASSIFY_KERNEL.compute(points).tolist())
+
+def update_active_exercise(st, now=None):
+    if now is None: now = time()
+    common_exercise, count = st.lock_buffer.most_common()
+    if common_exercise is None or common_exercise == UNKNOWN: return
+    if common_exercise != st.active_exercise:
+        if (now - st.last_switch_time) > switch_cooldown and count >= lock_threshold:
+            st.active_exercise = common_exercise; st.last_switch_time = now
+
+def classify_and_count(angles, st, now=None):
+    # `now` lets a replay run on the recording's clock instead of the wall clock.
+    if now is None: now = time()
+    st.history.seen(now)
+    # Each decision looks at the last WINDOW_SECONDS of angles, so it already sees a
+    # whole rep; the lock buffer only has to confirm it a few times.
+    # The window is re-scored every DECISION_INTERVAL rather than every frame, and
+    # only every LOCKED_DECISION_INTERVAL once locked: then it just watches for a switch.
+    interval = LOCKED_DECISION_INTERVAL if st.active_exercise is not None else DECISION_INTERVAL
+    if CLASSIFIER.observe(st.angle_window, now, angles, interval):
+        st.lock_buffer.append(CLASSIFIER.classify(st.angle_window, now)); update_active_exercise(st, now)
+    if st.active_exercise is None: st.current_exercise = "Detecting..."; st.feedback_text = "Start exercising to lock."; return
+    active_exercise = st.active_exercise; st.current_exercise = active_exercise; data = st.exercise_data.get(active_exercise); rep_this_frame = False; feedback_text = st.feedback_text
     left_knee, right_knee, left_elbow, right_elbow, left_hip, left_shoulder = angles; avg_knee_angle = (left_knee + right_knee) / 2; avg_elbow_angle = (left_elbow + right_elbow) / 2; arms_wide = left_shoulder > 90 and left_elbow > 150 and right_elbow > 150; legs_wide = avg_knee_angle > 160
     if active_exercise == "Jumping Jack":
         if arms_wide and legs_wide:
@@ -140,55 +144,371 @@ def classify_and_count(angles):
         if left_hip < 90 and data.get("stage") == "up": data["stage"] = "down"; data["rep_count"] += 1; rep_this_frame = True; feedback_text = f"Good sit-up! Reps: {data['rep_count']}"
         elif 90 <= left_hip <= 160: feedback_text = "Keep pushing!"
     else: feedback_text = "Exercise not recognized"
-    if rep_this_frame: no_motion_counter = 0
-    else:
-        no_motion_counter += 1
-        if no_motion_counter >= NO_MOTION_LIMIT: active_exercise = None; exercise_lock_buffer.clear(); no_motion_counter = 0; feedback_text = "No reps detected. Unlocking..."
-
-def generate_frames():
-    global current_exercise, feedback_text
-    
-    # Initialize camera locally for this specific stream request
-    cap = cv2.VideoCapture(0)
-    frame_skip = 0
-    
+    # Timed rather than counted in frames, so the limit does not shrink when the
+    # scheduler raises the inference rate.
+    if rep_this_frame: st.last_rep_time = now; st.history.rep(now, active_exercise)
+    elif now - max(st.last_rep_time, st.last_switch_time) >= NO_MOTION_SECONDS:
+        st.active_exercise = None; st.lock_buffer.clear(); feedback_text = "No reps detected. Unlocking..."
+    st.feedback_text = feedback_text
+
+def generate_frames(st, model_complexity=DEFAULT_MODEL_COMPLEXITY, capture=None, scheduler=None, timer=NULL_TIMER,
+                    pipelined=None):
+    # Frames come from the shared capture thread, so this stream never opens
+    # (or locks) the camera itself.
+    frames = (capture or CAPTURE_SERVICE).subscribe()
+    if frames is None:
+        st.feedback_text = "Camera could not be opened."; st.notify_if_changed(); return
+    # Inference runs at the scheduler's rate (idle users cost little, fast movements
+    # get full rate); frames in between reuse the last skeleton.
+    scheduler = scheduler or InferenceScheduler()
+
+    def prepare(frame):
+        # Shared frames are read-only; the flip gives this stream its own copy, in the
+        # selfie view the ingest paths and the exercise streams count in, so left_*
+        # angles mean the same joint whichever way the frames arrive.
+        return cv2.flip(frame, 1)
+
+    def analyse(frame, started, timer):
+        img_rgb = rgb_input(pose, frame); timer.lap('cvtColor')
+        results = pose.process(img_rgb); timer.lap('pose.process')
+        points = None; was_locked = st.active_exercise is not None
+        if results.pose_landmarks:
+            points = pose_points(results.pose_landmarks)
+        smoothed = st.landmark_filter(points, started)
+        if smoothed is not None: classify_and_count(extract_angles(smoothed), st)
+        record(st, AUTO_CLASSIFY_KEY, points, 'server')
+        scheduler.record_inference(started, smoothed, monotonic() - started)
+        # The classifier's NO_MOTION_SECONDS unlock is an idle signal too.
+        if was_locked and st.active_exercise is None: scheduler.mark_idle()
+        st.touch(); st.notify_if_changed()
+        timer.lap('angle_math')
+        return points
+
+    def draw(frame, points):
+        if points is None: return False
+        AUTO_CLASSIFY_SKELETON.draw(frame, points, AUTO_CLASSIFY_LANDMARK_COLOR)
+        return True
+
     try:
-        while True:
-            ret, frame = cap.read()
-            if not ret: break
-            
-            frame_skip += 1
-            if frame_skip % 2 == 0:
-                img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB); results = pose.process(img_rgb)
-                if results.pose_landmarks:
-                    landmarks = results.pose_landmarks.landmark; mp_drawing.draw_landmarks(frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS); angles = extract_angles(landmarks); classify_and_count(angles)
-            _, buffer = cv2.imencode('.jpg', frame); frame_bytes = buffer.tobytes()
-            yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        # Each stream tracks its own user, so it checks out its own pre-warmed Pose graph.
+        with POSE_POOLS.checkout(model_complexity) as pose:
+            yield from run_stream(frames, scheduler, prepare, analyse, draw, timer, pipelined)
+    except PoolExhausted:
+        st.feedback_text = "Server is busy, please try again shortly."; st.notify_if_changed()
+    except (PoseProcessError, FrameTooLarge) as e:
+        print(f"Pose estimation stopped mid-stream: {e}")
+        st.feedback_text = POSE_FAILED_MESSAGE; st.notify_if_changed()
     finally:
-        # Ensure camera is released when client disconnects
-        cap.release()
+        # Leaving the subscription lets the capture thread idle the camera out
+        frames.close()
+        finish_session(st, AUTO_CLASSIFY_KEY)
+
+def stream_session_id():
+    """Stable per-browser id used to key webcam state in SESSIONS."""
+    if 'stream_id' not in session:
+        session['stream_id'] = uuid.uuid4().hex
+    return session['stream_id']
+
+def user_state(sid, key, factory, user=None):
+    """
+    SESSIONS.get that also notes the logged-in user (`user`, else the request's), whose
+    workout history the session is saved to. The session now runs in this worker, so it
+    answers the ingest other workers relay for it.
+    """
+    st = SESSIONS.get(sid, key, factory)
+    if user is None and has_request_context():
+        user = session.get('user_email')
+    st.owner = user or st.owner
+    INGEST_RELAY.listen(relayed_ingest)
+    return st
+
+def session_feedback(sid, key, default):
+    """
+    The session's current FeedbackSnapshot. FEEDBACK_STORE names the worker that runs the
+    session: this worker's own state answers only if it is that worker, otherwise the
+    record the owner published does, whatever older copy this worker still holds. Else
+    one of default().
+    """
+    st = SESSIONS.local(sid, key)
+    if st is not None:
+        return st.snapshot
+    record = FEEDBACK_STORE.read(sid, key)
+    if record is not None:
+        return FeedbackSnapshot(record[1], None, record[0])   # served as stored; the body is not parsed
+    return FeedbackSnapshot(0, default())
+
+def snapshot_response(snapshot):
+    """The snapshot's JSON body as serialized when it was published, or 304 if the client has it already."""
+    if snapshot.etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.headers['Cache-Control'] = 'no-cache'   # revalidate every poll, so a 304 is never stale
+    return response
+
+# --- Browser Frame Ingest ---
+# The browser captures the user's own camera and posts downscaled JPEG frames; the
+# shared INGEST_POOL runs pose inference and the session's counter runs on the result.
+
+INGEST_RESULT_TIMEOUT = 2.0   # seconds a request waits for its frame's result
+
+def _ingest_handler(exercise_name, sid, user):
+    """
+    Returns (session state, handler(points)) for one ingested frame, or (None, None) if
+    unknown. The handler smooths the landmarks, counts them and returns (smoothed points,
+    skeleton color, flagged landmarks); recordings keep the raw points.
+    """
+    if exercise_name == AUTO_CLASSIFY_KEY:
+        st = user_state(sid, AUTO_CLASSIFY_KEY, AutoClassifyState, user)
+        def handle(points):
+            smoothed = st.landmark_filter(points)
+            if smoothed is not None: classify_and_count(extract_angles(smoothed), st)
+            record(st, AUTO_CLASSIFY_KEY, points, 'browser')
+            st.touch(); st.notify_if_changed()
+            return smoothed, None, frozenset()
+        return st, handle
+    if exercise_name == GUIDED_WORKOUT_KEY:
+        # Started by the guided workout page; each frame counts into the current set.
+        st = SESSIONS.peek(sid, GUIDED_WORKOUT_KEY)
+        if st is None:
+            return None, None
+        def handle(points):
+            key, current = st.active_set()
+            record(current, key, points, 'browser')
+            return count_guided_frame(st, points)
+        return st, handle
+    dispatcher_info = EXERCISE_DISPATCHER.get(exercise_name)
+    if not dispatcher_info:
+        return None, None
+    spec = dispatcher_info['spec']
+    st = user_state(sid, exercise_name, spec.new_state, user)
+    def handle(points):
+        smoothed = st.landmark_filter(points)
+        color, flagged = exercise_engine.count_frame(spec, st, smoothed)
+        record(st, exercise_name, points, 'browser')
+        return smoothed, color, flagged
+    return st, handle
+
+def _ingest_frame(st, handler, sid, exercise_name, data, timer):
+    try:
+        points, color, flagged = INGEST_POOL.submit((sid, exercise_name), data, handler, timer).result(INGEST_RESULT_TIMEOUT)
+    except PoolSaturated:
+        return {'status': 'busy', 'session': st.snapshot.data}, 503, {'Retry-After': '1'}
+    except PoolUnavailable:
+        return ({'status': 'error', 'error': 'Pose estimation is unavailable, please try again shortly.',
+                 'session': st.snapshot.data}, 503, {'Retry-After': '5'})
+    except (FrameDropped, FutureTimeout):
+        # A newer frame from this stream is already on its way; report current state only.
+        return {'status': 'dropped', 'session': st.snapshot.data}, 200, {}
+    except ValueError as e:
+        return {'status': 'error', 'error': str(e)}, 400, {}
+    return {
+        'status': 'ok',
+        'landmarks': points.round(4).tolist() if points is not None else None,
+        'score_color': color,
+        'flagged': sorted(flagged),
+        'session': st.snapshot.data,
+    }, 200, {}
+
+def _ingest_landmarks(st, handler, frames, lane):
+    color = None; flagged = frozenset(); skipped = 0
+    with st.lock:
+        lane.start()   # the batch's angle_math, not the wait for the session's lock
+        for seq, points in frames:
+            if not is_newer(seq, st.last_seq):
+                skipped += 1; continue
+            st.last_seq = seq
+            _, color, flagged = handler(mirror_points(points) if points is not None else None)
+        lane.lap('angle_math')
+        last_seq = st.last_seq
+        data = st.snapshot.data
+    return ({'status': 'ok', 'seq': last_seq, 'skipped': skipped, 'score_color': color, 'flagged': sorted(flagged),
+             'session': data}, 200, {})
+
+def ingest(kind, exercise_name, sid, user, data):
+    """
+    Runs one ingest request ('frame', 'landmarks' or 'end') on this worker's state of
+    the session; returns (JSON payload or None, status, headers). Frame and landmark
+    requests are timed into the exercise's METRICS.ingest_timer.
+    """
+    if kind == 'end':
+        st = SESSIONS.peek(sid, exercise_name)
+        if st is not None:
+            finish_session(st, exercise_name)
+        return None, 204, {}
+    timer = METRICS.ingest_timer(exercise_name)
+    if kind == 'landmarks':
+        started = perf_counter()
+        lane = timer.lane(); lane.start()
+        try:
+            frames = decode_frames(data)
+        except ProtocolError as e:
+            return {'status': 'error', 'error': str(e)}, 400, {}
+        lane.lap('decode')
+    st, handler = _ingest_handler(exercise_name, sid, user)
+    if st is None:
+        return {'status': 'error', 'error': 'Exercise not registered.'}, 404, {}
+    if kind == 'landmarks':
+        reply = _ingest_landmarks(st, handler, frames, lane)
+        timer.record_frame(perf_counter() - started)
+        return reply
+    return _ingest_frame(st, handler, sid, exercise_name, data, timer)
+
+def relayed_ingest(header, body):
+    """IngestRelay handler: an ingest request another worker passed to this one, which owns its session."""
+    return ingest(header['kind'], header['exercise'], header['sid'], header['user'], body)
+
+def owned_ingest(kind, exercise_name, data):
+    """
+    Runs an ingest request where its session's counting state lives: here if this worker
+    owns the session (claiming it if nobody does), else on the owning worker through
+    INGEST_RELAY, so every frame of a session is counted into one state.
+    """
+    sid = stream_session_id()
+    user = session.get('user_email')
+    owner = SESSIONS.owner_elsewhere(sid, exercise_name)
+    if owner is None:
+        payload, status, headers = ingest(kind, exercise_name, sid, user, data)
+    else:
+        try:
+            payload, status, headers = INGEST_RELAY.forward(
+                owner, {'kind': kind, 'exercise': exercise_name, 'sid': sid, 'user': user}, data)
+        except RelayError as e:
+            print(f"Ingest relay for session {sid} ({exercise_name}) to worker {owner} failed: {e}")
+            payload, status, headers = {'status': 'busy', 'session': None}, 503, {'Retry-After': '1'}
+    if payload is None:
+        return '', status, headers
+    return jsonify(payload), status, headers
+
+def _ingest_known(exercise_name):
+    return exercise_name in EXERCISE_DISPATCHER or exercise_name in (AUTO_CLASSIFY_KEY, GUIDED_WORKOUT_KEY)
+
+@webcam_bp.route('/ingest/frame/<exercise_name>', methods=['POST'])
+def ingest_frame(exercise_name):
+    frame = request.files.get('frame')
+    data = frame.read() if frame else request.get_data()
+    if not data:
+        return jsonify({'status': 'error', 'error': 'Empty frame.'}), 400
+    if not _ingest_known(exercise_name):
+        return jsonify({'status': 'error', 'error': 'Exercise not registered.'}), 404
+    return owned_ingest('frame', exercise_name, data)
+
+@webcam_bp.route('/ingest/landmarks/<exercise_name>', methods=['POST'])
+def ingest_landmarks(exercise_name):
+    # The client ran pose estimation itself, so a frame costs only the counting
+    # arithmetic here: no decode, no inference, no encode.
+    if not _ingest_known(exercise_name):
+        return jsonify({'status': 'error', 'error': 'Exercise not registered.'}), 404
+    return owned_ingest('landmarks', exercise_name, request.get_data())
+
+@webcam_bp.route('/webcam_end/<exercise_name>', methods=['POST'])
+def webcam_end(exercise_name):
+    """Sent by the trainer pages when they close: saves the session to workout_history now."""
+    if not _ingest_known(exercise_name):
+        return '', 204
+    return owned_ingest('end', exercise_name, b'')
+
+@webcam_bp.route('/ingest/stats')
+def ingest_stats():
+    return jsonify(INGEST_POOL.stats())
+
+@webcam_bp.route('/pose_pool/stats')
+def pose_pool_stats():
+    return jsonify(POSE_POOLS.stats())
+
+# --- Offline Video Analysis ---
+# Recorded workout videos are analyzed in the background by video_analysis; the
+# upload returns a job id to poll for the rep count, rep timings and angle series.
+
+ANALYSIS_VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.webm', '.mkv')
+MAX_ANALYSIS_UPLOAD_MB = int(os.getenv('MAX_ANALYSIS_UPLOAD_MB', 200))   # larger uploads are refused unread
+
+@webcam_bp.route('/video_analysis/<exercise_name>', methods=['POST'])
+def submit_video_analysis(exercise_name):
+    if 'user_email' not in session:
+        return jsonify({'status': 'error', 'error': 'Login required.'}), 401
+    dispatcher_info = EXERCISE_DISPATCHER.get(exercise_name)
+    if not dispatcher_info:
+        return jsonify({'status': 'error', 'error': 'Exercise not registered.'}), 404
+    # Checked before the body is read: a declared length over the limit is refused at once,
+    # and a chunked body stops being spooled to disk when it passes the limit.
+    request.max_content_length = MAX_ANALYSIS_UPLOAD_MB * 1024 * 1024
+    try:
+        upload = request.files.get('video')
+    except RequestEntityTooLarge:
+        return jsonify({'status': 'error', 'error': f'Videos up to {MAX_ANALYSIS_UPLOAD_MB} MB can be analyzed.'}), 413
+    extension = os.path.splitext(upload.filename)[1].lower() if upload else ''
+    if extension not in ANALYSIS_VIDEO_EXTENSIONS:
+        return jsonify({'status': 'error', 'error': 'Upload a video file (' + ', '.join(ANALYSIS_VIDEO_EXTENSIONS) + ').'}), 400
+    with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as f:
+        upload.save(f)
+    job_id = ANALYSIS_JOBS.submit(f.name, dispatcher_info['spec'], owner=session['user_email'])
+    return jsonify({'status': 'queued', 'job_id': job_id,
+                    'status_url': url_for('webcam.video_analysis_status', job_id=job_id)}), 202
+
+@webcam_bp.route('/video_analysis/jobs/<job_id>')
+def video_analysis_status(job_id):
+    status = ANALYSIS_JOBS.status(job_id, owner=session.get('user_email'))
+    if status is None:
+        return jsonify({'status': 'error', 'error': 'Unknown job.'}), 404
+    return jsonify(status)
+
+# Where a trainer page gets its video:
+#   browser   - (default) the user's camera stays in the page; frames go to the ingest
+#               pool and the page draws the returned landmarks itself (overlay mode)
+#   landmarks - pose estimation runs in the page too; only landmarks are sent
+#   server    - the server camera as MJPEG with the skeleton drawn in (?mode=mjpeg)
+STREAM_SOURCES = ('browser', 'landmarks', 'server')
+
+def stream_source():
+    if request.args.get('mode') == 'mjpeg':
+        return 'server'
+    source = request.args.get('source', 'browser')
+    return source if source in STREAM_SOURCES else 'browser'
 
 # --- Webcam Routes ---
 
 @webcam_bp.route('/exercise_info')
 def exercise_info():
-    return jsonify({
-        "current_exercise": current_exercise,
-        "rep_counts": {ex: data['rep_count'] for ex, data in exercise_data.items()},
-        "feedback": feedback_text,
-        "active_exercise": active_exercise,
-    })
+    return snapshot_response(session_feedback(stream_session_id(), AUTO_CLASSIFY_KEY, lambda: AutoClassifyState().to_dict()))
 
 @webcam_bp.route('/auto_classify_video_feed')
 def auto_classify_video_feed():
+    st = user_state(stream_session_id(), AUTO_CLASSIFY_KEY, AutoClassifyState)
+    model_complexity = parse_model_complexity(request.args.get('model_complexity'))
     return Response(
-        generate_frames(), 
-        mimetype='multipart/x-mixed-replace; boundary=frame'
+        METRICS.stream(AUTO_CLASSIFY_KEY, lambda timer: generate_frames(st, model_complexity, timer=timer)),
+        mimetype=MJPEG_MIMETYPE
     )
 
+@webcam_bp.route('/feedback_stream/<exercise_name>')
+def feedback_stream(exercise_name):
+    """Pushes the session's feedback as Server-Sent Events whenever reps, state or feedback change."""
+    sid = stream_session_id()
+    if exercise_name == AUTO_CLASSIFY_KEY:
+        factory = AutoClassifyState
+    elif exercise_name == GUIDED_WORKOUT_KEY:
+        factory = None   # only the guided workout page starts one
+    else:
+        dispatcher_info = EXERCISE_DISPATCHER.get(exercise_name)
+        if not dispatcher_info:
+            return Response("Exercise not found.", status=404)
+        factory = dispatcher_info['spec'].new_state
+    st = SESSIONS.local(sid, exercise_name)
+    if st is None and FEEDBACK_STORE.enabled:
+        # The stream may run (or start later) in another worker: follow its published state.
+        st = FEEDBACK_STORE.view(sid, exercise_name, factory().to_dict() if factory else GUIDED_NOT_STARTED)
+    elif st is None:
+        if factory is None:
+            return Response("No guided workout started.", status=404)
+        st = SESSIONS.get(sid, exercise_name, factory)
+    return Response(feedback_events(st), mimetype=SSE_MIMETYPE, headers=SSE_HEADERS)
+
 @webcam_bp.route('/auto-classify')
 def auto_classify():
-    return render_template('auto_classify.html')
+    warm_in_background()   # the page's stream or first ingested frame follows in a moment
+    return render_template('auto_classify.html', source=stream_source(), pose_connections=POSE_CONNECTION_PAIRS)
 
 @webcam_bp.route('/video-workouts')
 def video_workouts():
@@ -203,23 +523,77 @@ def webcam_start(exercise_name):
     if 'user_email' not in session:
         flash("Please log in to start the webcam trainer.")
         return redirect(url_for('auth.login')) 
-    return render_template('webcam_streamer.html', exercise=exercise_name)
+    warm_in_background()   # the page's stream or first ingested frame follows in a moment
+    return render_template('webcam_streamer.html', exercise=exercise_name, source=stream_source(),
+                           pose_connections=POSE_CONNECTION_PAIRS)
 
 @webcam_bp.route('/get_feedback/<exercise_name>')
 def get_feedback(exercise_name):
+    if exercise_name == GUIDED_WORKOUT_KEY:
+        return snapshot_response(session_feedback(stream_session_id(), GUIDED_WORKOUT_KEY, lambda: GUIDED_NOT_STARTED))
     dispatcher_info = EXERCISE_DISPATCHER.get(exercise_name)
     if not dispatcher_info:
         return jsonify({'feedback': 'Error: Exercise not registered.', 'reps': 0, 'stage': 'ERROR', 'angle': 'N/A'}), 404
-    feedback_state = dispatcher_info['feedback_state']
-    return jsonify(feedback_state)
+    return snapshot_response(session_feedback(stream_session_id(), exercise_name,
+                                              lambda: dispatcher_info['spec'].initial_feedback))
+
+@webcam_bp.route('/metrics')
+def metrics():
+    """Per-exercise stage-timing histograms, stream counts and dropped frames for Prometheus."""
+    return Response(METRICS.render(INGEST_POOL.stats(), HISTORY.stats()), content_type=PROMETHEUS_CONTENT_TYPE)
 
 @webcam_bp.route('/video_feed/<exercise_name>')
 def video_feed(exercise_name):
     dispatcher_info = EXERCISE_DISPATCHER.get(exercise_name)
     if not dispatcher_info:
         return Response("Exercise not found.", status=404)
+    spec = dispatcher_info['spec']
+    # Resolve the session's state now: the generator runs outside the request context.
+    st = user_state(stream_session_id(), exercise_name, spec.new_state)
     generator_func = dispatcher_info['generator']
+    model_complexity = parse_model_complexity(request.args.get('model_complexity'))
     return Response(
-        generator_func(),
-        mimetype='multipart/x-mixed-replace; boundary=frame'
-    )
\ No newline at end of file
+        METRICS.stream(exercise_name, lambda timer: generator_func(st, model_complexity, timer=timer)),
+        mimetype=MJPEG_MIMETYPE
+    )
+
+# --- Guided Workouts ---
+# A saved custom workout runs set after set on one stream: when a set reaches its
+# target reps only the counting spec changes, never the camera or the pose graph.
+
+@webcam_bp.route('/guided_workout/<workout_id>')
+def guided_workout(workout_id):
+    if 'user_email' not in session:
+        flash("Please log in to start the webcam trainer.")
+        return redirect(url_for('auth.login'))
+    sid = stream_session_id()
+    st = SESSIONS.peek(sid, GUIDED_WORKOUT_KEY)
+    skipped = []
+    if st is None or st.workout_id != workout_id or st.finished:
+        # A reload of the same unfinished workout resumes it; anything else starts over.
+        document = load_workout(workout_id, session['user_email'])
+        if document is None:
+            flash("That workout could not be found.")
+            return redirect(url_for('ai_workouts.build_workout'))
+        fresh, skipped = new_workout_state(document, EXERCISE_DISPATCHER)
+        if fresh is None:
+            flash("None of this workout's exercises can be counted by the webcam trainer yet.")
+            return redirect(url_for('ai_workouts.build_workout'))
+        if st is not None:
+            finish_session(st, GUIDED_WORKOUT_KEY)
+            SESSIONS.discard(sid, GUIDED_WORKOUT_KEY)
+        st = user_state(sid, GUIDED_WORKOUT_KEY, lambda: fresh)
+    warm_in_background()   # the page's stream or first ingested frame follows in a moment
+    return render_template('webcam_streamer.html', exercise=GUIDED_WORKOUT_KEY, guided=st.snapshot.data,
+                           skipped=skipped, source=stream_source(), pose_connections=POSE_CONNECTION_PAIRS)
+
+@webcam_bp.route('/guided_feed')
+def guided_feed():
+    st = SESSIONS.peek(stream_session_id(), GUIDED_WORKOUT_KEY)
+    if st is None:
+        return Response("No guided workout started.", status=404)
+    model_complexity = parse_model_complexity(request.args.get('model_complexity'))
+    return Response(
+        METRICS.stream(GUIDED_WORKOUT_KEY, lambda timer: generate_guided_frames(st, model_complexity, timer=timer)),
+        mimetype=MJPEG_MIMETYPE
+    )
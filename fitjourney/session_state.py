@@ -0,0 +1,298 @@
+# session_state.py - Per-session webcam trainer state with bounded, self-evicting storage
+import collections
+import os
+import threading
+import time
+import uuid
+
+from .exercise_classifier import AUTO_CLASSIFY_EXERCISES, AngleWindow, LockBuffer
+from .feedback_store import FEEDBACK_STORE, FeedbackSnapshot
+from .landmark_filter import new_filter
+from .workout_history import SessionLog, finish_session
+
+# Configuration
+MAX_SESSIONS = 512       # hard cap on tracked (session, exercise) pairs
+SESSION_TTL = 15 * 60    # seconds without a frame or a read before a state is evicted
+SWEEP_INTERVAL = 30      # seconds between TTL sweeps
+
+class _Watchable:
+    """
+    Publishing and change notification. The frame loop mutates a state field by
+    field; notify_if_changed() then publishes it as a new FeedbackSnapshot, and readers
+    only ever use `snapshot`, so they never see half an update. `version` only moves
+    when signature() (the user-visible part of the state) differs from the last
+    notified one, so frames that merely refresh the angles wake nobody. `shared`
+    publishes the snapshot to the cross-worker feedback store when the SessionStore
+    has one.
+    """
+    __slots__ = ('version', 'changed', 'snapshot', 'shared', '_signature')
+
+    def _init_watch(self):
+        self.version = 0
+        self.changed = threading.Condition(threading.Lock())
+        self.snapshot = FeedbackSnapshot(0, self.to_dict())
+        self.shared = None
+        self._signature = None
+
+    def notify_if_changed(self):
+        signature = self.signature()
+        changed = signature != self._signature
+        data = self.to_dict()
+        if changed or data != self.snapshot.data:
+            self.snapshot = FeedbackSnapshot(self.version + 1 if changed else self.version, data)
+        if changed:
+            with self.changed:
+                self._signature = signature
+                self.version = self.snapshot.version
+                self.changed.notify_all()
+        if self.shared is not None:
+            self.shared.publish(self.snapshot)
+
+    def wait_for_change(self, version, timeout):
+        """Blocks until version moves past `version` or timeout expires; returns the current version."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+class ExerciseState(_Watchable):
+    """Live rep-counting state of one user on one exercise."""
+    __slots__ = ('reps', 'state', 'feedback', 'values', 'last_seen', 'last_seq', 'lock', 'recorder', 'landmark_filter',
+                 'owner', 'history')
+
+    def __init__(self, initial_feedback):
+        self.reps = initial_feedback.get('reps', 0)
+        self.state = initial_feedback.get('state')
+        self.feedback = list(initial_feedback.get('feedback', []))
+        self.values = {k: v for k, v in initial_feedback.items() if k not in ('feedback', 'reps', 'state')}
+        self.last_seen = time.monotonic()
+        self.last_seq = None           # newest landmark-ingest sequence number applied
+        self.lock = threading.Lock()   # serializes ingest requests of one session and finish_session
+        self.recorder = None           # landmark_recording.LandmarkRecorder while recording is enabled
+        self.landmark_filter = new_filter()   # smooths this stream's landmarks before the angle math
+        self.owner = None                # email of the logged-in user, whose history the session is saved to
+        self.history = SessionLog()      # reps and warnings since the session started, for workout_history
+        self._init_watch()
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def signature(self):
+        return (self.reps, self.state, tuple(self.feedback))
+
+    def to_dict(self):
+        data = {'feedback': list(self.feedback), 'reps': self.reps, 'state': self.state}
+        data.update(self.values)
+        return data
+
+class AutoClassifyState(_Watchable):
+    """Classifier window, lock buffer and per-exercise rep counters for one auto-classify session."""
+    __slots__ = ('exercise_data', 'angle_window', 'lock_buffer', 'active_exercise', 'last_switch_time',
+                 'last_rep_time', 'current_exercise', 'feedback_text', 'last_seen', 'last_seq', 'lock', 'recorder', 'landmark_filter',
+                 'owner', 'history')
+
+    def __init__(self):
+        self.exercise_data = {name: {"rep_count": 0, "stage": None} for name in AUTO_CLASSIFY_EXERCISES}
+        self.angle_window = AngleWindow()
+        self.lock_buffer = LockBuffer()
+        self.active_exercise = None
+        self.last_switch_time = 0
+        self.last_rep_time = 0
+        self.current_exercise = "Unknown"
+        self.feedback_text = ""
+        self.last_seen = time.monotonic()
+        self.last_seq = None
+        self.lock = threading.Lock()
+        self.recorder = None
+        self.landmark_filter = new_filter()
+        self.owner = None
+        self.history = SessionLog()
+        self._init_watch()
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def signature(self):
+        return (self.current_exercise, self.active_exercise, self.feedback_text,
+                tuple(data['rep_count'] for data in self.exercise_data.values()))
+
+    def to_dict(self):
+        return {
+            "current_exercise": self.current_exercise,
+            "rep_counts": {ex: data['rep_count'] for ex, data in self.exercise_data.items()},
+            "feedback": self.feedback_text,
+            "active_exercise": self.active_exercise,
+        }
+
+class GuidedWorkoutState(_Watchable):
+    """
+    A saved custom workout run set after set on one stream: the plan, where the user
+    is in it and the ExerciseState of the current set. Each set gets a fresh state, so
+    reps start from zero and workout_history saves every set as its own document,
+    tagged with this run's `run_id` so the stats count the workout once; the landmark
+    filter is carried over, as it is the same person in front of the same camera.
+    `sets` is a list of (exercise key, ExerciseSpec, target reps, set number, set
+    count); guided_workout builds it from the saved workout.
+    """
+    __slots__ = ('workout_id', 'run_id', 'title', 'sets', 'position', 'current', 'finished', 'last_seen', 'last_seq',
+                 'lock', 'landmark_filter', 'owner')
+
+    def __init__(self, workout_id, title, sets):
+        self.workout_id = workout_id
+        self.run_id = uuid.uuid4().hex   # one per run: the same saved workout may be done again
+        self.title = title
+        self.sets = sets
+        self.position = 0
+        self.finished = False
+        self.last_seen = time.monotonic()
+        self.last_seq = None
+        self.lock = threading.Lock()
+        self.landmark_filter = new_filter()
+        self.owner = None
+        self.current = self._start_set()
+        self._init_watch()
+
+    def _start_set(self):
+        key, spec, reps, number, count = self.sets[self.position]
+        state = spec.new_state()
+        state.landmark_filter = self.landmark_filter
+        state.owner = self.owner
+        state.history.guided = {'run_id': self.run_id, 'workout_id': self.workout_id, 'title': self.title,
+                                'set': self.position + 1, 'total_sets': len(self.sets)}
+        state.feedback = [f"{key.replace('_', ' ').capitalize()}: set {number} of {count}, {reps} reps."]
+        return state
+
+    @property
+    def spec(self):
+        return self.sets[self.position][1]
+
+    @property
+    def target_reps(self):
+        return self.sets[self.position][2]
+
+    def active_set(self):
+        """(exercise key, ExerciseState) of the set being counted, as finish_session saves it."""
+        self.current.owner = self.owner
+        return self.sets[self.position][0], self.current
+
+    def advance_if_done(self):
+        """Moves on to the next set once the current one reaches its target; True if it did."""
+        if self.finished or self.current.reps < self.target_reps:
+            return False
+        key, state = self.active_set()
+        finish_session(state, key)
+        if self.position + 1 == len(self.sets):
+            self.finished = True
+            self.current.feedback = ["Workout complete. Well done!"]; self.current.state = 'DONE'
+        else:
+            self.position += 1
+            self.current = self._start_set()
+        return True
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+        self.current.touch()
+
+    def signature(self):
+        return (self.position, self.finished) + self.current.signature()
+
+    def to_dict(self):
+        key, _, reps, number, count = self.sets[self.position]
+        data = self.current.to_dict()
+        data.update(workout=self.title, exercise=key, set=number, sets=count, target_reps=reps,
+                    position=self.position + 1, total_sets=len(self.sets), finished=self.finished)
+        return data
+
+class SessionStore:
+    """
+    Maps (session id, exercise key) to a state object. Entries expire after
+    SESSION_TTL without activity, and the least recently used entry is evicted
+    once MAX_SESSIONS is reached, so abandoned sessions never accumulate.
+    on_evict(key, state) is called for every evicted entry. With a `shared`
+    FeedbackStore, new states claim their session and publish to it, and evicted ones
+    are removed from it.
+    """
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL, on_evict=None, shared=None):
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._max_sessions = max_sessions
+        self._ttl = ttl
+        self._on_evict = on_evict
+        self._shared = shared
+        self._last_sweep = time.monotonic()
+
+    def get(self, session_id, key, factory):
+        """Returns the state for (session_id, key), creating it with factory() if missing."""
+        entry_key = (session_id, key)
+        evicted = []
+        with self._lock:
+            state = self._entries.get(entry_key)
+            if state is None:
+                evicted = self._sweep()
+                while len(self._entries) >= self._max_sessions:
+                    evicted.append(self._entries.popitem(last=False))
+                state = self._entries[entry_key] = factory()
+                if self._shared is not None and self._shared.enabled:
+                    # The session runs where its state was last created.
+                    self._shared.claim(session_id, key, take_over=True)
+                    state.shared = self._shared.handle(session_id, key)
+            else:
+                self._entries.move_to_end(entry_key)
+            state.touch()
+        # Outside the lock: finish_session waits for the state's own lock, which an
+        # ingest request may hold for a whole batch, and nobody else's lookup should.
+        for evicted_key, evicted_state in evicted:
+            self._evicted(evicted_key, evicted_state)
+        return state
+
+    def peek(self, session_id, key):
+        """Returns the existing state for (session_id, key) or None; never creates one."""
+        with self._lock:
+            state = self._entries.get((session_id, key))
+            if state is not None:
+                state.touch()
+            return state
+
+    def local(self, session_id, key):
+        """peek(), except None when the shared store names another worker as the session's owner."""
+        if self._shared is not None and self._shared.owner(session_id, key) not in (None, os.getpid()):
+            return None
+        return self.peek(session_id, key)
+
+    def owner_elsewhere(self, session_id, key):
+        """
+        Pid of the other worker that runs (session_id, key), or None if it runs here: it
+        is claimed for this worker when nobody live owns it.
+        """
+        if self._shared is None:
+            return None
+        owner = self._shared.claim(session_id, key)
+        return owner if owner not in (None, os.getpid()) else None
+
+    def discard(self, session_id, key):
+        with self._lock:
+            state = self._entries.pop((session_id, key), None)
+        if state is not None and state.shared is not None:
+            state.shared.remove()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _sweep(self):
+        """Removes expired entries (lock held) and returns them as (key, state) pairs for _evicted."""
+        now = time.monotonic()
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return []
+        self._last_sweep = now
+        expired = [k for k, state in self._entries.items() if now - state.last_seen > self._ttl]
+        return [(k, self._entries.pop(k)) for k in expired]
+
+    def _evicted(self, entry_key, state):
+        if state.shared is not None:
+            state.shared.remove()
+        if self._on_evict is not None:
+            self._on_evict(entry_key[1], state)
+
+# Process-wide store used by the webcam routes. A session the browser never ended
+# (closed tab, lost network) is saved to workout_history when it is evicted; its
+# published feedback is readable from every worker through FEEDBACK_STORE.
+SESSIONS = SessionStore(on_evict=lambda key, state: finish_session(state, key), shared=FEEDBACK_STORE)
@@ -0,0 +1,60 @@
+# skeleton_renderer.py - Pose skeleton overlay drawn from the landmark array with a few batched OpenCV calls
+import numpy as np
+
+from .vision import cv2
+from .webcam_stream import POSE_CONNECTION_PAIRS
+
+# Configuration
+VISIBILITY_THRESHOLD = 0.5   # landmarks seen less surely than this are not drawn (as mp_drawing)
+WHITE = (255, 255, 255)
+RED = (0, 0, 255)
+
+class SkeletonRenderer:
+    """
+    Draws a (33, 4) landmark array (pose_points) over a BGR frame: connection lines,
+    then a white-rimmed dot per landmark in the frame's score color. The connection
+    index arrays are built once, so a frame costs one vectorized scale to pixels and
+    at most four batched cv2.polylines calls instead of a Python-level OpenCV call
+    per line and per landmark. Each landmark is a zero-length polyline whose round
+    cap is the dot: unlike mp_drawing's rings, which OpenCV draws as a thick outline
+    of many short segments, it is filled in one pass.
+
+    Connections between two `flagged` landmarks (the joints behind a failed form
+    check) are drawn in flag_color.
+    """
+    def __init__(self, connection_color=WHITE, connection_thickness=2, circle_radius=2, flag_color=RED):
+        pairs = np.array(POSE_CONNECTION_PAIRS, dtype=np.intp)
+        self._starts, self._ends = pairs[:, 0], pairs[:, 1]
+        self.connection_color = connection_color
+        self.connection_thickness = connection_thickness
+        self.flag_color = flag_color
+        self._dot_width = 2 * circle_radius
+        self._rim_width = 2 * max(circle_radius + 1, int(circle_radius * 1.2))
+        self._flag_masks = {frozenset(): np.zeros(len(pairs), dtype=bool)}
+
+    def _flag_mask(self, flagged):
+        mask = self._flag_masks.get(flagged)
+        if mask is None:
+            members = np.zeros(int(self._ends.max()) + 1, dtype=bool)
+            members[list(flagged)] = True
+            mask = self._flag_masks[flagged] = members[self._starts] & members[self._ends]
+        return mask
+
+    def draw(self, frame, points, color, flagged=frozenset()):
+        """Draws the skeleton in place, its landmark dots in `color`."""
+        height, width = frame.shape[:2]
+        xy = points[:, :2]
+        visible = (points[:, 3] >= VISIBILITY_THRESHOLD) & np.all((xy >= 0) & (xy <= 1), axis=1)
+        pixels = np.minimum(xy * (width, height), (width - 1, height - 1)).astype(np.int32)
+
+        drawn = visible[self._starts] & visible[self._ends]
+        segments = np.stack((pixels[self._starts], pixels[self._ends]), axis=1)
+        flag = self._flag_mask(flagged)
+        for mask, line_color in ((drawn & ~flag, self.connection_color), (drawn & flag, self.flag_color)):
+            if mask.any():
+                cv2.polylines(frame, segments[mask], False, line_color, self.connection_thickness)
+
+        dots = np.repeat(pixels[visible][:, None, :], 2, axis=1)
+        if len(dots):
+            cv2.polylines(frame, dots, False, WHITE, self._rim_width)
+            cv2.polylines(frame, dots, False, color, self._dot_width)
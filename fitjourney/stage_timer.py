@@ -0,0 +1,106 @@
+# stage_timer.py - Per-stage timing of the frame generators, for benchmarks and metrics
+import time
+
+import numpy as np
+
+# Stages of one generated frame, in pipeline order. 'capture' is the wait for the next
+# frame plus the per-stream flip/copy; 'angle_math' covers landmark conversion, joint
+# angles and the rep state machine. Frames that skip inference only have capture,
+# draw_landmarks and imencode. In a pipelined stream the inference thread makes its
+# own copy of each frame it infers on, which adds a capture sample without the wait.
+STAGES = ('capture', 'cvtColor', 'pose.process', 'angle_math', 'draw_landmarks', 'imencode')
+# Stages of one browser ingest request: 'decode' is the JPEG decode (frame ingest) or
+# the landmark packet decode (landmark ingest, which has no image stages).
+INGEST_STAGES = ('decode', 'cvtColor', 'pose.process', 'angle_math')
+
+class StageTimer:
+    """
+    Charges wall time to stages with one clock read per stage: lap(stage) records the
+    time since the previous lap. A generator calls start() once, lap() after each
+    stage and frame_done(dropped) before it yields, dropped being its running count
+    of skipped frames; a pipelined stream laps each of its threads on its own lane().
+    Subclasses override record() and record_frame() to send the samples elsewhere;
+    this one keeps them for percentiles.
+    """
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.frames = []
+        self.dropped = 0
+        self._mark = None
+        self._frame_started = None
+
+    def start(self):
+        self._mark = self._frame_started = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.record(stage, now - self._mark)
+        self._mark = now
+
+    def frame_done(self, dropped=0):
+        now = time.perf_counter()
+        self.record_frame(now - self._frame_started)
+        self.dropped = dropped
+        # The next frame's capture stage starts now, so time the consumer holds the
+        # generator suspended counts as waiting for the next frame.
+        self._mark = self._frame_started = now
+
+    def record(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def record_frame(self, seconds):
+        self.frames.append(seconds)
+
+    def lane(self):
+        """Lap clock for one thread of a pipelined stream; its laps are recorded here."""
+        return _Lane(self.record)
+
+    def reset(self):
+        for samples in self.samples.values():
+            samples.clear()
+        self.frames.clear()
+
+    def summary(self):
+        """{'frames', 'p50_ms', 'p99_ms', 'dropped', 'stages': {stage: {'count', 'mean_ms', 'p50_ms', 'p99_ms', 'share'}}}"""
+        frames = np.array(self.frames) * 1000
+        total = sum(sum(samples) for samples in self.samples.values())
+        stages = {}
+        for stage, samples in self.samples.items():
+            ms = np.array(samples) * 1000
+            p50, p99 = np.percentile(ms, [50, 99]) if ms.size else (0.0, 0.0)
+            stages[stage] = {
+                'count': int(ms.size),
+                'mean_ms': round(float(ms.mean()), 3) if ms.size else 0.0,
+                'p50_ms': round(float(p50), 3),
+                'p99_ms': round(float(p99), 3),
+                'share': round(float(ms.sum()) / 1000 / total, 3) if total else 0.0,
+            }
+        p50, p99 = np.percentile(frames, [50, 99]) if frames.size else (float('nan'),) * 2
+        return {'frames': int(frames.size), 'p50_ms': round(float(p50), 3), 'p99_ms': round(float(p99), 3),
+                'dropped': self.dropped, 'stages': stages}
+
+class _Lane:
+    """start()/lap() of a StageTimer with its own mark, so threads do not share one."""
+    __slots__ = ('_record', '_mark')
+
+    def __init__(self, record):
+        self._record = record
+        self._mark = None
+
+    def start(self):
+        self._mark = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self._record(stage, now - self._mark)
+        self._mark = now
+
+class _NullTimer:
+    """Timer used when nobody is measuring; every call is a no-op."""
+    def start(self): pass
+    def lap(self, stage): pass
+    def frame_done(self, dropped=0): pass
+    def record_frame(self, seconds): pass
+    def lane(self): return self
+
+NULL_TIMER = _NullTimer()
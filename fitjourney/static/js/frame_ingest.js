@@ -0,0 +1,73 @@
+// static/js/frame_ingest.js
+// Streams the user's own camera to the server's inference pool: frames are downscaled
+// on a canvas, JPEG-encoded and posted one at a time, so a slow server automatically
+// lowers the upload rate instead of building a queue.
+
+class FrameIngestClient {
+    constructor(video, url, { width = 320, quality = 0.7, maxFps = 15, onResult = () => {}, onError = () => {} } = {}) {
+        this.video = video;
+        this.url = url;
+        this.width = width;
+        this.quality = quality;
+        this.minInterval = 1000 / maxFps;
+        this.onResult = onResult;
+        this.onError = onError;
+        this.canvas = document.createElement('canvas');
+        this.context = this.canvas.getContext('2d');
+        this.running = false;
+        this.backoffUntil = 0;
+    }
+
+    async start() {
+        const stream = await navigator.mediaDevices.getUserMedia({ video: { width: 640, height: 480 }, audio: false });
+        this.video.srcObject = stream;
+        await this.video.play();
+        const scale = this.width / this.video.videoWidth;
+        this.canvas.width = this.width;
+        this.canvas.height = Math.round(this.video.videoHeight * scale);
+        this.running = true;
+        this.loop();
+    }
+
+    stop() {
+        this.running = false;
+        const stream = this.video.srcObject;
+        if (stream) stream.getTracks().forEach(track => track.stop());
+    }
+
+    encodeFrame() {
+        this.context.drawImage(this.video, 0, 0, this.canvas.width, this.canvas.height);
+        return new Promise(resolve => this.canvas.toBlob(resolve, 'image/jpeg', this.quality));
+    }
+
+    async loop() {
+        while (this.running) {
+            const started = performance.now();
+            if (started >= this.backoffUntil) {
+                try {
+                    const blob = await this.encodeFrame();
+                    const response = await fetch(this.url, {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'image/jpeg' },
+                        body: blob,
+                        credentials: 'same-origin',
+                    });
+                    const data = await response.json();
+                    if (response.status === 503) {
+                        // Pool saturated: back off before sending the next frame.
+                        const retryAfter = parseFloat(response.headers.get('Retry-After') || '1');
+                        this.backoffUntil = performance.now() + retryAfter * 1000;
+                    }
+                    if (data.session) this.onResult(data);
+                } catch (error) {
+                    this.onError(error);
+                    this.backoffUntil = performance.now() + 1000;
+                }
+            }
+            const elapsed = performance.now() - started;
+            await new Promise(resolve => setTimeout(resolve, Math.max(0, this.minInterval - elapsed)));
+        }
+    }
+}
+
+window.FrameIngestClient = FrameIngestClient;
@@ -0,0 +1,125 @@
+// static/js/landmark_ingest.js
+// Runs MediaPipe pose estimation in the browser and sends only the 33 landmarks per
+// frame to the server, which just counts reps. Wire format (see landmark_protocol.py):
+// an 8-byte header <BBBxI (version, dtype, flags, pad, seq) followed by 33 x 4 values.
+import { FilesetResolver, PoseLandmarker } from "https://cdn.jsdelivr.net/npm/@mediapipe/tasks-vision@0.10.14";
+
+const WASM_ROOT = "https://cdn.jsdelivr.net/npm/@mediapipe/tasks-vision@0.10.14/wasm";
+const MODEL_URL = "https://storage.googleapis.com/mediapipe-models/pose_landmarker/pose_landmarker_lite/float16/1/pose_landmarker_lite.task";
+
+const PROTOCOL_VERSION = 1;
+const DTYPE_FLOAT32 = 1;
+const DTYPE_INT16 = 2;
+const FLAG_NO_POSE = 0x01;
+const INT16_SCALE = 8192;
+const HEADER_SIZE = 8;
+const LANDMARK_COUNT = 33;
+const MAX_BATCH = 8;
+
+export class LandmarkIngestClient {
+    constructor(video, url, { int16 = true, maxFps = 30, onLandmarks = () => {}, onResult = () => {}, onError = () => {} } = {}) {
+        this.video = video;
+        this.url = url;
+        this.dtype = int16 ? DTYPE_INT16 : DTYPE_FLOAT32;
+        this.minInterval = 1000 / maxFps;
+        this.onLandmarks = onLandmarks;
+        this.onResult = onResult;
+        this.onError = onError;
+        // Seeded from the clock so a reloaded page always continues above the old sequence.
+        this.seq = Date.now() >>> 0;
+        this.pending = [];
+        this.inFlight = false;
+        this.running = false;
+        this.lastDetect = 0;
+    }
+
+    async start() {
+        const vision = await FilesetResolver.forVisionTasks(WASM_ROOT);
+        this.landmarker = await PoseLandmarker.createFromOptions(vision, {
+            baseOptions: { modelAssetPath: MODEL_URL, delegate: "GPU" },
+            runningMode: "VIDEO",
+            numPoses: 1,
+        });
+        const stream = await navigator.mediaDevices.getUserMedia({ video: { width: 640, height: 480 }, audio: false });
+        this.video.srcObject = stream;
+        await this.video.play();
+        this.running = true;
+        requestAnimationFrame(now => this.tick(now));
+    }
+
+    stop() {
+        this.running = false;
+        const stream = this.video.srcObject;
+        if (stream) stream.getTracks().forEach(track => track.stop());
+        if (this.landmarker) this.landmarker.close();
+    }
+
+    tick(now) {
+        if (!this.running) return;
+        if (now - this.lastDetect >= this.minInterval && this.video.readyState >= 2) {
+            this.lastDetect = now;
+            const result = this.landmarker.detectForVideo(this.video, now);
+            this.onLandmarks(result.landmarks[0]);
+            this.pending.push(this.encode(result.landmarks[0]));
+            // Frames produced while a request is in flight are batched into the next
+            // one; if the server falls far behind only the newest are kept.
+            if (this.pending.length > MAX_BATCH) this.pending.splice(0, this.pending.length - MAX_BATCH);
+            this.flush();
+        }
+        requestAnimationFrame(next => this.tick(next));
+    }
+
+    encode(landmarks) {
+        const seq = this.seq;
+        this.seq = (this.seq + 1) >>> 0;
+        if (!landmarks) {
+            const buffer = new ArrayBuffer(HEADER_SIZE);
+            this.writeHeader(new DataView(buffer), FLAG_NO_POSE, seq);
+            return buffer;
+        }
+        const width = this.dtype === DTYPE_INT16 ? 2 : 4;
+        const buffer = new ArrayBuffer(HEADER_SIZE + LANDMARK_COUNT * 4 * width);
+        const view = new DataView(buffer);
+        this.writeHeader(view, 0, seq);
+        let offset = HEADER_SIZE;
+        for (const lm of landmarks) {
+            for (const value of [lm.x, lm.y, lm.z, lm.visibility ?? 0]) {
+                if (width === 2) {
+                    view.setInt16(offset, Math.max(-32768, Math.min(32767, Math.round(value * INT16_SCALE))), true);
+                } else {
+                    view.setFloat32(offset, value, true);
+                }
+                offset += width;
+            }
+        }
+        return buffer;
+    }
+
+    writeHeader(view, flags, seq) {
+        view.setUint8(0, PROTOCOL_VERSION);
+        view.setUint8(1, this.dtype);
+        view.setUint8(2, flags);
+        view.setUint32(4, seq, true);
+    }
+
+    async flush() {
+        if (this.inFlight || !this.pending.length) return;
+        const batch = this.pending;
+        this.pending = [];
+        this.inFlight = true;
+        try {
+            const response = await fetch(this.url, {
+                method: "POST",
+                headers: { "Content-Type": "application/octet-stream" },
+                body: new Blob(batch),
+                credentials: "same-origin",
+            });
+            const data = await response.json();
+            if (data.session) this.onResult(data);
+        } catch (error) {
+            this.onError(error);
+        } finally {
+            this.inFlight = false;
+        }
+    }
+}
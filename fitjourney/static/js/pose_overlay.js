@@ -0,0 +1,71 @@
+// static/js/pose_overlay.js
+// Draws the pose skeleton in the browser over the local camera video, so the server
+// only has to send landmark coordinates and a score color instead of encoded frames.
+
+const MIN_VISIBILITY = 0.5;
+const CONNECTION_COLOR = 'rgb(255, 255, 0)';
+const FLAG_COLOR = 'rgb(255, 0, 0)';   // as SkeletonRenderer's flag_color
+
+class PoseOverlay {
+    // connections: [[a, b], ...] landmark index pairs (sent by the server so both sides agree).
+    constructor(canvas, video, connections) {
+        this.canvas = canvas;
+        this.video = video;
+        this.connections = connections;
+        this.context = canvas.getContext('2d');
+    }
+
+    // Matches the canvas to the video's intrinsic size; CSS object-fit then crops both alike.
+    resize() {
+        const { videoWidth, videoHeight } = this.video;
+        if (videoWidth && (this.canvas.width !== videoWidth || this.canvas.height !== videoHeight)) {
+            this.canvas.width = videoWidth;
+            this.canvas.height = videoHeight;
+        }
+    }
+
+    clear() {
+        this.context.clearRect(0, 0, this.canvas.width, this.canvas.height);
+    }
+
+    // landmarks: [[x, y, z, visibility], ...] normalized to the (mirrored) view;
+    // bgr: the server's score color as [b, g, r]; flagged: indices of the landmarks
+    // behind a failed form check, whose connections are drawn in FLAG_COLOR.
+    draw(landmarks, bgr, flagged) {
+        this.resize();
+        this.clear();
+        if (!landmarks) return;
+        const ctx = this.context;
+        const w = this.canvas.width;
+        const h = this.canvas.height;
+        const color = bgr ? `rgb(${bgr[2]}, ${bgr[1]}, ${bgr[0]})` : 'rgb(255, 255, 0)';
+
+        const flags = new Set(flagged || []);
+
+        ctx.lineWidth = 2;
+        for (const [lineColor, isFlagged] of [[CONNECTION_COLOR, false], [FLAG_COLOR, true]]) {
+            ctx.strokeStyle = lineColor;
+            ctx.beginPath();
+            for (const [a, b] of this.connections) {
+                const p = landmarks[a];
+                const q = landmarks[b];
+                if (p[3] < MIN_VISIBILITY || q[3] < MIN_VISIBILITY) continue;
+                if ((flags.has(a) && flags.has(b)) !== isFlagged) continue;
+                ctx.moveTo(p[0] * w, p[1] * h);
+                ctx.lineTo(q[0] * w, q[1] * h);
+            }
+            ctx.stroke();
+        }
+
+        ctx.fillStyle = color;
+        ctx.beginPath();
+        for (const p of landmarks) {
+            if (p[3] < MIN_VISIBILITY) continue;
+            ctx.moveTo(p[0] * w + 6, p[1] * h);
+            ctx.arc(p[0] * w, p[1] * h, 6, 0, 2 * Math.PI);
+        }
+        ctx.fill();
+    }
+}
+
+window.PoseOverlay = PoseOverlay;
@@ -132,7 +132,10 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(data => {
             if (data.success) {
-                alert('Workout saved successfully!');
+                // Saved workouts can be run back to back by the webcam trainer
+                if (confirm('Workout saved successfully! Start it now with the webcam trainer?')) {
+                    window.location.href = `/guided_workout/${data.workout_id}`;
+                }
             } else {
                 alert('Error saving workout: ' + data.message);
             }
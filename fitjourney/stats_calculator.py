@@ -65,7 +65,25 @@ def calculate_user_stats(user_email):
                     workout_types[plan_type_hint] += 1
                 else:
                     workout_types['Strength'] += 1 # Fallback for unknown/custom
-                    
+
+    # Webcam trainer sessions (saved by workout_history when a session ends); a guided
+    # workout saves every set, tagged with its run, and counts as one workout.
+    webcam_sessions = extensions.workout_history_collection.find(
+        {'user_email': user_email, 'source': 'webcam'}, {'timestamp': 1, 'type': 1, 'guided_workout.run_id': 1})
+    guided_runs = set()
+    for workout in webcam_sessions:
+        run_id = workout.get('guided_workout', {}).get('run_id')
+        if run_id is not None:
+            if run_id in guided_runs:
+                continue
+            guided_runs.add(run_id)
+        ts = workout['timestamp']
+        if ts >= start_of_month:
+            monthly_workouts_count += 1
+        workout_dates.add(ts.date())
+        workout_type = workout.get('type', 'Strength')
+        workout_types[workout_type if workout_type in workout_types else 'Strength'] += 1
+
     # 3. Current Streak (Consecutive days with a workout)
     current_streak = 0
     check_day = date.today()
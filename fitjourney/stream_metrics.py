@@ -0,0 +1,194 @@
+# stream_metrics.py - Stage-timing histograms and stream counters, rendered in the Prometheus text format
+import bisect
+import collections
+import threading
+
+from .stage_timer import StageTimer, STAGES, INGEST_STAGES
+
+# Configuration
+# Upper bounds (seconds) of the histogram buckets: sub-millisecond colour conversion
+# up to a stalled camera or a cold model load.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+METRIC_PREFIX = 'fitjourney'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class Histogram:
+    """
+    Fixed-bucket histogram: one bisect and two additions per sample. A pipelined
+    stream observes from its analyse and encode threads at once, so the additions
+    and merges hold the histogram's own lock, which is uncontended almost always.
+    """
+    __slots__ = ('counts', 'sum', '_lock')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # the last bucket is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+
+    def merge(self, other):
+        with other._lock:
+            counts, total = list(other.counts), other.sum
+        with self._lock:
+            for index, count in enumerate(counts):
+                self.counts[index] += count
+            self.sum += total
+
+class MetricsTimer(StageTimer):
+    """
+    StageTimer for a live stream: samples go into the stream's own histograms instead
+    of lists, so the hot path never contends on a registry-wide lock and memory stays
+    constant however long the stream runs. StreamMetrics sums the histograms of all streams at scrape time.
+    An exercise's ingest requests share one, each lapping its own lane().
+    """
+    def __init__(self, stages=STAGES):
+        super().__init__()
+        self.stages = {stage: Histogram() for stage in stages}
+        self.frame = Histogram()
+
+    def record(self, stage, seconds):
+        self.stages[stage].observe(seconds)
+
+    def record_frame(self, seconds):
+        self.frame.observe(seconds)
+
+class _ExerciseTotals:
+    """Histograms and counters of one exercise's finished streams."""
+    def __init__(self):
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.frame = Histogram()
+        self.dropped = 0
+        self.streams = 0
+        self.tracking_errors = 0
+
+    def add(self, timer):
+        for stage, histogram in timer.stages.items():
+            self.stages[stage].merge(histogram)
+        self.frame.merge(timer.frame)
+        self.dropped += timer.dropped
+
+class StreamMetrics:
+    """
+    Registry of the MJPEG streams' timers, aggregated per exercise. stream() runs a
+    generator with a MetricsTimer while counting it as active; when the stream ends
+    its histograms are folded into the exercise's totals.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._live = {}   # MetricsTimer -> exercise
+        self._totals = collections.defaultdict(_ExerciseTotals)
+        self._ingest = {}   # exercise -> MetricsTimer of its browser ingest requests
+
+    def stream(self, exercise, make_stream):
+        """Yields from make_stream(timer), a frame generator timed into these metrics."""
+        timer = MetricsTimer()
+        with self._lock:
+            self._live[timer] = exercise
+            self._totals[exercise].streams += 1
+        try:
+            yield from make_stream(timer)
+        finally:
+            with self._lock:
+                del self._live[timer]
+                self._totals[exercise].add(timer)
+
+    def ingest_timer(self, exercise):
+        """The MetricsTimer (INGEST_STAGES) that one exercise's frame and landmark ingest requests record into."""
+        timer = self._ingest.get(exercise)
+        if timer is None:
+            with self._lock:
+                timer = self._ingest.setdefault(exercise, MetricsTimer(INGEST_STAGES))
+        return timer
+
+    def tracking_error(self, exercise):
+        with self._lock:
+            self._totals[exercise].tracking_errors += 1
+
+    def snapshot(self):
+        """{exercise: (_ExerciseTotals including live streams, active stream count)}"""
+        with self._lock:
+            live = list(self._live.items())
+            merged = {}
+            for exercise, totals in self._totals.items():
+                copy = merged[exercise] = _ExerciseTotals()
+                copy.add(totals)
+                copy.streams, copy.tracking_errors = totals.streams, totals.tracking_errors
+        active = collections.Counter()
+        for timer, exercise in live:
+            merged[exercise].add(timer)
+            active[exercise] += 1
+        return {exercise: (totals, active[exercise]) for exercise, totals in merged.items()}
+
+    def render(self, ingest=None, history=None):
+        """Prometheus text exposition of every exercise's streams, plus the ingest pool's and history writer's counters."""
+        snapshot = sorted(self.snapshot().items())
+        lines = []
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+        def sample(name, labels, value):
+            label_text = ','.join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f"{METRIC_PREFIX}_{name}{{{label_text}}} {value}")
+        def histogram(name, labels, h):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), h.counts):
+                cumulative += count
+                sample(f"{name}_bucket", {**labels, 'le': bound}, cumulative)
+            sample(f"{name}_sum", labels, round(h.sum, 6))
+            sample(f"{name}_count", labels, cumulative)
+
+        family('stream_stage_seconds', 'histogram', 'Time per frame spent in each stage of the MJPEG frame loop.')
+        for exercise, (totals, _) in snapshot:
+            for stage in STAGES:
+                histogram('stream_stage_seconds', {'exercise': exercise, 'stage': stage}, totals.stages[stage])
+        family('stream_frame_seconds', 'histogram', 'Time to produce one MJPEG frame, all stages included.')
+        for exercise, (totals, _) in snapshot:
+            histogram('stream_frame_seconds', {'exercise': exercise}, totals.frame)
+        family('streams_active', 'gauge', 'MJPEG streams currently being served.')
+        for exercise, (_, active) in snapshot:
+            sample('streams_active', {'exercise': exercise}, active)
+        family('streams_total', 'counter', 'MJPEG streams started.')
+        for exercise, (totals, _) in snapshot:
+            sample('streams_total', {'exercise': exercise}, totals.streams)
+        family('stream_dropped_frames_total', 'counter', 'Camera frames a stream skipped because it fell behind.')
+        for exercise, (totals, _) in snapshot:
+            sample('stream_dropped_frames_total', {'exercise': exercise}, totals.dropped)
+        family('tracking_errors_total', 'counter', 'Frames whose landmarks the rep counter failed on.')
+        for exercise, (totals, _) in snapshot:
+            sample('tracking_errors_total', {'exercise': exercise}, totals.tracking_errors)
+
+        ingest_timers = sorted(self._ingest.items())
+        family('ingest_stage_seconds', 'histogram', 'Time per browser ingest request spent in each stage.')
+        for exercise, timer in ingest_timers:
+            for stage in INGEST_STAGES:
+                histogram('ingest_stage_seconds', {'exercise': exercise, 'stage': stage}, timer.stages[stage])
+        family('ingest_request_seconds', 'histogram', 'Time to process one ingested frame or landmark batch, all stages included.')
+        for exercise, timer in ingest_timers:
+            histogram('ingest_request_seconds', {'exercise': exercise}, timer.frame)
+
+        if ingest is not None:
+            family('ingest_streams_active', 'gauge', 'Browser streams that posted a frame recently.')
+            lines.append(f"{METRIC_PREFIX}_ingest_streams_active {ingest['active_streams']}")
+            family('ingest_frames_processed_total', 'counter', 'Browser frames run through pose inference.')
+            lines.append(f"{METRIC_PREFIX}_ingest_frames_processed_total {ingest['processed']}")
+            family('ingest_dropped_frames_total', 'counter', 'Browser frames dropped before inference.')
+            for reason in ('superseded', 'stale'):
+                sample('ingest_dropped_frames_total', {'reason': reason}, ingest[f'dropped_{reason}'])
+            family('ingest_rejected_frames_total', 'counter', 'Browser frames refused because the pool was saturated.')
+            lines.append(f"{METRIC_PREFIX}_ingest_rejected_frames_total {ingest['rejected']}")
+        if history is not None:
+            family('history_pending', 'gauge', 'Session summaries waiting to be written to workout_history.')
+            lines.append(f"{METRIC_PREFIX}_history_pending {history['pending']}")
+            family('history_written_total', 'counter', 'Session summaries written to workout_history.')
+            lines.append(f"{METRIC_PREFIX}_history_written_total {history['written']}")
+            family('history_dropped_total', 'counter', 'Session summaries lost because the write buffer was full.')
+            lines.append(f"{METRIC_PREFIX}_history_dropped_total {history['dropped']}")
+        return '\n'.join(lines) + '\n'
+
+# Process-wide registry behind /metrics
+METRICS = StreamMetrics()
@@ -0,0 +1,159 @@
+# stream_pipeline.py - Capture, inference and encode of one MJPEG stream as pipelined threads
+import os
+import threading
+import time
+
+from .vision import cv2
+from .webcam_stream import mjpeg_part
+
+# Configuration
+PIPELINE_STREAMS = os.getenv('PIPELINE_STREAMS', '1') == '1'   # '0': every stage in the generator's thread, in turn
+
+class LatestSlot:
+    """
+    Hand-off of one item between two pipeline stages. put() never blocks: an item the
+    next stage has not taken yet is replaced (latest frame wins) and counted in
+    `replaced`, so a stage that falls behind skips frames instead of queueing them.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.replaced = 0
+
+    def put(self, item):
+        """Offers the next item; False once the consumer has gone."""
+        with self._cond:
+            if self._closed:
+                return False
+            if self._item is not None:
+                self.replaced += 1
+            self._item = item
+            self._cond.notify()
+            return True
+
+    def take(self):
+        """Waits for the next item; None once the slot is closed and empty."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._item is not None or self._closed)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+def run_stream(frames, scheduler, prepare, analyse, draw, timer, pipelined=None):
+    """
+    Yields the MJPEG parts of one stream from its capture subscription. The generator
+    supplies three steps:
+
+      prepare(frame)                  - this stream's own copy of a shared capture frame
+      analyse(frame, started, timer)  - inference and counting, run when the scheduler asks
+                                        for it; returns the overlay. Laps 'cvtColor' to
+                                        'angle_math' itself.
+      draw(frame, overlay)            - draws the latest overlay (None before the first
+                                        inference); True if anything was drawn
+
+    Pipelined (the default), inference runs on its own thread over the newest camera
+    frame, while an encode thread prepares, draws the newest overlay on and encodes
+    every frame it can keep up with; the caller's thread only hands finished parts to
+    the client. The video rate is then set by the slowest stage rather than the sum
+    of all of them, inference never waits for encoding, and a slow client makes the
+    stream skip encoded frames rather than hold up the camera. The skeleton may be
+    drawn on a frame or so newer than the one it was inferred from, as on the frames
+    the scheduler skips anyway.
+
+    With pipelined=False (PIPELINE_STREAMS=0) the steps run in turn in the caller's thread.
+    """
+    if pipelined is None:
+        pipelined = PIPELINE_STREAMS
+    stream = _pipelined if pipelined else _sequential
+    return stream(frames, scheduler, prepare, analyse, draw, timer)
+
+def _encode(frame, overlay, draw, timer):
+    if draw(frame, overlay):
+        timer.lap('draw_landmarks')
+    _, buffer = cv2.imencode('.jpg', frame)
+    part = mjpeg_part(buffer.tobytes())
+    timer.lap('imencode')
+    return part
+
+def _sequential(frames, scheduler, prepare, analyse, draw, timer):
+    overlay = None
+    timer.start()
+    for frame in frames:
+        frame = prepare(frame)
+        timer.lap('capture')
+        started = time.monotonic()
+        if scheduler.should_infer(started):
+            overlay = analyse(frame, started, timer)
+        part = _encode(frame, overlay, draw, timer)
+        now = time.monotonic()
+        scheduler.record_latency(now, now - frames.last_timestamp)
+        timer.frame_done(frames.dropped)
+        yield part
+
+def _pipelined(frames, scheduler, prepare, analyse, draw, timer):
+    to_send = LatestSlot()
+    overlay = None   # newest analyse() result; replaced whole, so the encode thread reads it without a lock
+    errors = []
+
+    # The scheduler is shared without a lock as well: the analyse thread only reads
+    # the rate cap and writes motion, the encode thread only writes latency and the cap.
+    def analyse_stage():
+        nonlocal overlay
+        lane = timer.lane()
+        try:
+            for _, frame in frames.tap():
+                started = time.monotonic()
+                if not scheduler.should_infer(started):
+                    continue
+                lane.start()
+                frame = prepare(frame)   # its own copy: the encode thread draws on its frames
+                lane.lap('capture')
+                overlay = analyse(frame, started, lane)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            to_send.close()
+
+    def encode_stage():
+        lane = timer.lane()
+        lane.start()
+        try:
+            for frame in frames:
+                frame = prepare(frame)
+                lane.lap('capture')
+                part = _encode(frame, overlay, draw, lane)
+                now = time.monotonic()
+                scheduler.record_latency(now, now - frames.last_timestamp)
+                if not to_send.put(part):
+                    break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            to_send.close()
+
+    threads = [threading.Thread(target=analyse_stage, name='stream-analyse', daemon=True),
+               threading.Thread(target=encode_stage, name='stream-encode', daemon=True)]
+    for thread in threads:
+        thread.start()
+    timer.start()
+    try:
+        while True:
+            part = to_send.take()
+            if part is None:
+                break
+            timer.frame_done(frames.dropped + to_send.replaced)
+            yield part
+        if errors:
+            raise errors[0]
+    finally:
+        # Ends both stages at their next frame. Joined before returning, because the
+        # caller hands the analyse stage's pose graph back to its pool next.
+        frames.close()
+        to_send.close()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,235 @@
+# video_analysis.py - Offline rep counting for recorded workout videos, decoded and inferred in parallel
+import argparse
+import collections
+import json
+import math
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from .exercise_engine import RepCounter
+from .landmark_filter import smooth_series
+from .vision import cv2
+from .webcam_stream import landmarks_to_array, LANDMARK_COUNT
+
+# Configuration
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', os.cpu_count() or 1))
+MIN_CHUNK_FRAMES = 150      # shorter chunks spend more time warming the tracker than working
+CHUNKS_PER_WORKER = 2       # a few chunks per worker evens out uneven decode speed
+TRACKER_WARMUP_FRAMES = 15  # frames decoded before a chunk's start so tracking is settled at the boundary
+ANALYSIS_MODEL_COMPLEXITY = 1
+MAX_ANALYSIS_JOBS = 64      # finished jobs kept for polling before the oldest are forgotten
+
+# --- Worker side (runs in the process pool) ---
+
+_worker_pose = None
+
+def _init_worker(model_complexity):
+    global _worker_pose
+    from .pose_pool import create_pose
+    _worker_pose = create_pose(model_complexity)
+
+def _frame_index(capture, fps):
+    """Index of the frame just read, from its timestamp."""
+    return int(round(capture.get(cv2.CAP_PROP_POS_MSEC) * fps / 1000.0))
+
+def _analyze_chunk(path, start, end, fps, mirror):
+    """
+    Decodes frames [start, end) and returns their landmarks as a (frames, 33, 4) float32
+    array (NaN = no pose). A CAP_PROP_POS_FRAMES seek can land a few frames off the
+    target (keyframes, B-frames, some containers), so each decoded frame is placed by
+    its own timestamp: frames before the warm-up start are skipped without inference,
+    frames seen twice overwrite each other, and if the seek landed past `start` the
+    chunk is decoded from the top of the file instead.
+    """
+    warmup_start = max(0, start - TRACKER_WARMUP_FRAMES)
+    out = np.full((end - start, LANDMARK_COUNT, 4), np.nan, dtype=np.float32)
+    frame_rgb = None
+    capture = cv2.VideoCapture(path)
+    try:
+        seeked = warmup_start > 0
+        if seeked:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, warmup_start)
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            index = _frame_index(capture, fps)
+            if seeked:
+                seeked = False
+                if index > start:
+                    capture.release(); capture = cv2.VideoCapture(path)
+                    continue
+            if index < warmup_start:
+                continue
+            if index >= end:
+                break
+            if mirror:
+                frame = cv2.flip(frame, 1)
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame_rgb)
+            results = _worker_pose.process(frame_rgb)
+            if index >= start and results.pose_landmarks:
+                out[index - start] = landmarks_to_array(results.pose_landmarks.landmark)
+    finally:
+        capture.release()
+    return out
+
+# --- Driver side ---
+
+def probe_video(path):
+    """Returns (frame_count, fps) of a video file; raises ValueError if it cannot be read."""
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video: {path}")
+        frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    finally:
+        capture.release()
+    if frames <= 0:
+        raise ValueError(f"Video has no frames: {path}")
+    return frames, fps
+
+def plan_chunks(frame_count, workers):
+    """Splits [0, frame_count) into contiguous (start, end) ranges."""
+    chunks = max(1, min(workers * CHUNKS_PER_WORKER, frame_count // MIN_CHUNK_FRAMES))
+    size = math.ceil(frame_count / chunks)
+    return [(start, min(start + size, frame_count)) for start in range(0, frame_count, size)]
+
+def extract_landmarks(path, workers=ANALYSIS_WORKERS, model_complexity=ANALYSIS_MODEL_COMPLEXITY, mirror=True):
+    """
+    Pose landmarks for every frame of a video as a (frames, 33, 4) array, NaN where no
+    pose was found. Chunks are decoded and inferred in a process pool and stitched
+    back in order. mirror=True flips frames like the live stream does, so the same
+    left/right thresholds apply.
+    """
+    frame_count, fps = probe_video(path)
+    chunks = plan_chunks(frame_count, workers)
+    # Spawned, not forked: MediaPipe and the web server's threads do not survive fork.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), mp_context=context,
+                             initializer=_init_worker, initargs=(model_complexity,)) as pool:
+        parts = list(pool.map(_analyze_chunk, *zip(*[(path, start, end, fps, mirror) for start, end in chunks])))
+    return np.concatenate(parts), fps
+
+def count_landmarks(spec, landmarks, fps, timestamps=None):
+    """
+    Runs the live counting logic (exercise_engine.RepCounter) over a landmark series.
+    Counting happens after stitching, so a rep that spans a chunk boundary is counted
+    exactly as the live stream would count it. Rep times come from `timestamps` (seconds)
+    when given, else from the frame index and fps. Landmarks are smoothed first, like
+    the live stream's landmark_filter does. Nothing is published per frame: nobody
+    watches an offline count, so only the result is built.
+    """
+    if timestamps is None:
+        timestamps = np.arange(len(landmarks)) / fps
+    times = (np.asarray(timestamps, dtype=np.float64) - (timestamps[0] if len(timestamps) else 0.0)).tolist()
+    landmarks = smooth_series(landmarks, times)
+    counter = RepCounter(spec, spec.new_state())
+    detected = ~np.isnan(landmarks[:, 0, 0])
+    reps = []; rep_started = None
+    for index, points in enumerate(landmarks):
+        previous_reps = counter.reps
+        counter.count(points if detected[index] else None)
+        if counter.state == spec.active_state and rep_started is None:
+            rep_started = index
+        if counter.reps > previous_reps:
+            start = rep_started if rep_started is not None else index
+            reps.append({
+                'rep': counter.reps,
+                'start_s': round(times[start], 3),
+                'end_s': round(times[index], 3),
+                'duration_s': round(times[index] - times[start], 3),
+            })
+            rep_started = None
+    angles = np.full((len(landmarks), len(spec.kernel.names)), np.nan)
+    if detected.any():
+        angles[detected] = spec.kernel.compute_batch(landmarks[detected])
+    series = {
+        name: [None if math.isnan(v) else v for v in angles[:, i].tolist()]
+        for i, name in enumerate(spec.kernel.names)
+    }
+    return {
+        'exercise': spec.key,
+        'reps': counter.reps,
+        'rep_timings': reps,
+        'fps': fps,
+        'frames': len(landmarks),
+        'frames_with_pose': int(detected.sum()),
+        'angles': series,
+    }
+
+def analyze_video(path, spec, workers=ANALYSIS_WORKERS, model_complexity=ANALYSIS_MODEL_COMPLEXITY, mirror=True):
+    """Rep count, per-rep timings and per-frame angle series of one exercise in a video."""
+    landmarks, fps = extract_landmarks(path, workers, model_complexity, mirror)
+    return count_landmarks(spec, landmarks, fps)
+
+class AnalysisJobs:
+    """
+    Runs uploaded-video analyses one at a time in the background (each one already
+    uses every core through its process pool) and keeps recent results for polling.
+    """
+    def __init__(self, max_jobs=MAX_ANALYSIS_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='video-analysis')
+        self._jobs = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._max_jobs = max_jobs
+
+    def submit(self, path, spec, owner=None, remove_after=True):
+        """Queues analysis of the video at path; returns the job id. The file is deleted afterwards if remove_after."""
+        job_id = uuid.uuid4().hex
+        def run():
+            try:
+                return analyze_video(path, spec)
+            finally:
+                if remove_after:
+                    os.remove(path)
+        with self._lock:
+            self._jobs[job_id] = (owner, self._executor.submit(run))
+            while len(self._jobs) > self._max_jobs:
+                self._jobs.popitem(last=False)
+        return job_id
+
+    def status(self, job_id, owner=None):
+        """Returns the job's status dict, or None if unknown (or owned by someone else)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job[0] != owner:
+            return None
+        future = job[1]
+        if not future.done():
+            return {'status': 'running' if future.running() else 'queued'}
+        error = future.exception()
+        if error is not None:
+            return {'status': 'error', 'error': str(error)}
+        return {'status': 'done', 'result': future.result()}
+
+# Process-wide queue used by the upload routes
+ANALYSIS_JOBS = AnalysisJobs()
+
+def main(argv=None):
+    from .routes_webcam import EXERCISE_DISPATCHER
+    parser = argparse.ArgumentParser(description='Count reps in recorded workout videos.')
+    parser.add_argument('exercise', choices=sorted(EXERCISE_DISPATCHER))
+    parser.add_argument('videos', nargs='+')
+    parser.add_argument('--workers', type=int, default=ANALYSIS_WORKERS)
+    parser.add_argument('--model-complexity', type=int, default=ANALYSIS_MODEL_COMPLEXITY, choices=(0, 1, 2))
+    parser.add_argument('--no-mirror', action='store_true', help='Analyze frames unflipped.')
+    parser.add_argument('--out', help='Directory for one <video>.json result per input.')
+    args = parser.parse_args(argv)
+    spec = EXERCISE_DISPATCHER[args.exercise]['spec']
+    for path in args.videos:
+        result = analyze_video(path, spec, args.workers, args.model_complexity, not args.no_mirror)
+        print(f"{path}: {result['reps']} reps in {result['frames'] / result['fps']:.1f}s")
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            name = os.path.splitext(os.path.basename(path))[0] + '.json'
+            with open(os.path.join(args.out, name), 'w') as f:
+                json.dump(result, f)
+
+if __name__ == '__main__':
+    main()
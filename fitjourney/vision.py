@@ -0,0 +1,44 @@
+# vision.py - OpenCV and MediaPipe, imported on first use so workers that never serve the webcam never load them
+import importlib
+import os
+import sys
+
+# Configuration
+VISION_PRELOAD = os.getenv('VISION_PRELOAD', '0') == '1'   # import the stack (and warm the pose pool) in create_app
+
+class LazyModule:
+    """
+    Stands in for a module, or an attribute path inside one (mediapipe.solutions.pose),
+    until an attribute is read. It then imports the target and copies the target's
+    namespace into itself, so from then on a lookup costs the same as on the module.
+    """
+    def __init__(self, module, *path):
+        self._lazy_target = (module, path)
+
+    def __getattr__(self, name):
+        return getattr(self._lazy_load(), name)
+
+    def _lazy_load(self):
+        module, path = self.__dict__['_lazy_target']
+        target = importlib.import_module(module)
+        for attribute in path:
+            target = getattr(target, attribute)
+        self.__dict__.update(vars(target))
+        return target
+
+    def __repr__(self):
+        module, path = self.__dict__['_lazy_target']
+        return f"<lazy {'.'.join((module,) + path)}>"
+
+cv2 = LazyModule('cv2')
+mp_pose = LazyModule('mediapipe', 'solutions', 'pose')
+mp_drawing = LazyModule('mediapipe', 'solutions', 'drawing_utils')
+
+def preload():
+    """Imports the whole vision stack now (VISION_PRELOAD, benchmarks)."""
+    for module in (cv2, mp_pose, mp_drawing):
+        module._lazy_load()
+
+def loaded():
+    """{'cv2': bool, 'mediapipe': bool} - which parts of the stack this process has imported."""
+    return {name: name in sys.modules for name in ('cv2', 'mediapipe')}
@@ -1,27 +1,234 @@
 # webcam_stream.py - Collection of shared utilities
-import numpy as np
-import mediapipe as mp
+import enum
 
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
+import numpy as np
 
 # Configuration
-MIN_DETECTION_CONFIDENCE = 0.5 
-MIN_TRACKING_CONFIDENCE = 0.5 
+MIN_DETECTION_CONFIDENCE = 0.5
+MIN_TRACKING_CONFIDENCE = 0.5
+LANDMARK_COUNT = 33
+CAMERA_WIDTH = 640
+CAMERA_HEIGHT = 480
+CAMERA_FPS = 60
+MJPEG_MIMETYPE = 'multipart/x-mixed-replace; boundary=frame'
+
+class PoseLandmark(enum.IntEnum):
+    """BlazePose landmark indices, as mp_pose.PoseLandmark (kept here so importing them does not load MediaPipe)."""
+    NOSE = 0
+    LEFT_EYE_INNER = 1
+    LEFT_EYE = 2
+    LEFT_EYE_OUTER = 3
+    RIGHT_EYE_INNER = 4
+    RIGHT_EYE = 5
+    RIGHT_EYE_OUTER = 6
+    LEFT_EAR = 7
+    RIGHT_EAR = 8
+    MOUTH_LEFT = 9
+    MOUTH_RIGHT = 10
+    LEFT_SHOULDER = 11
+    RIGHT_SHOULDER = 12
+    LEFT_ELBOW = 13
+    RIGHT_ELBOW = 14
+    LEFT_WRIST = 15
+    RIGHT_WRIST = 16
+    LEFT_PINKY = 17
+    RIGHT_PINKY = 18
+    LEFT_INDEX = 19
+    RIGHT_INDEX = 20
+    LEFT_THUMB = 21
+    RIGHT_THUMB = 22
+    LEFT_HIP = 23
+    RIGHT_HIP = 24
+    LEFT_KNEE = 25
+    RIGHT_KNEE = 26
+    LEFT_ANKLE = 27
+    RIGHT_ANKLE = 28
+    LEFT_HEEL = 29
+    RIGHT_HEEL = 30
+    LEFT_FOOT_INDEX = 31
+    RIGHT_FOOT_INDEX = 32
+
+# Skeleton edges, the same set as mp_pose.POSE_CONNECTIONS
+POSE_CONNECTIONS = frozenset([
+    (0, 1), (1, 2), (2, 3), (3, 7), (0, 4), (4, 5), (5, 6), (6, 8), (9, 10),
+    (11, 12), (11, 13), (13, 15), (15, 17), (15, 19), (15, 21), (17, 19),
+    (12, 14), (14, 16), (16, 18), (16, 20), (16, 22), (18, 20),
+    (11, 23), (12, 24), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28),
+    (27, 29), (28, 30), (29, 31), (30, 32), (27, 31), (28, 32),
+])
+
+# Skeleton edges as sorted index pairs, shared with browser-side renderers
+POSE_CONNECTION_PAIRS = sorted(POSE_CONNECTIONS)
 
 # Global State Placeholder
-LATEST_FEEDBACK = {} 
+LATEST_FEEDBACK = {}
 
 def calculate_angle(a, b, c):
-    """Calculates the 2D angle (in degrees) between three points (a, b, c)."""
-    a = np.array(a) 
-    b = np.array(b) 
-    c = np.array(c) 
-    
+    """Calculates the 2D angle (in degrees) between three points (a, b, c); the scalar reference for '2d' joints."""
+    a = np.array(a)
+    b = np.array(b)
+    c = np.array(c)
+
     radians = np.arctan2(c[1] - b[1], c[0] - b[0]) - np.arctan2(a[1] - b[1], a[0] - b[0])
     angle = np.abs(radians * 180.0 / np.pi)
-    
+
     if angle > 180.0:
         angle = 360 - angle
-        
-    return round(angle, 2)
\ No newline at end of file
+
+    return round(angle, 2)
+
+# --- MJPEG helpers ---
+# (cameras and other frame sources live in frame_sources)
+
+def mjpeg_part(jpeg_bytes):
+    """Wraps one encoded JPEG as a part of the multipart/x-mixed-replace stream."""
+    return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg_bytes + b'\r\n'
+
+# --- Per-joint reference implementations (kept for benchmarks and ad-hoc use) ---
+
+def calculate_angle_3d(a, b, c):
+    a = np.array(a); b = np.array(b); c = np.array(c)
+    ba = a - b; bc = c - b
+    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
+    cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
+    angle = np.arccos(cosine_angle)
+    return round(np.degrees(angle), 2)
+
+def calculate_torso_lean_angle(shoulder, hip):
+    p1 = np.array(shoulder); p2 = np.array(hip)
+    torso_vector = p1 - p2
+    vertical_vector = np.array([0, -1])
+    dot_product = np.dot(torso_vector[:2], vertical_vector)
+    magnitude_product = np.linalg.norm(torso_vector[:2]) * np.linalg.norm(vertical_vector)
+    if magnitude_product == 0: return 0.0
+    angle = np.degrees(np.arccos(np.clip(dot_product / magnitude_product, -1.0, 1.0)))
+    return round(angle, 2)
+
+def calculate_shoulder_tilt_angle(sl, sr):
+    sl = np.array(sl); sr = np.array(sr)
+    shoulder_vector = sr - sl
+    y_diff = sr[1] - sl[1]
+    angle_deg = np.degrees(np.arctan2(abs(y_diff), abs(shoulder_vector[0])))
+    return round(angle_deg, 2)
+
+def calculate_torso_misalignment_angle(sl, sr, hl, hr):
+    sl = np.array(sl); sr = np.array(sr); hl = np.array(hl); hr = np.array(hr)
+    shoulder_vector = sr - sl
+    hip_vector = hr - hl
+    dot_product = np.dot(shoulder_vector, hip_vector)
+    magnitude_product = np.linalg.norm(shoulder_vector) * np.linalg.norm(hip_vector)
+    if magnitude_product == 0: return 0.0
+    cosine_angle = np.clip(dot_product / magnitude_product, -1.0, 1.0)
+    return round(np.degrees(np.arccos(cosine_angle)), 2)
+
+# --- Vectorized all-joints kernel ---
+
+def landmarks_to_array(landmarks):
+    """Packs MediaPipe pose landmarks into a (33, 4) float32 array of x, y, z, visibility."""
+    flat = np.fromiter(
+        (v for lm in landmarks for v in (lm.x, lm.y, lm.z, lm.visibility)),
+        dtype=np.float32, count=LANDMARK_COUNT * 4
+    )
+    return flat.reshape(LANDMARK_COUNT, 4)
+
+def pose_points(pose_landmarks):
+    """(33, 4) array of a Pose result's landmarks; results from a pose process already carry it."""
+    points = getattr(pose_landmarks, 'points', None)
+    return points if points is not None else landmarks_to_array(pose_landmarks.landmark)
+
+def _mirror_permutation():
+    index = {lm.name: lm.value for lm in PoseLandmark}
+    def opposite(name):
+        if name.startswith('LEFT_'): return 'RIGHT_' + name[5:]
+        if name.startswith('RIGHT_'): return 'LEFT_' + name[6:]
+        return name
+    return np.array([index[opposite(lm.name)] for lm in PoseLandmark], dtype=np.intp)
+
+# Row i of a mirrored array comes from row MIRROR_PERMUTATION[i] of the original.
+MIRROR_PERMUTATION = _mirror_permutation()
+
+def mirror_points(points):
+    """Landmarks as the model reports them on the horizontally flipped image (the selfie view)."""
+    mirrored = points[MIRROR_PERMUTATION]
+    mirrored[:, 0] = 1.0 - mirrored[:, 0]
+    return mirrored
+
+# Angle kinds a joint in TARGET_DATA['measure_joints'] can be measured with:
+#   '2d'    - angle at the middle of three landmarks in the image plane
+#   '3d'    - angle at the middle of three landmarks using depth as well
+#   'lean'  - deviation of a shoulder->hip segment from vertical
+#   'tilt'  - deviation of a left->right segment from horizontal
+#   'twist' - angle between the shoulder line and the hip line
+# Every kind reduces to the angle between two vectors u = P[u0] - P[u1] and
+# v = P[v0] - P[v1] + const, restricted to x/y for the image-plane kinds.
+ANGLE_KINDS = ('2d', '3d', 'lean', 'tilt', 'twist')
+DEFAULT_KIND_BY_ARITY = {2: 'lean', 3: '2d', 4: 'twist'}
+_VERTICAL_UP = (0.0, -1.0, 0.0)
+_HORIZONTAL = (1.0, 0.0, 0.0)
+_MIN_NORM = 1e-300
+
+def _vector_pair(kind, idx):
+    """Returns (u0, u1, v0, v1, v_const, uses_depth, fold_to_first_quadrant) for one joint."""
+    if kind in ('2d', '3d'):
+        a, b, c = idx
+        return a, b, c, b, (0.0, 0.0, 0.0), kind == '3d', False
+    if kind == 'lean':
+        shoulder, hip = idx
+        return shoulder, hip, hip, hip, _VERTICAL_UP, False, False
+    if kind == 'tilt':
+        # Folded into [0, 90] afterwards, matching arctan2(|dy|, |dx|).
+        left, right = idx
+        return right, left, left, left, _HORIZONTAL, False, True
+    if kind == 'twist':
+        sl, sr, hl, hr = idx
+        return sr, sl, hr, hl, (0.0, 0.0, 0.0), True, False
+    raise ValueError(f"Unknown angle kind: {kind}")
+
+class JointAngleKernel:
+    """
+    Computes every joint an exercise declares in one batched pass over a (33, 4)
+    landmark array. The index arrays are built once, so each frame costs one gather
+    and a single vectorized angle evaluation regardless of joint count.
+    """
+    def __init__(self, measure_joints, angle_kinds=None):
+        angle_kinds = angle_kinds or {}
+        self.names = tuple(measure_joints)
+        rows = [
+            _vector_pair(angle_kinds.get(name, DEFAULT_KIND_BY_ARITY[len(idx)]), idx)
+            for name, idx in measure_joints.items()
+        ]
+        u0, u1, v0, v1, v_const, uses_depth, fold = zip(*rows)
+        # u vectors occupy rows [0, n) and v vectors rows [n, 2n) of one gathered block.
+        self._n = len(rows)
+        self._heads = np.array(u0 + v0, dtype=np.intp)
+        self._tails = np.array(u1 + v1, dtype=np.intp)
+        self._offsets = np.array(((0.0, 0.0, 0.0),) * self._n + v_const, dtype=np.float64)
+        self._axis_mask = np.array([(1.0, 1.0, 1.0 if d else 0.0) for d in uses_depth] * 2, dtype=np.float64)
+        self._fold = np.flatnonzero(fold)
+
+    def compute(self, points):
+        """Returns all joint angles (degrees, rounded to 2 decimals) of one (33, 4) frame in declaration order."""
+        return self.compute_batch(points)
+
+    def compute_batch(self, points):
+        """Joint angles of a (frames, 33, 4) stack in one pass; returns a (frames, joints) array."""
+        # Written over the trailing axes, so a single (33, 4) frame goes through as it is.
+        xyz = points[..., :3].astype(np.float64)
+        d = xyz.take(self._heads, axis=-2)
+        d -= xyz.take(self._tails, axis=-2)
+        d += self._offsets
+        d *= self._axis_mask
+        n = self._n
+        squared = np.einsum('...j,...j->...', d, d)
+        norms = np.sqrt(squared[..., :n] * squared[..., n:])
+        cosine = np.einsum('...j,...j->...', d[..., :n, :], d[..., n:, :]) / np.maximum(norms, _MIN_NORM)
+        angles = np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+        angles[norms == 0] = 0.0
+        if self._fold.size:
+            folded = angles[..., self._fold]
+            angles[..., self._fold] = np.minimum(folded, 180.0 - folded)
+        return angles.round(2)
+
+    def measure(self, points):
+        """Same as compute(), keyed by joint name."""
+        return dict(zip(self.names, self.compute(points).tolist()))
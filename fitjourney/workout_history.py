@@ -0,0 +1,216 @@
+# workout_history.py - Webcam session summaries, written behind to workout_history in batches
+import atexit
+import collections
+import threading
+import time
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError
+
+from .landmark_recording import stop_recording
+
+# Configuration
+HISTORY_BATCH_SIZE = 100        # documents per insert_many
+HISTORY_FLUSH_INTERVAL = 5.0    # seconds a summary may wait for a batch to fill
+HISTORY_MAX_PENDING = 5000      # summaries buffered while Mongo is slow or down; the oldest go first
+HISTORY_RETRY_DELAY = 10.0      # seconds before a failed batch is tried again
+HISTORY_EXIT_TIMEOUT = 5.0      # seconds the final flush may take at interpreter exit
+MIN_SESSION_REPS = 1            # sessions with fewer reps are not saved
+
+# Distribution category of each webcam exercise for the stats page; anything else is Strength.
+EXERCISE_TYPES = {'jumping_jack': 'Cardio', 'Jumping Jack': 'Cardio'}
+
+class SessionLog:
+    """
+    What a webcam session did since it started: first and last counted frame, the
+    wall time of every rep and how often each form warning appeared. The counters
+    append to it on every frame; finish_session() turns it into a summary document.
+    `guided` tags the sets of a guided workout run (see GuidedWorkoutState) so the
+    stats count the run once, not once per set.
+    """
+    __slots__ = ('started_at', 'last_at', 'rep_times', 'rep_exercises', 'warnings', 'guided', '_active')
+
+    def __init__(self, guided=None):
+        self.started_at = None
+        self.last_at = None
+        self.rep_times = []
+        self.rep_exercises = []   # auto-classify only: which exercise each rep was
+        self.warnings = collections.Counter()
+        self.guided = guided
+        self._active = ()
+
+    def seen(self, now=None):
+        now = time.time() if now is None else now
+        if self.started_at is None:
+            self.started_at = now
+        self.last_at = now
+
+    def rep(self, now=None, exercise=None):
+        now = time.time() if now is None else now
+        self.seen(now)
+        self.rep_times.append(now)
+        if exercise is not None:
+            self.rep_exercises.append(exercise)
+
+    def form_warnings(self, messages):
+        """Counts each warning once per appearance, not once per frame it stays on screen."""
+        for message in messages:
+            if message not in self._active:
+                self.warnings[message] += 1
+        self._active = messages
+
+    def summary(self, exercise, owner):
+        """workout_history document for this session, or None if there is nothing worth saving."""
+        if owner is None or len(self.rep_times) < MIN_SESSION_REPS:
+            return None
+        started_at = datetime.fromtimestamp(self.started_at)
+        ended_at = datetime.fromtimestamp(self.last_at)
+        document = {
+            'user_email': owner,
+            'source': 'webcam',
+            'exercise': exercise,
+            'type': EXERCISE_TYPES.get(exercise, 'Strength'),
+            'status': 'completed',
+            'reps': len(self.rep_times),
+            'started_at': started_at,
+            'timestamp': ended_at,
+            'duration_seconds': round(self.last_at - self.started_at, 1),
+            'rep_timestamps': [round(t - self.started_at, 2) for t in self.rep_times],
+            # A list rather than a dict: warning texts may contain '.', which Mongo keys may not.
+            'form_warnings': [{'message': m, 'count': n} for m, n in self.warnings.most_common()],
+        }
+        if self.rep_exercises:
+            reps_by_exercise = collections.Counter(self.rep_exercises)
+            document['reps_by_exercise'] = dict(reps_by_exercise)
+            # Typed by what the user mostly did
+            document['type'] = EXERCISE_TYPES.get(reps_by_exercise.most_common(1)[0][0], 'Strength')
+        if self.guided is not None:
+            document['guided_workout'] = dict(self.guided)
+        return document
+
+class WriteBehindBuffer:
+    """
+    Bounded queue of documents drained to a Mongo collection by one background thread
+    with insert_many. put() only appends under a short lock, so a frame loop or a
+    request never waits for the database; a burst of sessions ending together just
+    makes the next batch bigger. While the database is unreachable, batches are
+    retried every HISTORY_RETRY_DELAY and the buffer keeps the newest
+    HISTORY_MAX_PENDING documents.
+    """
+    def __init__(self, collection, batch_size=HISTORY_BATCH_SIZE, flush_interval=HISTORY_FLUSH_INTERVAL,
+                 max_pending=HISTORY_MAX_PENDING, retry_delay=HISTORY_RETRY_DELAY):
+        self._collection = collection   # callable returning the collection (None until extensions are initialized)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._retry_delay = retry_delay
+        self._pending = collections.deque(maxlen=max_pending)
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()   # one insert_many at a time (worker or exit flush)
+        self._thread = None
+        self._written = 0
+        self._failed_batches = 0
+        self._dropped = 0
+
+    def put(self, document):
+        with self._cond:
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(document)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='workout-history-writer', daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self._batch_size:
+                self._cond.notify()
+
+    def flush(self):
+        """Writes everything pending now, in the caller's thread; False if a batch failed."""
+        while True:
+            with self._cond:
+                batch = self._take()
+            if not batch:
+                return True
+            if not self._write(batch):
+                return False
+
+    def stats(self):
+        with self._cond:
+            return {'pending': len(self._pending), 'written': self._written,
+                    'failed_batches': self._failed_batches, 'dropped': self._dropped}
+
+    def _take(self):
+        count = min(self._batch_size, len(self._pending))
+        return [self._pending.popleft() for _ in range(count)]
+
+    def _write(self, batch):
+        with self._write_lock:
+            try:
+                collection = self._collection()
+                if collection is None:
+                    raise RuntimeError("workout_history collection is not initialized")
+                collection.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Partly written. insert_many set every document's _id, so on a retry the
+                # ones already stored fail as duplicates (11000); only the rest go back.
+                failed = {error['index'] for error in e.details['writeErrors'] if error['code'] != 11000}
+                self._requeue([doc for index, doc in enumerate(batch) if index in failed])
+                with self._cond:
+                    self._written += len(batch) - len(failed)
+                return not failed
+            except Exception as e:
+                print(f"Workout history write failed ({len(batch)} sessions): {e}")
+                self._requeue(batch)
+                return False
+        with self._cond:
+            self._written += len(batch)
+        return True
+
+    def _requeue(self, batch):
+        if not batch:
+            return
+        with self._cond:
+            self._failed_batches += 1
+            # Back at the front, oldest first, unless newer sessions have filled the buffer meanwhile.
+            room = self._pending.maxlen - len(self._pending)
+            keep = batch[-room:] if room else []
+            self._dropped += len(batch) - len(keep)
+            self._pending.extendleft(reversed(keep))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Wait for a full batch, or flush whatever is there once the interval passes.
+                self._cond.wait_for(lambda: len(self._pending) >= self._batch_size, self._flush_interval)
+                batch = self._take()
+            if batch and not self._write(batch):
+                time.sleep(self._retry_delay)
+
+def _history_collection():
+    from . import extensions
+    return extensions.workout_history_collection
+
+# Process-wide buffer in front of extensions.workout_history_collection
+HISTORY = WriteBehindBuffer(_history_collection)
+
+def finish_session(state, exercise):
+    """
+    Queues the state's session summary (if any), starts a new log and closes the
+    session's landmark recording. The stream's finally block, the end-of-session beacon
+    and eviction may finish a session at the same time; the log is taken under the
+    state's lock, so exactly one of them saves it.
+    """
+    if hasattr(state, 'active_set'):
+        exercise, state = state.active_set()   # a guided workout saves the set in progress
+    with state.lock:
+        log = state.history
+        state.history = SessionLog(log.guided)
+        stop_recording(state)
+    document = log.summary(exercise, state.owner)
+    if document is not None:
+        HISTORY.put(document)
+
+@atexit.register
+def _flush_at_exit():
+    if HISTORY.stats()['pending']:
+        thread = threading.Thread(target=HISTORY.flush, daemon=True)
+        thread.start()
+        thread.join(HISTORY_EXIT_TIMEOUT)
@@ -1,6 +1,9 @@
 from fitjourney import create_app
 
-app = create_app()
+# Spawned worker processes (pose_process, video_analysis) import this file again
+# as __mp_main__; they must not build a second app of their own.
+if __name__ != '__mp_main__':
+    app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
@@ -0,0 +1,61 @@
+# tests/test_auto_classify_lock.py - How fast auto-classify locks onto an exercise, and that standing never locks
+import unittest
+
+import numpy as np
+
+from fitjourney.exercise_classifier import ANGLE_NAMES, EXERCISE_PROTOTYPES
+from fitjourney.routes_webcam import classify_and_count
+from fitjourney.session_state import AutoClassifyState
+
+FPS = 15
+REP_SECONDS = 2.0
+LOCK_BUDGET = 3.0   # seconds of exercising before the user sees what is being counted
+# Angles of joints an exercise leaves alone: a person standing with arms down
+STANDING = {'left_knee': 172, 'right_knee': 172, 'left_elbow': 165, 'right_elbow': 165, 'left_hip': 172, 'left_shoulder': 20}
+
+def trace(exercise, seconds, seed=0, noise=4.0):
+    """extract_angles rows of `seconds` of reps: the exercise's joints sweep their prototype range once per rep."""
+    t = np.arange(int(seconds * FPS)) / FPS
+    phase = (1 - np.cos(2 * np.pi * t / REP_SECONDS)) / 2
+    rows = np.empty((len(t), len(ANGLE_NAMES)))
+    for col, name in enumerate(ANGLE_NAMES):
+        low, high = EXERCISE_PROTOTYPES.get(exercise, {}).get(name, (STANDING[name], STANDING[name]))
+        rows[:, col] = high - (high - low) * phase
+    return np.clip(rows + np.random.default_rng(seed).normal(0, noise, rows.shape), 0, 180)
+
+def feed(st, rows, start):
+    """Runs rows through classify_and_count at FPS; returns (first exercise locked, seconds until then) or (None, None)."""
+    for frame, angles in enumerate(rows):
+        classify_and_count(tuple(angles), st, start + frame / FPS)
+        if st.active_exercise is not None:
+            return st.active_exercise, frame / FPS
+    return None, None
+
+class AutoClassifyLockTest(unittest.TestCase):
+    def test_standing_never_locks(self):
+        st = AutoClassifyState()
+        self.assertEqual(feed(st, trace(None, 10), 1000.0), (None, None))
+        self.assertEqual(st.current_exercise, "Detecting...")
+
+    def test_locks_within_a_rep_and_its_confirmations(self):
+        # A decision sees the last WINDOW_SECONDS, so after about one rep lock_threshold
+        # agreeing decisions are confirmation enough: the lock comes within LOCK_BUDGET.
+        for exercise in ("Squat", "Push-up", "Lunge", "Jumping Jack"):
+            with self.subTest(exercise=exercise):
+                st = AutoClassifyState()
+                feed(st, trace(None, 3), 1000.0)
+                locked, locked_after = feed(st, trace(exercise, 8, seed=1), 1003.0)
+                self.assertEqual(locked, exercise)
+                self.assertLessEqual(locked_after, LOCK_BUDGET)
+
+    def test_sit_up_does_not_lock_as_squat(self):
+        # Getting down from standing, the window's knees and hip go from straight to bent
+        # as in a squat; the arms behind the head keep it from matching the squat.
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                st = AutoClassifyState()
+                feed(st, trace(None, 3, seed=seed), 1000.0)
+                self.assertEqual(feed(st, trace("Sit-up", 8, seed=seed + 1), 1003.0)[0], "Sit-up")
+
+if __name__ == '__main__':
+    unittest.main()
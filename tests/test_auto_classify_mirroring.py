@@ -0,0 +1,106 @@
+# tests/test_auto_classify_mirroring.py - The server stream and both ingest paths classify the same pose alike
+import contextlib
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from flask import Flask
+
+from fitjourney import inference_pool, routes_webcam
+from fitjourney.capture_service import CaptureService
+from fitjourney.landmark_protocol import encode_frame
+from fitjourney.session_state import AutoClassifyState
+from fitjourney.vision import cv2
+from fitjourney.webcam_stream import LANDMARK_COUNT, PoseLandmark, mirror_points
+
+# One camera frame: a bright patch on its left marks which way round the image is.
+FRAME = np.zeros((120, 160, 3), dtype=np.uint8)
+FRAME[20:100, 10:50] = 255
+
+# The person in FRAME, as a pose model reports them on the unflipped camera image:
+# left arm bent, right arm held straight out, left knee bent, right leg straight.
+CAMERA_JOINTS = {
+    PoseLandmark.LEFT_SHOULDER: (0.58, 0.30), PoseLandmark.RIGHT_SHOULDER: (0.42, 0.30),
+    PoseLandmark.LEFT_ELBOW: (0.66, 0.40), PoseLandmark.RIGHT_ELBOW: (0.32, 0.30),
+    PoseLandmark.LEFT_WRIST: (0.60, 0.48), PoseLandmark.RIGHT_WRIST: (0.22, 0.30),
+    PoseLandmark.LEFT_HIP: (0.55, 0.55), PoseLandmark.RIGHT_HIP: (0.45, 0.55),
+    PoseLandmark.LEFT_KNEE: (0.62, 0.68), PoseLandmark.RIGHT_KNEE: (0.45, 0.70),
+    PoseLandmark.LEFT_ANKLE: (0.55, 0.82), PoseLandmark.RIGHT_ANKLE: (0.45, 0.85),
+}
+
+def camera_points():
+    points = np.zeros((LANDMARK_COUNT, 4), dtype=np.float32)
+    points[:, :2] = 0.5
+    points[:, 3] = 0.9
+    for landmark, xy in CAMERA_JOINTS.items():
+        points[landmark, :2] = xy
+    return points
+
+class FakePose:
+    """A Pose graph that sees FRAME: the camera image as it is, or flipped like a selfie view."""
+    def process(self, image):
+        half = image.shape[1] // 2
+        points = camera_points()
+        if image[:, half:].mean() > image[:, :half].mean():
+            points = mirror_points(points)
+        return SimpleNamespace(pose_landmarks=SimpleNamespace(points=points))
+
+class FakePosePools:
+    def checkout(self, model_complexity=None, static_image_mode=False, timeout=None):
+        return contextlib.nullcontext(FakePose())
+
+class StillCamera:
+    def read(self):
+        return True, FRAME.copy()
+
+    def release(self):
+        pass
+
+class AutoClassifyMirroringTest(unittest.TestCase):
+    def setUp(self):
+        self.classified = []
+        def classify_and_count(angles, st, now=None):
+            self.classified.append(angles)
+        patcher = mock.patch.object(routes_webcam, 'classify_and_count', classify_and_count)
+        patcher.start(); self.addCleanup(patcher.stop)
+        self.app = Flask(__name__)
+        self.app.secret_key = 'test'
+        self.app.register_blueprint(routes_webcam.webcam_bp)
+
+    def server_stream_angles(self):
+        capture = CaptureService(opener=StillCamera, idle_timeout=0)
+        with mock.patch.object(routes_webcam, 'POSE_POOLS', FakePosePools()):
+            frames = routes_webcam.generate_frames(AutoClassifyState(), capture=capture, pipelined=False)
+            next(frames); frames.close()
+        return self.classified.pop()
+
+    def landmark_ingest_angles(self):
+        with self.app.test_client() as client:
+            response = client.post('/ingest/landmarks/auto_classify', data=encode_frame(1, camera_points()))
+        self.assertEqual(response.get_json()['status'], 'ok')
+        return self.classified.pop()
+
+    def frame_ingest_angles(self):
+        pool = inference_pool.InferencePool(workers=1)
+        self.addCleanup(pool.close)
+        _, jpeg = cv2.imencode('.jpg', FRAME)
+        with mock.patch.object(inference_pool, 'create_pose', lambda *args, **kwargs: contextlib.nullcontext(FakePose())), \
+                mock.patch.object(routes_webcam, 'INGEST_POOL', pool), self.app.test_client() as client:
+            response = client.post('/ingest/frame/auto_classify', data=jpeg.tobytes(), content_type='image/jpeg')
+        self.assertEqual(response.get_json()['status'], 'ok')
+        return self.classified.pop()
+
+    def test_same_pose_same_angles(self):
+        expected = routes_webcam.extract_angles(mirror_points(camera_points()))
+        names = tuple(routes_webcam.AUTO_CLASSIFY_JOINTS)
+        # The pose is lopsided, so a left/right mix-up cannot pass unnoticed.
+        self.assertGreater(abs(expected[names.index('left_elbow')] - expected[names.index('right_elbow')]), 30)
+        for path, angles in (('server stream', self.server_stream_angles()),
+                             ('landmark ingest', self.landmark_ingest_angles()),
+                             ('frame ingest', self.frame_ingest_angles())):
+            with self.subTest(path=path):
+                np.testing.assert_allclose(angles, expected, atol=0.05)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+# tests/test_capture_service.py - A stream that subscribes as the idle camera shuts down still gets frames
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from fitjourney.capture_service import CaptureService
+
+class Camera:
+    def read(self):
+        time.sleep(0.001)
+        return True, np.zeros((4, 4, 3), dtype=np.uint8)
+
+    def release(self):
+        pass
+
+class IdleShutdownTest(unittest.TestCase):
+    def test_subscribe_during_idle_shutdown_opens_a_fresh_camera(self):
+        service = CaptureService(opener=Camera, idle_timeout=0)
+        stopping, subscribed = threading.Event(), threading.Event()
+
+        class Condition(threading.Condition):
+            # Holds the capture thread just after it leaves the critical section that
+            # saw the camera idle, until the next stream has subscribed.
+            def __exit__(self, *exc):
+                super().__exit__(*exc)
+                if threading.current_thread().name == 'capture-service' and service._idle_since is not None \
+                        and not stopping.is_set():
+                    stopping.set(); subscribed.wait(1.0)
+
+        service._cond = Condition()
+        frames = service.subscribe()
+        next(iter(frames)); frames.close()
+        self.assertTrue(stopping.wait(1.0))
+        frames = service.subscribe()
+        subscribed.set()
+        self.assertIsNotNone(next(iter(frames), None))
+        frames.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# tests/test_cross_worker_ingest.py - Ingest landing on any gunicorn worker counts into the one state its session owns
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from fitjourney.landmark_protocol import encode_frame
+from fitjourney.webcam_stream import LANDMARK_COUNT
+
+EXERCISE = 'body_weight_squats'
+SESSION_ID = 'shared-session'
+REPLY_TIMEOUT = 30.0
+
+def standing_points():
+    points = np.zeros((LANDMARK_COUNT, 4), dtype=np.float32)
+    points[:, 0] = np.linspace(0.4, 0.6, LANDMARK_COUNT)
+    points[:, 1] = np.linspace(0.1, 0.9, LANDMARK_COUNT)
+    points[:, 3] = 0.9
+    return points
+
+def worker(requests, replies):
+    """One app worker: the webcam blueprint behind a test client whose browser session is SESSION_ID."""
+    from flask import Flask
+    from fitjourney import routes_webcam
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(routes_webcam.webcam_bp)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['stream_id'] = SESSION_ID
+    replies.put(os.getpid())
+    for method, url, data in iter(requests.get, None):
+        response = client.open(url, method=method, data=data)
+        replies.put((response.status_code, response.get_json(silent=True)))
+
+class Worker:
+    def __init__(self, context):
+        self.requests, self.replies = context.Queue(), context.Queue()
+        self.process = context.Process(target=worker, args=(self.requests, self.replies), daemon=True)
+        self.process.start()
+        self.pid = self.replies.get(timeout=REPLY_TIMEOUT)
+
+    def call(self, method, url, data=None):
+        self.requests.put((method, url, data))
+        return self.replies.get(timeout=REPLY_TIMEOUT)
+
+    def landmarks(self, seq):
+        return self.call('POST', f'/ingest/landmarks/{EXERCISE}', encode_frame(seq, standing_points()))
+
+    def stop(self):
+        if self.process.is_alive():
+            self.requests.put(None)
+            self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+
+class CrossWorkerIngestTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        context = multiprocessing.get_context('spawn')   # like gunicorn's workers: nothing shared but the store file
+        with mock.patch.dict(os.environ, {'FEEDBACK_STORE_PATH': os.path.join(directory, 'feedback'),
+                                          'GOOGLE_API_KEY': os.environ.get('GOOGLE_API_KEY', 'test')}):
+            self.first, self.second = Worker(context), Worker(context)
+        self.addCleanup(self.first.stop)
+        self.addCleanup(self.second.stop)
+
+    def test_frames_on_either_worker_count_into_one_state(self):
+        self.assertEqual(self.first.landmarks(1)[0], 200)
+        status, reply = self.second.landmarks(2)
+        self.assertEqual((status, reply['seq'], reply['skipped']), (200, 2, 0))
+        # One state has seen frame 2, so the first worker now drops it as a repeat.
+        status, reply = self.first.landmarks(2)
+        self.assertEqual((status, reply['seq'], reply['skipped']), (200, 2, 1))
+        # Both workers answer the feedback poll with the owner's state.
+        self.assertEqual(self.first.call('GET', f'/get_feedback/{EXERCISE}'),
+                         self.second.call('GET', f'/get_feedback/{EXERCISE}'))
+
+    def test_session_moves_on_when_its_owner_exits(self):
+        self.assertEqual(self.first.landmarks(1)[0], 200)
+        self.first.stop()
+        status, reply = self.second.landmarks(5)
+        self.assertEqual((status, reply['seq'], reply['skipped']), (200, 5, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+# tests/test_guided_history.py - A guided workout saves every set but counts as one workout in the stats
+import unittest
+from unittest import mock
+
+from fitjourney import extensions, stats_calculator, workout_history
+from fitjourney.body_weight_squats import SPEC
+from fitjourney.session_state import GuidedWorkoutState
+
+class Collection:
+    def __init__(self, documents=()):
+        self.documents = list(documents)
+
+    def find(self, query, projection=None):
+        return iter(self.documents)
+
+    def find_one(self, query):
+        return None
+
+class GuidedHistoryTest(unittest.TestCase):
+    def run_workout(self):
+        workout = GuidedWorkoutState('saved-workout', "Custom workout", [(SPEC.key, SPEC, 1, n, 3) for n in (1, 2, 3)])
+        workout.owner = 'user@example.com'
+        while not workout.finished:
+            _, current = workout.active_set()
+            current.history.rep(); current.reps = 1
+            workout.advance_if_done()
+        return workout
+
+    def test_sets_are_tagged_and_counted_once(self):
+        saved = []
+        with mock.patch.object(workout_history.HISTORY, 'put', saved.append):
+            first, second = self.run_workout(), self.run_workout()
+        self.assertEqual(len(saved), 6)
+        self.assertEqual([doc['guided_workout']['run_id'] for doc in saved], [first.run_id] * 3 + [second.run_id] * 3)
+        self.assertEqual([doc['guided_workout']['set'] for doc in saved[:3]], [1, 2, 3])
+
+        with mock.patch.object(extensions, 'users_collection', Collection(), create=True), \
+                mock.patch.object(extensions, 'workout_plans_collection', Collection(), create=True), \
+                mock.patch.object(extensions, 'workout_history_collection', Collection(saved), create=True):
+            stats = stats_calculator.calculate_user_stats('user@example.com')
+        self.assertEqual(stats['monthly_workouts_count'], 2)
+        self.assertEqual(stats['chart_data'], [2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# tests/test_pose_failure.py - A pose graph that fails mid-stream ends the MJPEG stream with feedback, not a traceback
+import contextlib
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from fitjourney import exercise_engine, routes_webcam
+from fitjourney.body_weight_squats import SPEC
+from fitjourney.capture_service import CaptureService
+from fitjourney.pose_process import FrameTooLarge, PoseProcessError
+from fitjourney.session_state import AutoClassifyState
+
+class StillCamera:
+    def read(self):
+        return True, np.zeros((48, 64, 3), dtype=np.uint8)
+
+    def release(self):
+        pass
+
+class BrokenPose:
+    def __init__(self, error):
+        self.error = error
+
+    def process(self, image):
+        raise self.error
+
+class BrokenPosePools:
+    def __init__(self, error):
+        self.error = error
+
+    def checkout(self, model_complexity=None, static_image_mode=False, timeout=None):
+        return contextlib.nullcontext(BrokenPose(self.error))
+
+ERRORS = (PoseProcessError("Pose process exited: EOFError()"), FrameTooLarge("Frame (2160, 3840, 3) is larger"))
+
+class PoseFailureTest(unittest.TestCase):
+    def cases(self, module):
+        """(capture, pipelined) for each error and pipeline mode, with `module`'s pose pools failing that way."""
+        for error in ERRORS:
+            for pipelined in (False, True):
+                with self.subTest(error=type(error).__name__, pipelined=pipelined), \
+                        mock.patch.object(module, 'POSE_POOLS', BrokenPosePools(error)), \
+                        mock.patch.object(module, 'finish_session', lambda *args: None):
+                    yield CaptureService(opener=StillCamera, idle_timeout=0), pipelined
+
+    def test_exercise_stream(self):
+        for capture, pipelined in self.cases(exercise_engine):
+            st = SPEC.new_state()
+            list(exercise_engine.generate_frames(SPEC, st, capture=capture, pipelined=pipelined))
+            self.assertEqual(st.feedback, [exercise_engine.POSE_FAILED_MESSAGE])
+
+    def test_auto_classify_stream(self):
+        for capture, pipelined in self.cases(routes_webcam):
+            st = AutoClassifyState()
+            list(routes_webcam.generate_frames(st, capture=capture, pipelined=pipelined))
+            self.assertEqual(st.feedback_text, exercise_engine.POSE_FAILED_MESSAGE)
+
+if __name__ == '__main__':
+    unittest.main()
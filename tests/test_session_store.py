@@ -0,0 +1,35 @@
+# tests/test_session_store.py - Evicting a busy session does not hold up other sessions' lookups
+import threading
+import time
+import unittest
+
+from fitjourney.session_state import ExerciseState, SessionStore
+
+class EvictionTest(unittest.TestCase):
+    def test_lookups_do_not_wait_for_an_eviction(self):
+        def finish(key, state):
+            with state.lock:   # as workout_history.finish_session
+                finished.append(key)
+        finished = []
+        store = SessionStore(max_sessions=1, on_evict=finish)
+        busy = store.get('a', 'squats', lambda: ExerciseState({}))
+        busy.lock.acquire()   # an ingest request in the middle of a landmark batch
+        creator = threading.Thread(target=store.get, args=('b', 'squats', lambda: ExerciseState({})))
+        creator.start()
+        try:
+            time.sleep(0.05)   # the creator is now blocked in finish()
+            found = []
+            lookup = threading.Thread(target=lambda: found.extend((store.peek('a', 'squats'), store.peek('b', 'squats'))),
+                                      daemon=True)
+            lookup.start(); lookup.join(0.5)
+            self.assertFalse(lookup.is_alive(), "lookups waited for the evicted session's lock")
+            self.assertIsNone(found[0])
+            self.assertIsNotNone(found[1])
+            self.assertEqual(finished, [])
+        finally:
+            busy.lock.release()
+            creator.join(1.0)
+        self.assertEqual(finished, ['squats'])
+
+if __name__ == '__main__':
+    unittest.main()